@@ -0,0 +1,52 @@
+"""Gunicorn settings for running the API with several worker processes.
+
+Used by ``python run_backend.py --prod`` on platforms gunicorn supports, and
+usable directly: ``gunicorn -c gunicorn_conf.py main:app`` from this directory.
+"""
+import importlib
+import os
+import sys
+import time
+
+from uvicorn.workers import UvicornWorker
+
+bind = f"{os.getenv('BACKEND_HOST', '0.0.0.0')}:{os.getenv('BACKEND_PORT', '8000')}"
+workers = int(os.getenv("BACKEND_WORKERS", str(os.cpu_count() or 1)))
+# Seconds a stopping worker gets to finish in-flight requests before it is killed
+graceful_timeout = int(os.getenv("BACKEND_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+worker_class = "gunicorn_conf.DrainingUvicornWorker"
+
+# Imported once by the master before it forks, so every worker starts with
+# them already loaded and shares their memory pages. The app itself is not
+# preloaded: its services open SQLite connections, which must not be
+# inherited across fork, and each worker builds its own.
+PRELOAD_MODULES = ("fastapi", "starlette", "pydantic", "uvicorn", "multipart", "dotenv", "fitz", "numpy")
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    # Stop waiting on open connections a little before gunicorn's kill deadline,
+    # so the app's shutdown hooks still run (job queue, caches, SQLite stores)
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS,
+                     "timeout_graceful_shutdown": max(1, graceful_timeout - 5)}
+
+
+def on_starting(server):
+    # Workers inherit the environment. The JSON Lines feedback store indexes its
+    # file in process memory, so several workers need the shared SQLite one.
+    if server.cfg.workers > 1:
+        backend = os.getenv("FEEDBACK_BACKEND", "").lower()
+        if backend == "jsonl":
+            server.log.error("FEEDBACK_BACKEND=jsonl cannot be shared by several workers; "
+                             "use FEEDBACK_BACKEND=sqlite or a single worker")
+            sys.exit(1)
+        if not backend:
+            os.environ["FEEDBACK_BACKEND"] = "sqlite"
+
+    started = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning(f"Could not preload {name}: {str(e)}")
+    server.log.info(f"Preloaded shared modules in {time.perf_counter() - started:.2f}s")
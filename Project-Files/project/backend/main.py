@@ -1,12 +1,26 @@
+from services.startup import startup_report, import_module, HEAVY_MODULES
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
-from routes import ai_routes, chat_routes, feedback_routes
+from routes import ai_routes, chat_routes, feedback_routes, job_routes
+from services.watsonx_service import watsonx_service
+from services.classification_service import classification_service
+from services.chat_service import chat_service
+from services.inference import inference
+from services.pdf_service import shutdown_process_pool
+from services.feedback_store import feedback_store
+from services.job_queue import job_queue
+from services.feedback_stats import feedback_aggregates
+from services.metrics import metrics, MetricsMiddleware
+from services.prompt_templates import prompt_registry
+from services.upload_service import upload_service
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+startup_report.mark("imports")
 
 app = FastAPI(
     title="SmartSDLC API",
@@ -21,12 +35,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Session-Id"],
 )
 
+# Per-route latency, status counts and optional Server-Timing headers
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(ai_routes.router, prefix="/api/ai", tags=["AI Services"])
 app.include_router(chat_routes.router, prefix="/api/chat", tags=["Chatbot"])
 app.include_router(feedback_routes.router, prefix="/api/feedback", tags=["Feedback"])
+app.include_router(job_routes.router, prefix="/api/jobs", tags=["Jobs"])
+
+def _load_feedback():
+    migrated = feedback_store.migrate_from_json("feedback_data.json")
+    if migrated:
+        print(f"Migrated {migrated} feedback entries from feedback_data.json")
+    if feedback_store.shared:
+        # Entries collected by the single-process JSON Lines store carry over
+        migrated = feedback_store.migrate_from_jsonl("feedback_data.jsonl")
+        if migrated:
+            print(f"Migrated {migrated} feedback entries from feedback_data.jsonl")
+    else:
+        # One full scan at startup; after that stats are maintained on submit
+        feedback_aggregates.rebuild(feedback_store.all())
+
+@app.on_event("startup")
+async def load_feedback():
+    # Large feedback files take a while to scan; keep the event loop free meanwhile
+    with startup_report.phase("feedback"):
+        await run_in_threadpool(_load_feedback)
+
+@app.on_event("startup")
+async def recover_jobs():
+    with startup_report.phase("jobs"):
+        interrupted = await run_in_threadpool(job_queue.recover)
+    if interrupted:
+        print(f"Marked {interrupted} interrupted background jobs as failed")
+
+@app.on_event("startup")
+async def finish_startup():
+    # Registered last: the worker is ready once the hooks above have run.
+    # Heavy imports and the model client's token exchange happen in the
+    # background instead, so requests are accepted without waiting on them.
+    startup_report.ready()
+    startup_report.warm_up(
+        [(name, import_module(name)) for name in HEAVY_MODULES]
+        + [("model_client", watsonx_service.warm_up)]
+    )
+
+@app.on_event("shutdown")
+async def shutdown_inference():
+    job_queue.shutdown()
+    inference.shutdown()
+    shutdown_process_pool()
+    feedback_store.close()
+    classification_service.document_cache.close()
+    chat_service.close()
 
 @app.get("/")
 async def root():
@@ -36,5 +101,53 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "SmartSDLC API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/startup")
+async def startup_stats():
+    return startup_report.stats()
+
+@app.get("/health/scheduler")
+async def scheduler_stats():
+    return inference.scheduler.stats()
+
+@app.get("/health/model-resilience")
+async def model_resilience_stats():
+    return watsonx_service.resilience_stats()
+
+@app.get("/health/document-cache")
+async def document_cache_stats():
+    return await run_in_threadpool(classification_service.document_cache.stats)
+
+@app.get("/health/uploads")
+async def upload_stats():
+    return upload_service.stats()
+
+@app.get("/health/jobs")
+async def job_stats():
+    return await run_in_threadpool(job_queue.stats)
+
+@app.get("/health/chat-sessions")
+async def chat_session_stats():
+    return await run_in_threadpool(chat_service.stats)
+
+@app.get("/health/semantic-cache")
+async def semantic_cache_stats():
+    return chat_service.semantic_cache.stats()
+
+@app.get("/health/prompts")
+async def prompt_stats():
+    return prompt_registry.stats()
+
+@app.get("/health/model-backend")
+async def model_backend_stats():
+    return watsonx_service.backend_stats()
+
+@app.get("/health/response-cache")
+async def response_cache_stats():
+    return watsonx_service.cache_stats()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
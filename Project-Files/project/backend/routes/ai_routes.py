@@ -1,12 +1,17 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
-import json
+from typing import Dict, List, Optional
 from services.watsonx_service import watsonx_service
-from services.pdf_service import PDFService
+from services.pdf_service import PDFParseError
+from services.inference import inference
+from services.classification_service import classification_service, SDLCClassification
+from services.code_service import code_service
+from services.job_queue import job_queue
+from services.upload_service import upload_service, SpooledUpload
+from services.metrics import span
 
 router = APIRouter()
-pdf_service = PDFService()
 
 class CodeGenerationRequest(BaseModel):
     prompt: str
@@ -20,37 +25,109 @@ class TestGenerationRequest(BaseModel):
     code: str
     language: str = "python"
 
-@router.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+class BatchClassificationRequest(BaseModel):
+    items: List[str]
+
+# Documents the multipart body these routes read themselves instead of through UploadFile
+PDF_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+async def classify_pdf_content(http_request: Optional[Request], upload: SpooledUpload, job=None) -> Dict:
+    """Extract and classify a PDF; shared by ``/upload-pdf`` and background jobs"""
+    # Extract and clean text page by page, reusing pages seen in earlier uploads
+    with span("pdf_extract"):
+        try:
+            document = await run_in_threadpool(classification_service.prepare_pdf, upload.source, job,
+                                               digest=upload.sha256)
+        except PDFParseError as e:
+            # It passed the header check but is damaged or truncated: the upload is at fault, not the server
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    result = document["cached"]
+    if result is None:
+        cleaned_text = document["text"]
+        preview = cleaned_text[:1000] + "..." if len(cleaned_text) > 1000 else cleaned_text
+        # Classify SDLC phases chunk by chunk; only new or changed chunks reach the model
+        with span("classify"):
+            result = await inference.run(
+                http_request, classification_service.classify_document, cleaned_text,
+                document_key=document["document_key"],
+                extra={"extracted_text": preview, "text_length": len(cleaned_text), "pages": document["pages"]},
+                job=job, route="classify", timeout=job_queue.timeout if job is not None else None
+            )
+        result.update(extracted_text=preview, text_length=len(cleaned_text), pages=document["pages"])
+    
+    return {
+        "extracted_text": result["extracted_text"],
+        "classification": SDLCClassification(**result["classification"]).model_dump(),
+        "chunks": result["chunks"],
+        "classification_seconds": result["seconds"],
+        "text_length": result["text_length"],
+        "reuse": {
+            "document": document["cached"] is not None,
+            "pages": result["pages"],
+            "pages_reused": result["pages"] if document["cached"] is not None else document["pages_reused"],
+            "chunks": len(result["chunks"]),
+            "chunks_reused": len(result["chunks"]) if document["cached"] is not None else result["chunks_reused"],
+        }
+    }
+
+@router.post("/upload-pdf", openapi_extra=PDF_UPLOAD_BODY)
+async def upload_pdf(http_request: Request):
+    upload = None
     try:
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        # Stream the upload in, rejecting oversized or non-PDF files before reading all of it
+        with span("upload_read"):
+            upload = await upload_service.receive_pdf(http_request)
         
-        # Read PDF content
-        content = await file.read()
-        
-        # Extract text
-        extracted_text = pdf_service.extract_text_from_pdf(content)
-        cleaned_text = pdf_service.clean_text(extracted_text)
+        result = await classify_pdf_content(http_request, upload)
+        return {"success": True, "filename": upload.filename, **result}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+@router.post("/classify-batch")
+async def classify_batch(request: BatchClassificationRequest, http_request: Request):
+    try:
+        if not request.items:
+            raise HTTPException(status_code=400, detail="No items to classify")
         
-        # Classify SDLC phases
-        classification_result = watsonx_service.classify_sdlc_phases(cleaned_text)
+        result = await inference.run(
+            http_request, classification_service.classify_batch, request.items, route="classify-batch"
+        )
         
         return {
             "success": True,
-            "filename": file.filename,
-            "extracted_text": cleaned_text[:1000] + "..." if len(cleaned_text) > 1000 else cleaned_text,
-            "classification": classification_result,
-            "text_length": len(cleaned_text)
+            "count": len(request.items),
+            "results": result["results"],
+            "batches": result["batches"],
+            "classification_seconds": result["seconds"]
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error classifying items: {str(e)}")
 
 @router.post("/generate-code")
-async def generate_code(request: CodeGenerationRequest):
+async def generate_code(request: CodeGenerationRequest, http_request: Request):
     try:
-        generated_code = watsonx_service.generate_code(request.prompt, request.language)
+        generated_code = await inference.run(
+            http_request, watsonx_service.generate_code, request.prompt, request.language, route="generate-code"
+        )
         
         return {
             "success": True,
@@ -59,35 +136,66 @@ async def generate_code(request: CodeGenerationRequest):
             "generated_code": generated_code
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating code: {str(e)}")
 
 @router.post("/fix-bug")
-async def fix_bug(request: BugFixRequest):
+async def fix_bug(request: BugFixRequest, http_request: Request):
     try:
-        fixed_code = watsonx_service.fix_bug(request.code, request.language)
+        # Large files are fixed function by function, in parallel
+        result = await inference.run(
+            http_request, code_service.fix_code, request.code, request.language, route="fix-bug"
+        )
         
         return {
             "success": True,
             "original_code": request.code,
             "language": request.language,
-            "fixed_code": fixed_code
+            "fixed_code": result["code"],
+            "chunks": result["chunks"]
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fixing bug: {str(e)}")
 
 @router.post("/generate-tests")
-async def generate_tests(request: TestGenerationRequest):
+async def generate_tests(request: TestGenerationRequest, http_request: Request):
     try:
-        test_cases = watsonx_service.generate_test_cases(request.code, request.language)
+        result = await inference.run(
+            http_request, code_service.generate_tests, request.code, request.language, route="generate-tests"
+        )
         
         return {
             "success": True,
             "original_code": request.code,
             "language": request.language,
-            "test_cases": test_cases
+            "test_cases": result["code"],
+            "chunks": result["chunks"]
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating tests: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error generating tests: {str(e)}")
+
+@router.post("/generate-code/stream")
+async def generate_code_stream(request: CodeGenerationRequest, http_request: Request):
+    return await inference.stream_response(
+        http_request, watsonx_service.generate_code, request.prompt, request.language, route="generate-code", stream=True
+    )
+
+@router.post("/fix-bug/stream")
+async def fix_bug_stream(request: BugFixRequest, http_request: Request):
+    return await inference.stream_response(
+        http_request, code_service.fix_code, request.code, request.language, route="fix-bug", stream=True
+    )
+
+@router.post("/generate-tests/stream")
+async def generate_tests_stream(request: TestGenerationRequest, http_request: Request):
+    return await inference.stream_response(
+        http_request, code_service.generate_tests, request.code, request.language, route="generate-tests", stream=True
+    )
\ No newline at end of file
@@ -1,29 +1,87 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from services.watsonx_service import watsonx_service
+from services.chat_service import chat_service
+from services.inference import inference
 
 router = APIRouter()
+_background = set()
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     success: bool
+    session_id: Optional[str] = None
+    cached: bool = False
+
+async def _compact(session_id: str):
+    try:
+        await inference.run(None, chat_service.compact, session_id, route="chat-summary")
+    except HTTPException as e:
+        # Rejected or failed; the turns are summarized after a later reply instead
+        print(f"Skipped summarizing chat session {session_id}: {e.detail}")
+
+def compact_in_background(session: dict):
+    """Fold old turns into the summary off the request path, at background priority"""
+    if chat_service.needs_compaction(session):
+        task = asyncio.ensure_future(_compact(session["id"]))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     try:
-        response = watsonx_service.chat_response(request.message)
+        session = await run_in_threadpool(chat_service.open, request.session_id)
+        # Paraphrases of earlier questions skip the scheduler and the model entirely
+        cached = await run_in_threadpool(chat_service.cached_reply, session, request.message)
+        if cached is not None:
+            return ChatResponse(response=cached, success=True, session_id=session["id"], cached=True)
+        
+        compact_in_background(session)
+        response = await inference.run(
+            http_request, chat_service.reply, session, request.message, route="chat"
+        )
         
         return ChatResponse(
             response=response,
-            success=True
+            success=True,
+            session_id=session["id"]
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    session = await run_in_threadpool(chat_service.open, request.session_id)
+    cached = await run_in_threadpool(chat_service.cached_reply, session, request.message)
+    if cached is not None:
+        return StreamingResponse(
+            iter([cached]), media_type="text/plain",
+            headers={"X-Session-Id": session["id"], "X-Cache": "semantic"}
+        )
+    
+    compact_in_background(session)
+    return await inference.stream_response(
+        http_request, chat_service.reply, session, request.message, route="chat", stream=True,
+        headers={"X-Session-Id": session["id"]}
+    )
+
+@router.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not await run_in_threadpool(chat_service.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "deleted": True}
+
 @router.get("/chat/health")
 async def chat_health():
-    return {"status": "healthy", "service": "chatbot"}
\ No newline at end of file
+    return {"status": "healthy", "service": "chatbot"}
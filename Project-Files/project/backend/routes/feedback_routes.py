@@ -1,15 +1,16 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from typing import Optional, List
-import json
-import os
 from datetime import datetime
+from services.feedback_store import feedback_store
+from services.feedback_stats import feedback_aggregates, store_snapshot
 
 router = APIRouter()
 
 class FeedbackRequest(BaseModel):
     feature: str
-    rating: int
+    rating: int = Field(..., ge=1, le=5)
     comment: Optional[str] = None
     user_id: Optional[str] = None
 
@@ -17,31 +18,9 @@ class FeedbackResponse(BaseModel):
     success: bool
     message: str
 
-# Simple file-based storage for feedback
-FEEDBACK_FILE = "feedback_data.json"
-
-def load_feedback():
-    try:
-        if os.path.exists(FEEDBACK_FILE):
-            with open(FEEDBACK_FILE, 'r') as f:
-                return json.load(f)
-        return []
-    except:
-        return []
-
-def save_feedback(feedback_list):
-    try:
-        with open(FEEDBACK_FILE, 'w') as f:
-            json.dump(feedback_list, f, indent=2)
-        return True
-    except:
-        return False
-
 @router.post("/submit", response_model=FeedbackResponse)
 async def submit_feedback(request: FeedbackRequest):
     try:
-        feedback_list = load_feedback()
-        
         new_feedback = {
             "feature": request.feature,
             "rating": request.rating,
@@ -50,50 +29,41 @@ async def submit_feedback(request: FeedbackRequest):
             "timestamp": datetime.now().isoformat()
         }
         
-        feedback_list.append(new_feedback)
+        # Runs in the threadpool so concurrent submissions share a group commit
+        await run_in_threadpool(feedback_store.add, new_feedback)
+        if not feedback_store.shared:
+            feedback_aggregates.record(new_feedback)
         
-        if save_feedback(feedback_list):
-            return FeedbackResponse(
-                success=True,
-                message="Feedback submitted successfully"
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save feedback")
+        return FeedbackResponse(
+            success=True,
+            message="Feedback submitted successfully"
+        )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error submitting feedback: {str(e)}")
 
 @router.get("/stats")
-async def get_feedback_stats():
+async def get_feedback_stats(window: Optional[str] = None):
     try:
-        feedback_list = load_feedback()
-        
-        if not feedback_list:
-            return {"total_feedback": 0, "average_rating": 0, "features": {}}
-        
-        total_feedback = len(feedback_list)
-        total_rating = sum(f.get("rating", 0) for f in feedback_list)
-        average_rating = total_rating / total_feedback if total_feedback > 0 else 0
-        
-        # Group by feature
-        features = {}
-        for feedback in feedback_list:
-            feature = feedback.get("feature", "unknown")
-            if feature not in features:
-                features[feature] = {"count": 0, "ratings": []}
-            features[feature]["count"] += 1
-            features[feature]["ratings"].append(feedback.get("rating", 0))
-        
-        # Calculate average rating per feature
-        for feature in features:
-            ratings = features[feature]["ratings"]
-            features[feature]["average_rating"] = sum(ratings) / len(ratings) if ratings else 0
-        
-        return {
-            "total_feedback": total_feedback,
-            "average_rating": round(average_rating, 2),
-            "features": features
-        }
+        # window can be "24h" or "7d"
+        if feedback_store.shared:
+            # Computed by the database, so every worker process gives the same answer
+            return await run_in_threadpool(store_snapshot, feedback_store, window)
+        # Served from running aggregates
+        return feedback_aggregates.snapshot(window)
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting feedback stats: {str(e)}")
+
+@router.get("/entries")
+async def list_feedback(feature: Optional[str] = None, since: Optional[str] = None,
+                        until: Optional[str] = None, limit: int = 50):
+    try:
+        entries = await run_in_threadpool(feedback_store.query, feature=feature, since=since,
+                                          until=until, limit=limit)
+        return {"count": len(entries), "entries": entries}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error getting feedback stats: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error listing feedback: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from services.job_queue import job_queue, SUCCEEDED
+from services.upload_service import upload_service
+from routes.ai_routes import classify_pdf_content, PDF_UPLOAD_BODY
+
+router = APIRouter()
+
+@router.post("/classify-pdf", status_code=202, openapi_extra=PDF_UPLOAD_BODY)
+async def submit_pdf_job(request: Request):
+    upload = None
+    try:
+        upload = await upload_service.receive_pdf(request)
+        received = upload
+
+        async def classify(context):
+            result = await classify_pdf_content(None, received, job=context)
+            return {"success": True, "filename": received.filename, **result}
+
+        # From here the job owns the upload and closes it when it ends
+        job = await job_queue.submit(
+            "classify-pdf",
+            classify,
+            label=upload.filename,
+            progress={"pages_total": 0, "pages_extracted": 0, "chunks_total": 0, "chunks_classified": 0},
+            cleanup=upload.close
+        )
+        upload = None
+        return JSONResponse(
+            status_code=202,
+            content=job,
+            headers={"Location": f"/api/jobs/{job['job_id']}"}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+    finally:
+        # Set only if the job was never queued
+        if upload is not None:
+            upload.close()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_queue.status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await run_in_threadpool(job_queue.result, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] != SUCCEEDED:
+        detail = job["error"] or f"Job is {job['status']}"
+        raise HTTPException(status_code=409, detail=detail)
+    return job["result"]
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    if await run_in_threadpool(job_queue.cancel, job_id):
+        return {"job_id": job_id, "cancel_requested": True}
+    if await run_in_threadpool(job_queue.status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    raise HTTPException(status_code=409, detail="Job has already finished")
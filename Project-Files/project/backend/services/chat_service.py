@@ -0,0 +1,329 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.metrics import metrics
+from services.prompt_templates import estimate_tokens, truncate_text
+from services.resilience import ModelServiceError
+from services.semantic_cache import SemanticCache
+from services.watsonx_service import watsonx_service
+
+
+class ChatSessionStore:
+    """SQLite tables of chat sessions and their turns, shared by every server worker process.
+
+    A session row holds the rolling summary and the id of the last turn folded
+    into it; turns are appended as separate rows so concurrent replies in one
+    session never overwrite each other. Summarized turns are deleted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', summarized_through INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "user TEXT NOT NULL, assistant TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_used_at ON chat_sessions(used_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns(session_id, id)")
+        self._conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute("INSERT INTO chat_sessions (id, created_at, used_at) VALUES (?, ?, ?)",
+                      (session_id, now, now))
+        return session_id
+
+    def get(self, session_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """The session's summary and unsummarized turns, oldest first; None if unknown or idle past ``ttl``"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_through, used_at FROM chat_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[2] < time.time() - ttl:
+                return None
+            turns = self._conn.execute(
+                "SELECT id, user, assistant FROM chat_turns WHERE session_id = ? AND id > ? ORDER BY id",
+                (session_id, row[1])
+            ).fetchall()
+            self._conn.execute("UPDATE chat_sessions SET used_at = ? WHERE id = ?", (time.time(), session_id))
+            self._conn.commit()
+        return {
+            "id": session_id,
+            "summary": row[0],
+            "summarized_through": row[1],
+            "turns": [{"id": turn_id, "user": user, "assistant": assistant} for turn_id, user, assistant in turns],
+        }
+
+    def add_turn(self, session_id: str, user: str, assistant: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_turns (session_id, user, assistant, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, user, assistant, now)
+            )
+            self._conn.execute("UPDATE chat_sessions SET used_at = ? WHERE id = ?", (now, session_id))
+            self._conn.commit()
+
+    def set_summary(self, session_id: str, summary: str, through: int) -> bool:
+        """Store a summary covering turns up to ``through``, unless a newer one got there first"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE chat_sessions SET summary = ?, summarized_through = ? WHERE id = ? AND summarized_through < ?",
+                (summary, through, session_id, through)
+            )
+            if cursor.rowcount:
+                self._conn.execute("DELETE FROM chat_turns WHERE session_id = ? AND id <= ?", (session_id, through))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+            self._conn.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def evict(self, ttl: float, max_sessions: int) -> int:
+        """Drop sessions idle for longer than ``ttl`` and the least recently used beyond ``max_sessions``"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM chat_sessions WHERE used_at < ? OR id IN (SELECT id FROM chat_sessions "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (time.time() - ttl, max_sessions)
+            )
+            self._conn.execute("DELETE FROM chat_turns WHERE session_id NOT IN (SELECT id FROM chat_sessions)")
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0],
+                "turns": self._conn.execute("SELECT COUNT(*) FROM chat_turns").fetchone()[0],
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ChatService:
+    """Multi-turn chat with a prompt that stays the same size however long the conversation gets.
+
+    Recent turns go into the prompt verbatim. Once ``summary_batch`` turns have
+    fallen out of the last ``history_turns``, :meth:`compact` folds them into a
+    rolling summary in the background, so it never adds to the user's wait.
+    The history section is capped at ``context_tokens``; the oldest turns are
+    the first to be cut when they do not all fit.
+    """
+
+    def __init__(self, model_service=None, path: str = None, history_turns: int = None,
+                 context_tokens: int = None, ttl: float = None, max_sessions: int = None):
+        self.model_service = model_service or watsonx_service
+        self.path = path or os.getenv("CHAT_SESSION_DB", "chat_sessions.db")
+        self.history_turns = history_turns or int(os.getenv("CHAT_HISTORY_TURNS", "4"))
+        self.context_tokens = context_tokens or int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+        # Summarize once this many turns have left the window, not after every reply
+        self.summary_batch = int(os.getenv("CHAT_SUMMARY_BATCH", "2"))
+        self.summary_words = int(os.getenv("CHAT_SUMMARY_WORDS", "150"))
+        self.ttl = ttl or float(os.getenv("CHAT_SESSION_TTL", "3600"))
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+        self._store: Optional[ChatSessionStore] = None
+        # Separate from _lock, which is held around some store calls
+        self._open_lock = threading.Lock()
+        self.semantic_cache = SemanticCache(namespace=self.model_service.cache_namespace())
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self._writes = 0
+        self.compactions = 0
+        self.compaction_errors = 0
+        self.history_tokens = 0
+        self.replies = 0
+
+    @property
+    def store(self) -> ChatSessionStore:
+        # Opened on first use so importing the service does not create the file
+        if self._store is None:
+            with self._open_lock:
+                # Concurrent first requests must share one connection
+                if self._store is None:
+                    self._store = ChatSessionStore(self.path)
+        return self._store
+
+    def open(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Load a session, starting a new one if ``session_id`` is missing, unknown or expired"""
+        session = self.store.get(session_id, self.ttl) if session_id else None
+        if session is None:
+            session = {"id": self.store.create(), "summary": "", "summarized_through": 0, "turns": []}
+        return session
+
+    @staticmethod
+    def _format_turn(turn: Dict[str, str]) -> str:
+        return f"User: {turn['user']}\nAssistant: {turn['assistant']}\n"
+
+    def build_history(self, session: Dict[str, Any]) -> str:
+        """The conversation so far, as it goes into the prompt: summary plus recent turns within budget"""
+        summary = session["summary"]
+        # Turns waiting to be summarized still count, as long as they fit
+        recent = session["turns"]
+        if not summary and not recent:
+            return ""
+        budget = self.context_tokens
+        summary_text = ""
+        if summary:
+            summary_text = "Summary of the earlier conversation: " + truncate_text(summary, budget // 3) + "\n\n"
+            budget -= estimate_tokens(summary_text)
+        # Newest turns first, so the oldest are the ones cut when they do not all fit
+        kept: List[str] = []
+        for turn in reversed(recent):
+            text = self._format_turn(turn)
+            cost = estimate_tokens(text)
+            if cost > budget:
+                if budget > 50:
+                    kept.append(truncate_text(text, budget, "head_tail"))
+                break
+            kept.append(text)
+            budget -= cost
+        return "Conversation so far:\n" + summary_text + "\n".join(reversed(kept)) + "\n"
+
+    def needs_compaction(self, session: Dict[str, Any]) -> bool:
+        return len(session["turns"]) >= self.history_turns + self.summary_batch
+
+    def _record(self, session: Dict[str, Any], message: str, answer: str):
+        self.store.add_turn(session["id"], message, answer)
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 100 == 0
+        if evict:
+            self.store.evict(self.ttl, self.max_sessions)
+
+    @staticmethod
+    def is_standalone(session: Dict[str, Any]) -> bool:
+        """Whether a question in this session means the same as it would on its own"""
+        return not session["summary"] and not session["turns"]
+
+    def cached_reply(self, session: Dict[str, Any], message: str) -> Optional[str]:
+        """Answer from the semantic cache without a model call, if a close paraphrase was answered before.
+
+        Only opening questions are looked up: a follow-up depends on the
+        conversation, so the same words may need a different answer.
+        """
+        if not self.is_standalone(session):
+            return None
+        match = self.semantic_cache.lookup(message)
+        if match is None:
+            return None
+        self._record(session, message, match["answer"])
+        return match["answer"]
+
+    def _stream_and_record(self, session: Dict[str, Any], message: str, chunks: Iterator[str]) -> Iterator[str]:
+        produced: List[str] = []
+        finished = False
+        try:
+            for chunk in chunks:
+                produced.append(chunk)
+                yield chunk
+            finished = True
+        finally:
+            # A reply cut short by a disconnect was still seen by the user, but is not reused
+            if produced:
+                self._record(session, message, "".join(produced))
+            if finished and self.is_standalone(session):
+                self.semantic_cache.add(message, "".join(produced))
+
+    def reply(self, session: Dict[str, Any], message: str, stream: bool = False):
+        """Answer ``message`` in the context of ``session`` and append the turn to it"""
+        history = self.build_history(session)
+        with self._lock:
+            self.replies += 1
+            self.history_tokens += estimate_tokens(history)
+        if stream:
+            chunks = self.model_service.chat_response(message, stream=True, history=history)
+            return self._stream_and_record(session, message, chunks)
+        answer = self.model_service.chat_response(message, history=history)
+        self._record(session, message, answer)
+        if self.is_standalone(session):
+            self.semantic_cache.add(message, answer)
+        return answer
+
+    def compact(self, session_id: str) -> bool:
+        """Fold turns older than the verbatim window into the session's rolling summary"""
+        with self._lock:
+            if session_id in self._compacting:
+                return False
+            self._compacting.add(session_id)
+        try:
+            session = self.store.get(session_id, self.ttl)
+            if session is None or not self.needs_compaction(session):
+                return False
+            older = session["turns"][:-self.history_turns]
+            # Long answers (code, mostly) are trimmed so one call can cover several turns
+            turns = "\n".join(truncate_text(self._format_turn(turn), 600, "head_tail") for turn in older)
+            summary = self.model_service.summarize_conversation(session["summary"], turns, self.summary_words)
+            stored = self.store.set_summary(session_id, summary.strip(), older[-1]["id"])
+            with self._lock:
+                self.compactions += int(stored)
+            return stored
+        except ModelServiceError as e:
+            # The turns stay unsummarized and are retried after the next reply
+            print(f"Error summarizing chat session {session_id}: {str(e.detail)}")
+            with self._lock:
+                self.compaction_errors += 1
+            return False
+        finally:
+            with self._lock:
+                self._compacting.discard(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        return self.store.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.store.counts(),
+            "history_turns": self.history_turns,
+            "context_tokens": self.context_tokens,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+            "replies": self.replies,
+            "avg_history_tokens": round(self.history_tokens / self.replies, 1) if self.replies else 0.0,
+            "compactions": self.compactions,
+            "compaction_errors": self.compaction_errors,
+        }
+
+    def close(self):
+        self.semantic_cache.save()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+
+# Global instance
+chat_service = ChatService()
+metrics.register_collector(lambda: {
+    "smartsdlc_chat_replies_total": chat_service.replies,
+    "smartsdlc_chat_history_tokens_total": chat_service.history_tokens,
+    "smartsdlc_chat_compactions_total": chat_service.compactions,
+    "smartsdlc_chat_compaction_errors_total": chat_service.compaction_errors,
+    "smartsdlc_chat_semantic_cache_entries": len(chat_service.semantic_cache),
+    "smartsdlc_chat_semantic_cache_hits_total": chat_service.semantic_cache.hits,
+    "smartsdlc_chat_semantic_cache_misses_total": chat_service.semantic_cache.misses,
+})
@@ -0,0 +1,388 @@
+import contextvars
+import hashlib
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, field_validator
+
+from services.document_cache import DocumentCache
+from services.metrics import span
+from services.pdf_service import PDFService, PDFSource
+from services.prompt_templates import estimate_tokens
+from services.resilience import ModelServiceError
+from services.structured_output import parse_json_object
+from services.watsonx_service import watsonx_service
+
+SDLC_PHASES = ["Requirements", "Design", "Development", "Testing", "Deployment", "Maintenance"]
+
+_NUMBERED_LINE = re.compile(r"^\s*(\d+)\s*[:.)\-]\s*\**([A-Za-z]+)")
+
+
+class SDLCClassification(BaseModel):
+    """Sentences grouped by SDLC phase"""
+
+    Requirements: List[str] = []
+    Design: List[str] = []
+    Development: List[str] = []
+    Testing: List[str] = []
+    Deployment: List[str] = []
+    Maintenance: List[str] = []
+
+    @field_validator(*SDLC_PHASES, mode="before")
+    @classmethod
+    def _sentences(cls, value):
+        # Models sometimes answer a phase with a bare string or null
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return []
+        return [str(s).strip() for s in value if isinstance(s, (str, int, float)) and str(s).strip()]
+
+
+def parse_classification(raw: str) -> Tuple[Optional[Dict[str, List[str]]], bool]:
+    """Pull the phase -> sentences object out of a model response.
+
+    Tolerates prose around the JSON, differently cased phase names and
+    truncated output. Returns ``(phases, repaired)`` where ``phases`` holds only
+    the phases the model actually answered, validated by SDLCClassification.
+    """
+    data, repaired = parse_json_object(raw)
+    if data is None:
+        return None, False
+    names = {phase.lower(): phase for phase in SDLC_PHASES}
+    present = {names[key.strip().lower()]: value for key, value in data.items()
+               if isinstance(key, str) and key.strip().lower() in names}
+    validated = SDLCClassification(**present)
+    return {phase: getattr(validated, phase) for phase in present}, repaired
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", sentence.lower()))
+
+
+def parse_numbered_phases(raw: str, count: int) -> Dict[int, str]:
+    """Map 1-based item numbers to phases from ``"<n>: <Phase>"`` lines"""
+    phases = {phase.lower(): phase for phase in SDLC_PHASES}
+    found = {}
+    for line in raw.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if not match:
+            continue
+        number, phase = int(match.group(1)), phases.get(match.group(2).lower())
+        if 1 <= number <= count and phase and number not in found:
+            found[number] = phase
+    return found
+
+
+class ClassificationService:
+    """Map-reduce SDLC classification for documents of any length.
+
+    The text is split into sentence-aligned chunks that fit a per-call token
+    budget, chunks are classified concurrently with bounded fan-out, and the
+    per-phase results are merged back in document order. Page text and chunk
+    results are cached by fingerprint, so a revised upload only sends its new
+    or changed chunks to the model.
+    """
+
+    def __init__(self, model_service=None, pdf_service: PDFService = None,
+                 chunk_tokens: int = None, max_parallel: int = None,
+                 document_cache: DocumentCache = None):
+        self.model_service = model_service or watsonx_service
+        self.pdf_service = pdf_service or PDFService()
+        self.document_cache = document_cache or DocumentCache()
+        # Sentences are echoed back in the output, so a chunk has to fit
+        # inside MAX_NEW_TOKENS as well as the context window
+        self.chunk_tokens = chunk_tokens or int(os.getenv("CLASSIFY_CHUNK_TOKENS", "700"))
+        self.max_parallel = max_parallel or int(os.getenv("CLASSIFY_MAX_PARALLEL", "4"))
+        # On average one sentence in this many may end a chunk early (see chunk_text)
+        self.anchor_period = int(os.getenv("CLASSIFY_CHUNK_ANCHOR_PERIOD", "8"))
+        self.reask_missing = os.getenv("CLASSIFY_REASK_MISSING", "true").lower() != "false"
+        # Batched items only cost a few output tokens each, so batches can be
+        # larger than chunks but are capped by item count to bound the answer
+        self.batch_tokens = int(os.getenv("CLASSIFY_BATCH_TOKENS", "1500"))
+        self.batch_max_items = int(os.getenv("CLASSIFY_BATCH_MAX_ITEMS", "50"))
+
+    def _is_anchor(self, sentence: str) -> bool:
+        return zlib.crc32(sentence.encode("utf-8")) % self.anchor_period == 0
+
+    def chunk_text(self, text: str) -> List[str]:
+        """Pack sentences into chunks of at most ``chunk_tokens`` estimated tokens.
+
+        Chunks also end at content-defined anchor sentences once they are half
+        full, so an edit in a revised document only shifts boundaries up to the
+        next anchor and later chunks keep their cached results.
+        """
+        chunks = []
+        current: List[str] = []
+        current_tokens = 0
+
+        for sentence in self.pdf_service.split_into_sentences(text):
+            sentence_tokens = estimate_tokens(sentence)
+
+            # A single oversized sentence gets split on word boundaries
+            if sentence_tokens > self.chunk_tokens:
+                words = sentence.split()
+                step = max(1, len(words) * self.chunk_tokens // sentence_tokens)
+                pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+            else:
+                pieces = [sentence]
+
+            for piece in pieces:
+                piece_tokens = estimate_tokens(piece)
+                if current and current_tokens + piece_tokens > self.chunk_tokens:
+                    chunks.append(". ".join(current) + ".")
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+                if current_tokens >= self.chunk_tokens // 2 and self._is_anchor(piece):
+                    chunks.append(". ".join(current) + ".")
+                    current, current_tokens = [], 0
+
+        if current:
+            chunks.append(". ".join(current) + ".")
+        return chunks
+
+    def chunk_key(self, chunk: str) -> str:
+        return self.document_cache.fingerprint(self.model_service.cache_namespace(), chunk)
+
+    def _reask_missing(self, chunk: str, parsed: Optional[Dict[str, List[str]]], repaired: bool) -> bool:
+        """Ask again about sentences left unassigned, listing only the phases the answer lacked.
+
+        Fills ``parsed`` in place; returns whether a re-ask was made.
+        """
+        missing = [phase for phase in SDLC_PHASES if phase not in (parsed or {})]
+        if repaired and parsed:
+            # The phase being written when the output was cut off may be incomplete too
+            missing.append(list(parsed)[-1])
+        if not missing:
+            return False
+        assigned = {_normalize(s) for sentences in (parsed or {}).values() for s in sentences}
+        leftover = [s for s in self.pdf_service.split_into_sentences(chunk) if _normalize(s) not in assigned]
+        if not leftover:
+            return False
+
+        raw = self.model_service.classify_sdlc_phases(". ".join(leftover) + ".", phases=missing)
+        answer, _ = parse_classification(raw)
+        for phase, sentences in (answer or {}).items():
+            if phase in missing:
+                existing = parsed.setdefault(phase, [])
+                existing.extend(s for s in sentences if _normalize(s) not in assigned)
+        return True
+
+    def classify_chunk(self, index: int, chunk: str, cached: Optional[Dict] = None, job=None) -> Dict:
+        started = time.perf_counter()
+        if cached is not None:
+            return {
+                "index": index,
+                "tokens": estimate_tokens(chunk),
+                "seconds": 0.0,
+                "parsed": True,
+                "repaired": False,
+                "reasked": False,
+                "error": None,
+                "reused": True,
+                "result": cached,
+                "exception": None,
+            }
+
+        if job is not None:
+            job.check_cancelled()
+        error, parsed, repaired, reasked = None, None, False, False
+        try:
+            with span("classify_chunk"):
+                raw = self.model_service.classify_sdlc_phases(chunk)
+                parsed, repaired = parse_classification(raw)
+                if self.reask_missing:
+                    answered = parsed if parsed is not None else {}
+                    reasked = self._reask_missing(chunk, answered, repaired)
+                    parsed = answered or parsed
+        except ModelServiceError as e:
+            # One failed chunk should not sink the rest of the document
+            error = e
+        if job is not None:
+            job.advance("chunks_classified")
+        return {
+            "index": index,
+            "tokens": estimate_tokens(chunk),
+            "seconds": round(time.perf_counter() - started, 3),
+            "parsed": parsed is not None,
+            "repaired": repaired,
+            "reasked": reasked,
+            "error": error.detail if error else None,
+            "reused": False,
+            "result": SDLCClassification(**parsed).model_dump() if parsed is not None else {},
+            "exception": error if parsed is None else None,
+        }
+
+    @staticmethod
+    def _raise_if_all_failed(results: List[Dict]):
+        errors = [r.pop("exception") for r in results]
+        if errors and all(errors):
+            raise errors[0]
+
+    @staticmethod
+    def merge(results: List[Dict]) -> Dict[str, List[str]]:
+        """Merge per-chunk results in chunk order, dropping repeated sentences"""
+        merged: Dict[str, List[str]] = {phase: [] for phase in SDLC_PHASES}
+        seen = {phase: set() for phase in SDLC_PHASES}
+        for result in sorted(results, key=lambda r: r["index"]):
+            for phase, sentences in result["result"].items():
+                for sentence in sentences:
+                    if sentence not in seen[phase]:
+                        seen[phase].add(sentence)
+                        merged[phase].append(sentence)
+        return merged
+
+    def classify_document(self, text: str, document_key: str = None, extra: Dict = None, job=None) -> Dict:
+        """Classify ``text`` chunk by chunk, reusing cached chunk results.
+
+        With a ``document_key`` the finished result (plus ``extra`` fields) is
+        stored so an identical upload can skip classification entirely. A
+        background ``job`` context gets progress updates and can cancel
+        between chunks.
+        """
+        started = time.perf_counter()
+        with span("chunk_text"):
+            chunks = self.chunk_text(text)
+        keys = [self.chunk_key(chunk) for chunk in chunks]
+        cached = self.document_cache.get_many("chunks", keys)
+        if job is not None:
+            job.update(stage="classifying", chunks_total=len(chunks),
+                       chunks_classified=sum(key in cached for key in keys))
+
+        if sum(key not in cached for key in keys) <= 1:
+            results = [self.classify_chunk(i, c, cached.get(k), job) for i, (c, k) in enumerate(zip(chunks, keys))]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(chunks))) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self.classify_chunk, i, chunk,
+                                    cached.get(key), job)
+                    for i, (chunk, key) in enumerate(zip(chunks, keys))
+                ]
+                results = [future.result() for future in futures]
+
+        self._raise_if_all_failed(results)
+        # Only well-formed answers are worth keeping; failed chunks are retried next time
+        self.document_cache.put_many("chunks", [
+            (key, result["result"]) for key, result in zip(keys, results)
+            if result["parsed"] and not result["reused"] and not result["error"]
+        ])
+
+        document = {
+            "classification": self.merge(results),
+            "chunks": [{k: v for k, v in r.items() if k != "result"} for r in results],
+            "chunks_reused": sum(r["reused"] for r in results),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        if document_key is not None and all(r["parsed"] and not r["error"] for r in results):
+            self.document_cache.put("documents", document_key, {**document, **(extra or {})})
+        return document
+
+    def prepare_pdf(self, pdf_content: PDFSource, job=None, digest: str = None) -> Dict:
+        """Look up a previously classified copy of the file, else extract its text reusing cached pages.
+
+        ``digest`` is the file's SHA-256 when the caller already has it (uploads
+        are hashed while they are read); otherwise in-memory content is hashed here.
+        """
+        document_key = self.document_cache.fingerprint(
+            self.model_service.cache_namespace(), digest or hashlib.sha256(pdf_content).hexdigest()
+        )
+        cached = self.document_cache.get("documents", document_key)
+        if cached is not None:
+            return {"document_key": document_key, "cached": cached}
+
+        fingerprints = self.pdf_service.page_fingerprints(pdf_content)
+        pages = self.document_cache.get_many("pages", fingerprints)
+        missing = [n for n, fingerprint in enumerate(fingerprints) if fingerprint not in pages]
+        # Background jobs extract in slices so progress moves and cancels land quickly
+        step = max(len(missing), 1) if job is None else self.pdf_service.parallel_min_pages
+        if job is not None:
+            job.update(stage="extracting", pages_total=len(fingerprints),
+                       pages_extracted=len(fingerprints) - len(missing))
+        for start in range(0, len(missing), step):
+            if job is not None:
+                job.check_cancelled()
+            numbers = missing[start:start + step]
+            extracted = self.pdf_service.extract_selected_pages(pdf_content, numbers, clean=True)
+            self.document_cache.put_many("pages", [(fingerprints[n], extracted[n]) for n in numbers])
+            pages.update((fingerprints[n], extracted[n]) for n in numbers)
+            if job is not None:
+                job.advance("pages_extracted", len(numbers))
+
+        text = " ".join(page for page in (pages[fingerprint] for fingerprint in fingerprints) if page)
+        return {
+            "document_key": document_key,
+            "cached": None,
+            "text": text,
+            "pages": len(fingerprints),
+            "pages_reused": len(fingerprints) - len(missing),
+        }
+
+    def pack_batches(self, items: List[str]) -> List[List[int]]:
+        """Group item indexes into batches that fit the batch token and item budgets"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, item in enumerate(items):
+            item_tokens = estimate_tokens(item) + 2  # numbering and newline
+            if current and (current_tokens + item_tokens > self.batch_tokens
+                            or len(current) >= self.batch_max_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += item_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def classify_item_batch(self, batch_number: int, items: List[str], indexes: List[int]) -> Dict:
+        started = time.perf_counter()
+        error = None
+        try:
+            with span("classify_batch"):
+                raw = self.model_service.classify_numbered_items([items[i] for i in indexes])
+            found = parse_numbered_phases(raw, len(indexes))
+        except ModelServiceError as e:
+            error, found = e, {}
+        return {
+            "batch": batch_number,
+            "items": len(indexes),
+            "classified": len(found),
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": error.detail if error else None,
+            "phases": {indexes[number - 1]: phase for number, phase in found.items()},
+            "exception": error,
+        }
+
+    def classify_batch(self, items: List[str]) -> Dict:
+        """Classify many independent texts, several per model call, batches in parallel"""
+        started = time.perf_counter()
+        batches = self.pack_batches(items)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel, len(batches)))) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.classify_item_batch, n, items, indexes)
+                for n, indexes in enumerate(batches)
+            ]
+            results = [future.result() for future in futures]
+
+        self._raise_if_all_failed(results)
+        phases: Dict[int, str] = {}
+        for result in results:
+            phases.update(result.pop("phases"))
+
+        return {
+            "results": [{"index": i, "phase": phases.get(i)} for i in range(len(items))],
+            "batches": results,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+# Global instance
+classification_service = ClassificationService()
@@ -0,0 +1,246 @@
+import contextvars
+import os
+import re
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.classification_service import classification_service
+from services.code_splitter import IMPORT_LINE, VERBATIM_KINDS, CodeChunk, CodeSegment, pack_chunks, split_code
+from services.document_cache import DocumentCache
+from services.metrics import span
+from services.prompt_templates import estimate_tokens
+from services.resilience import ModelServiceError
+from services.watsonx_service import watsonx_service
+
+_CODE_BLOCK = re.compile(r"```[\w+#.-]*[^\S\n]*\n(.*?)(?:```|\Z)", re.DOTALL)
+
+
+def line_comment(language: str) -> str:
+    return "#" if language == "python" else "//"
+
+
+def extract_code(raw: str) -> Tuple[str, str]:
+    """Split a model answer into ``(code, notes)``: the first fenced block and the prose around it"""
+    match = _CODE_BLOCK.search(raw)
+    if match is None:
+        return raw.strip("\n"), ""
+    return match.group(1).strip("\n"), (raw[:match.start()] + raw[match.end():]).strip()
+
+
+def _indent_of(text: str) -> str:
+    indents = [line[:len(line) - len(line.lstrip())] for line in text.splitlines() if line.strip()]
+    return min(indents, key=len) if indents else ""
+
+
+def fit_to_original(code: str, original: str, context: str) -> str:
+    """Make a rewritten chunk drop back into the file where the original was"""
+    lines = code.splitlines()
+    # Models like to repeat the imports they were shown
+    context_lines = {line.strip() for line in context.splitlines() if line.strip()}
+    original_lines = {line.strip() for line in original.splitlines()}
+    while lines and (not lines[0].strip() or (lines[0].strip() in context_lines
+                                                and lines[0].strip() not in original_lines)):
+        lines.pop(0)
+    code = "\n".join(lines)
+    # Methods split out of a class come back dedented
+    indent = _indent_of(original)
+    if _indent_of(code) != indent:
+        code = textwrap.indent(textwrap.dedent(code), indent)
+    leading = original[:len(original) - len(original.lstrip("\n"))]
+    trailing = original[len(original.rstrip()):]
+    return leading + code.rstrip() + (trailing or "\n")
+
+
+class CodeService:
+    """Fix-bug and test generation for files too large for one prompt.
+
+    Code over ``chunk_tokens`` is split into functions and classes (see
+    :func:`split_code`), packed into chunks that each carry the imports and
+    enclosing class header they need, and the chunks are sent to the model in
+    parallel. Fixed chunks are stitched back in place; generated tests are
+    concatenated into one module. Per-chunk outputs are cached, so resubmitting
+    a file only re-runs the functions that changed.
+    """
+
+    def __init__(self, model_service=None, document_cache: DocumentCache = None,
+                 chunk_tokens: int = None, max_parallel: int = None):
+        self.model_service = model_service or watsonx_service
+        self.document_cache = document_cache or DocumentCache()
+        self.chunk_tokens = chunk_tokens or int(os.getenv("CODE_CHUNK_TOKENS", "800"))
+        self.max_parallel = max_parallel or int(os.getenv("CODE_MAX_PARALLEL", "4"))
+
+    def plan(self, code: str, language: str) -> Optional[Tuple[List[CodeSegment], List[CodeChunk]]]:
+        """Segments and chunks for ``code``, or None when it is small enough for a single prompt"""
+        if estimate_tokens(code) <= self.chunk_tokens:
+            return None
+        with span("split_code"):
+            segments = split_code(code, language.lower(), self.chunk_tokens)
+            chunks = pack_chunks(segments, self.chunk_tokens)
+        return (segments, chunks) if len(chunks) > 1 else None
+
+    def chunk_key(self, task: str, language: str, chunk: CodeChunk) -> str:
+        return self.document_cache.fingerprint(
+            self.model_service.cache_namespace(), task, language, chunk.context, chunk.text
+        )
+
+    def _process_chunk(self, task: str, generate: Callable, language: str, chunk: CodeChunk,
+                       cached: Optional[Dict]) -> Dict:
+        started = time.perf_counter()
+        output, error = cached, None
+        if cached is None:
+            try:
+                with span(f"{task}_chunk"):
+                    code, notes = extract_code(generate(chunk.text, chunk.context, language))
+                output = {"code": code, "notes": notes}
+            except ModelServiceError as e:
+                # One failed chunk should not sink the rest of the file
+                error = e
+        return {
+            "index": chunk.index,
+            "names": chunk.names,
+            "start_line": chunk.start_line,
+            "end_line": chunk.end_line,
+            "tokens": estimate_tokens(chunk.text),
+            "seconds": round(time.perf_counter() - started, 3),
+            "reused": cached is not None,
+            "error": error.detail if error else None,
+            "output": output,
+            "exception": error,
+        }
+
+    def _results(self, task: str, generate: Callable, language: str,
+                 chunks: List[CodeChunk]) -> Iterator[Dict]:
+        """Process chunks in parallel, yielding results in file order as they become available"""
+        keys = [self.chunk_key(task, language, chunk) for chunk in chunks]
+        cached = self.document_cache.get_many("code", keys)
+        executor = ThreadPoolExecutor(max_workers=min(self.max_parallel, len(chunks)))
+        try:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._process_chunk, task, generate,
+                                language, chunk, cached.get(key))
+                for chunk, key in zip(chunks, keys)
+            ]
+            for key, future in zip(keys, futures):
+                result = future.result()
+                if result["output"] is not None and not result["reused"]:
+                    self.document_cache.put("code", key, result["output"])
+                yield result
+        finally:
+            # A closed stream leaves nothing to wait for
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fixed_pieces(self, segments: List[CodeSegment], chunks: List[CodeChunk], language: str,
+                      report: List[Dict], stream: bool) -> Iterator[str]:
+        results = self._results("fix_bug", self.model_service.fix_bug_chunk, language, chunks)
+        chunk_of = {id(segment): chunk for chunk in chunks for segment in chunk.segments}
+        notes: List[str] = []
+        # Verbatim lines wait for the first model answer, so a stream that is
+        # going to fail has not started yet and can still get a real status code
+        pending: List[str] = []
+        try:
+            for segment in segments:
+                if segment.kind in VERBATIM_KINDS:
+                    pending.append(segment.text)
+                    if report:
+                        yield "".join(pending)
+                        pending.clear()
+                    continue
+                chunk = chunk_of[id(segment)]
+                if chunk.segments[0] is not segment:
+                    continue
+                result = next(results)
+                if stream and not report and result["exception"] is not None:
+                    raise result["exception"]
+                report.append(result)
+                label = ", ".join(chunk.names) or f"lines {chunk.start_line}-{chunk.end_line}"
+                if result["output"] is None:
+                    notes.append(f"{label}: not checked ({result['error']})")
+                    pending.append(chunk.text)
+                else:
+                    notes.extend(f"{label}: {line.strip()}"
+                                 for line in result["output"]["notes"].splitlines() if line.strip())
+                    pending.append(fit_to_original(result["output"]["code"], chunk.text, chunk.context))
+                yield "".join(pending)
+                pending.clear()
+        finally:
+            results.close()
+
+        if pending:
+            yield "".join(pending)
+        if notes:
+            comment = line_comment(language)
+            yield f"\n{comment} Fixes:\n" + "".join(f"{comment} - {note}\n" for note in notes)
+
+    def _test_pieces(self, chunks: List[CodeChunk], language: str, report: List[Dict],
+                     stream: bool) -> Iterator[str]:
+        results = self._results("generate_tests", self.model_service.generate_test_cases_chunk, language, chunks)
+        seen_imports = set()
+        comment = line_comment(language)
+        separator = ""
+        try:
+            for result in results:
+                if stream and not report and result["exception"] is not None:
+                    raise result["exception"]
+                report.append(result)
+                if result["output"] is None:
+                    continue
+                # Imports already emitted for an earlier chunk are not repeated
+                lines = [line for line in result["output"]["code"].splitlines()
+                         if not (IMPORT_LINE.match(line) and line.strip() in seen_imports)]
+                seen_imports.update(line.strip() for line in lines if IMPORT_LINE.match(line))
+                body = "\n".join(lines).strip("\n")
+                if body:
+                    label = ", ".join(result["names"]) or f"lines {result['start_line']}-{result['end_line']}"
+                    yield f"{separator}{comment} Tests for {label}\n{body}\n"
+                    separator = "\n\n"
+        finally:
+            results.close()
+
+    @staticmethod
+    def _finish(pieces: Iterator[str], report: List[Dict], started: float) -> Dict:
+        text = "".join(pieces)
+        errors = [result.pop("exception") for result in report]
+        if errors and all(errors):
+            raise errors[0]
+        return {
+            "code": text,
+            "chunks": [{k: v for k, v in r.items() if k != "output"} for r in report],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def fix_code(self, code: str, language: str = "python", stream: bool = False):
+        """Fix ``code`` in one prompt, or chunk by chunk when it is too large.
+
+        Returns ``{"code", "chunks", "seconds"}``, or a generator of text when
+        ``stream`` is set. Chunks that fail keep their original code and are
+        listed in a trailing comment.
+        """
+        started = time.perf_counter()
+        plan = self.plan(code, language)
+        if plan is None:
+            if stream:
+                return self.model_service.fix_bug(code, language, stream=True)
+            return {"code": self.model_service.fix_bug(code, language), "chunks": [],
+                    "seconds": round(time.perf_counter() - started, 3)}
+        report: List[Dict] = []
+        pieces = self._fixed_pieces(*plan, language, report, stream)
+        return pieces if stream else self._finish(pieces, report, started)
+
+    def generate_tests(self, code: str, language: str = "python", stream: bool = False):
+        """Generate tests for ``code`` in one prompt, or chunk by chunk when it is too large"""
+        started = time.perf_counter()
+        plan = self.plan(code, language)
+        if plan is None:
+            if stream:
+                return self.model_service.generate_test_cases(code, language, stream=True)
+            return {"code": self.model_service.generate_test_cases(code, language), "chunks": [],
+                    "seconds": round(time.perf_counter() - started, 3)}
+        report: List[Dict] = []
+        pieces = self._test_pieces(plan[1], language, report, stream)
+        return pieces if stream else self._finish(pieces, report, started)
+
+
+# Global instance; shares the classification service's cache file and connection
+code_service = CodeService(document_cache=classification_service.document_cache)
@@ -0,0 +1,271 @@
+import ast
+import re
+from typing import List, Optional, Tuple
+
+from services.prompt_templates import estimate_tokens
+
+# Lines that only pull in other code; kept verbatim and shown to the model as context
+IMPORT_LINE = re.compile(
+    r"^\s*(import\b|from\s+\S+\s+import\b|#\s*include\b|package\b|using\b|"
+    r"(const|let|var)\s+\w+\s*=\s*require\()"
+)
+_CONTAINER_LINE = re.compile(r"\b(class|struct|interface|namespace|enum|impl|trait|record)\b")
+_DEFINITION_NAME = re.compile(
+    r"\b(?:class|struct|interface|namespace|enum|impl|trait|record|func|function|def|const|let|var)\s+(\w+)"
+)
+_CALL_NAME = re.compile(r"(\w+)\s*\(")
+_STRING_LITERAL = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`')
+
+# Segments the model never rewrites: emitted exactly as written
+VERBATIM_KINDS = ("import", "scaffold")
+
+
+class CodeSegment:
+    """A run of whole source lines: a definition, a statement or verbatim scaffolding.
+
+    Segments partition the file, so joining every segment's ``text`` in order
+    gives back the original source. ``context`` holds the lines a model needs
+    to make sense of the segment on its own (imports, enclosing class header).
+    """
+
+    __slots__ = ("name", "kind", "start", "end", "text", "context")
+
+    def __init__(self, name: str, kind: str, start: int, end: int, text: str, context: str):
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.text = text
+        self.context = context
+
+
+class CodeChunk:
+    """Consecutive segments sharing one context, small enough for a single prompt"""
+
+    __slots__ = ("index", "segments", "text", "context")
+
+    def __init__(self, index: int, segments: List[CodeSegment]):
+        self.index = index
+        self.segments = segments
+        self.text = "".join(segment.text for segment in segments)
+        self.context = segments[0].context
+
+    @property
+    def names(self) -> List[str]:
+        return [segment.name for segment in self.segments if segment.name]
+
+    @property
+    def start_line(self) -> int:
+        return self.segments[0].start + 1
+
+    @property
+    def end_line(self) -> int:
+        return self.segments[-1].end
+
+
+def _segment(lines: List[str], start: int, end: int, kind: str, name: str, context: str) -> CodeSegment:
+    return CodeSegment(name, kind, start, end, "".join(lines[start:end]), context)
+
+
+def _first_code_line(lines: List[str]) -> str:
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith(("//", "/*", "*", "#!")) and not (
+                stripped.startswith("#") and not stripped.startswith("#include")):
+            return stripped
+    return ""
+
+
+# Python: top-level statements from the syntax tree
+
+def _node_start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators]) - 1
+
+
+def _python_kind(node: ast.AST) -> str:
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return "import"
+    if isinstance(node, ast.ClassDef):
+        return "class"
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return "function"
+    return "statement"
+
+
+def _python_segments(nodes: List[ast.stmt], lines: List[str], start: int, stop: int,
+                     context: str, budget: int) -> List[CodeSegment]:
+    segments: List[CodeSegment] = []
+    position = start
+    for i, node in enumerate(nodes):
+        # Comments and blank lines above a statement travel with it; the last one takes the trailing lines
+        end = stop if i == len(nodes) - 1 else node.end_lineno
+        kind = _python_kind(node)
+        name = getattr(node, "name", "")
+        if (kind == "class" and estimate_tokens("".join(lines[position:end])) > budget
+                and any(isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) for child in node.body)):
+            # Too big for one prompt: keep the class line as scaffolding and split its body
+            body_start = _node_start(node.body[0])
+            header = "".join(lines[_node_start(node):body_start]).rstrip()
+            segments.append(_segment(lines, position, body_start, "scaffold", name, context))
+            segments.extend(_python_segments(node.body, lines, body_start, end,
+                                             (context + "\n" + header).strip("\n"), budget))
+        else:
+            segments.append(_segment(lines, position, end, kind, name, context))
+        position = end
+    return segments
+
+
+def _split_python(lines: List[str], budget: int) -> Optional[List[CodeSegment]]:
+    try:
+        tree = ast.parse("".join(lines))
+    except SyntaxError:
+        return None
+    if not tree.body:
+        return [_segment(lines, 0, len(lines), "statement", "", "")]
+    return _python_segments(tree.body, lines, 0, len(lines), "", budget)
+
+
+def _indent_segments(lines: List[str]) -> List[CodeSegment]:
+    """Fallback for Python that does not parse: cut before each unindented definition"""
+    starts = [0]
+    for i, line in enumerate(lines):
+        if i and re.match(r"(async\s+def|def|class)\s", line):
+            # Decorators belong with the definition below them
+            j = i
+            while j > 0 and lines[j - 1].startswith("@"):
+                j -= 1
+            if j > starts[-1]:
+                starts.append(j)
+    bounds = list(zip(starts, starts[1:] + [len(lines)]))
+    segments = []
+    for start, end in bounds:
+        first = _first_code_line(lines[start:end])
+        match = _DEFINITION_NAME.search("".join(lines[start:end]))
+        kind = "import" if IMPORT_LINE.match(first) and all(
+            IMPORT_LINE.match(line) or not line.strip() for line in lines[start:end]) else "statement"
+        segments.append(_segment(lines, start, end, kind, match.group(1) if match else "", ""))
+    return segments
+
+
+# Brace languages (JavaScript, Java, C++, Go): depth tracking over lines
+
+def _line_depths(lines: List[str]) -> List[Tuple[int, int]]:
+    """Bracket depth at the start and end of each line, ignoring strings and comments"""
+    depths = []
+    depth = 0
+    in_comment = False
+    for line in lines:
+        before = depth
+        text = _STRING_LITERAL.sub('""', line)
+        position = 0
+        while position < len(text):
+            if in_comment:
+                close = text.find("*/", position)
+                if close == -1:
+                    break
+                in_comment, position = False, close + 2
+                continue
+            if text.startswith("//", position):
+                break
+            if text.startswith("/*", position):
+                in_comment, position = True, position + 2
+                continue
+            ch = text[position]
+            if ch in "{([":
+                depth += 1
+            elif ch in "})]":
+                depth = max(0, depth - 1)
+            position += 1
+        depths.append((before, depth))
+    return depths
+
+
+def _brace_name(header: str) -> str:
+    """Name of the definition whose header (up to its opening bracket) is ``header``"""
+    code = "\n".join(line for line in header.splitlines() if not line.strip().startswith(("@", "//", "/*", "*")))
+    match = _DEFINITION_NAME.search(code) or _CALL_NAME.search(code)
+    return match.group(1) if match else ""
+
+
+def _brace_segments(lines: List[str], depths: List[Tuple[int, int]], start: int, stop: int,
+                    level: int, context: str, budget: int) -> List[CodeSegment]:
+    segments: List[CodeSegment] = []
+    position = start
+    deepest = level
+    for i in range(start, stop):
+        before, after = depths[i]
+        stripped = lines[i].strip()
+        deepest = max(deepest, after)
+        is_import = before == after == level and bool(IMPORT_LINE.match(lines[i]))
+        closed = after <= level and (deepest > level or stripped.endswith(";") or is_import)
+        if not closed and i < stop - 1:
+            continue
+
+        end = i + 1
+        first = _first_code_line(lines[position:end])
+        if not first:
+            kind = "scaffold"  # only comments and blank lines
+        elif IMPORT_LINE.match(first):
+            kind = "import"
+        else:
+            kind = "definition" if deepest > level else "statement"
+        opening = next((j for j in range(position, end) if depths[j][1] > level), None)
+        name = _brace_name("".join(lines[position:(opening if opening is not None else end - 1) + 1]))
+        if (kind == "definition" and opening is not None and _CONTAINER_LINE.search(lines[opening])
+                and end - opening > 2 and estimate_tokens("".join(lines[position:end])) > budget):
+            # A class or namespace too big for one prompt: split its members, keeping the braces verbatim
+            header = "".join(lines[position:opening + 1]).rstrip()
+            segments.append(_segment(lines, position, opening + 1, "scaffold", name, context))
+            segments.extend(_brace_segments(lines, depths, opening + 1, end - 1, level + 1,
+                                            (context + "\n" + header).strip("\n"), budget))
+            segments.append(_segment(lines, end - 1, end, "scaffold", "", context))
+        else:
+            segments.append(_segment(lines, position, end, kind, name, context))
+        position = end
+        deepest = level
+    return segments
+
+
+def split_code(code: str, language: str, budget: int) -> List[CodeSegment]:
+    """Cut ``code`` into top-level definitions, descending into classes larger than ``budget`` tokens.
+
+    Python is split on its syntax tree (falling back to indentation when it
+    does not parse); other languages are split where bracket depth returns
+    to the enclosing level.
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+    if language == "python":
+        segments = _split_python(lines, budget) or _indent_segments(lines)
+    else:
+        segments = _brace_segments(lines, _line_depths(lines), 0, len(lines), 0, "", budget)
+
+    imports = "".join(s.text for s in segments if s.kind == "import" and not s.context).strip()
+    if imports:
+        # Every chunk sees the file's imports, so names it uses are not mistaken for bugs
+        for segment in segments:
+            if segment.kind not in VERBATIM_KINDS:
+                segment.context = (imports + "\n" + segment.context).strip("\n")
+    return segments
+
+
+def pack_chunks(segments: List[CodeSegment], budget: int) -> List[CodeChunk]:
+    """Group consecutive model-bound segments with the same context into chunks of up to ``budget`` tokens"""
+    chunks: List[CodeChunk] = []
+    current: List[CodeSegment] = []
+    current_tokens = 0
+    for segment in segments:
+        tokens = estimate_tokens(segment.text)
+        if current and (segment.kind in VERBATIM_KINDS or segment.context != current[0].context
+                        or current_tokens + tokens > budget):
+            chunks.append(CodeChunk(len(chunks), current))
+            current, current_tokens = [], 0
+        if segment.kind in VERBATIM_KINDS:
+            continue
+        current.append(segment)
+        current_tokens += tokens
+    if current:
+        chunks.append(CodeChunk(len(chunks), current))
+    return chunks
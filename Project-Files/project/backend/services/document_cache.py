@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class DocumentCache:
+    """Content-addressed store for re-uploaded and revised documents.
+
+    Four SQLite tables share one schema: ``documents`` (whole-document
+    results keyed by a hash of the file bytes), ``pages`` (cleaned page text
+    keyed by a fingerprint of the page's content stream), ``chunks`` (parsed
+    classification results keyed by the chunk text and model) and ``code``
+    (per-chunk fix-bug and test outputs keyed by the code, its context and
+    model). Each table keeps at most ``max_entries`` rows, evicting least
+    recently used.
+    """
+
+    TABLES = ("documents", "pages", "chunks", "code")
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.enabled = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() != "false"
+        self.path = path or os.getenv("DOCUMENT_CACHE_DB", "document_cache.db")
+        self.max_entries = max_entries or int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "50000"))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.hits = {table: 0 for table in self.TABLES}
+        self.misses = {table: 0 for table in self.TABLES}
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the service does not create the file
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for table in self.TABLES:
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)"
+                )
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_used_at ON {table}(used_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, table: str, keys: List[str]) -> Dict[str, Any]:
+        if not self.enabled or not keys:
+            return {}
+        found: Dict[str, Any] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connect()
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, value FROM {table} WHERE key IN ({marks})", batch).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+                conn.execute(f"UPDATE {table} SET used_at = ? WHERE key IN ({marks})", [time.time()] + batch)
+            conn.commit()
+            self.hits[table] += len(found)
+            self.misses[table] += len(unique) - len(found)
+        return found
+
+    def get(self, table: str, key: str) -> Optional[Any]:
+        return self.get_many(table, [key]).get(key)
+
+    def put_many(self, table: str, items: Iterable[Tuple[str, Any]]):
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now) for key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(f"INSERT OR REPLACE INTO {table} (key, value, used_at) VALUES (?, ?, ?)", rows)
+            self._writes += len(rows)
+            # Trimming needs a count, so only do it every so often
+            if self._writes >= 1000:
+                self._writes = 0
+                for name in self.TABLES:
+                    conn.execute(
+                        f"DELETE FROM {name} WHERE key IN (SELECT key FROM {name} "
+                        "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+                    )
+            conn.commit()
+
+    def put(self, table: str, key: str, value: Any):
+        self.put_many(table, [(key, value)])
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"enabled": self.enabled, "path": self.path, "max_entries": self.max_entries}
+        with self._lock:
+            for table in self.TABLES:
+                count = (self._connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                         if self.enabled else 0)
+                stats[table] = {"entries": count, "hits": self.hits[table], "misses": self.misses[table]}
+        return stats
@@ -0,0 +1,154 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BUCKET = timedelta(hours=1)
+WINDOWS = {"24h": timedelta(hours=24), "7d": timedelta(days=7)}
+RETENTION = max(WINDOWS.values())
+
+
+class FeatureAggregate:
+    """Running rating summary for one feature"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.histogram = {str(r): 0 for r in range(1, 6)}
+        self.min_rating: Optional[int] = None
+        self.max_rating: Optional[int] = None
+        self.last_updated: Optional[str] = None
+
+    def add(self, rating: int, timestamp: Optional[str], count: int = 1):
+        self.count += count
+        self.total += rating * count
+        if str(rating) in self.histogram:
+            self.histogram[str(rating)] += count
+        self.min_rating = rating if self.min_rating is None else min(self.min_rating, rating)
+        self.max_rating = rating if self.max_rating is None else max(self.max_rating, rating)
+        if timestamp and (self.last_updated is None or timestamp > self.last_updated):
+            self.last_updated = timestamp
+
+    def merge(self, other: "FeatureAggregate"):
+        self.count += other.count
+        self.total += other.total
+        for rating, count in other.histogram.items():
+            self.histogram[rating] += count
+        for value in (other.min_rating, other.max_rating):
+            if value is not None:
+                self.min_rating = value if self.min_rating is None else min(self.min_rating, value)
+                self.max_rating = value if self.max_rating is None else max(self.max_rating, value)
+        if other.last_updated and (self.last_updated is None or other.last_updated > self.last_updated):
+            self.last_updated = other.last_updated
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "average_rating": round(self.total / self.count, 2) if self.count else 0,
+            "histogram": dict(self.histogram),
+            "min_rating": self.min_rating,
+            "max_rating": self.max_rating,
+            "last_updated": self.last_updated,
+        }
+
+
+class FeedbackAggregates:
+    """Per-feature feedback statistics maintained incrementally on submit.
+
+    All-time totals are kept per feature; recent activity is kept in hourly
+    buckets for the last seven days, so any stats view costs O(features) or
+    O(features x buckets) regardless of how much feedback has been stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._features: Dict[str, FeatureAggregate] = {}
+        self._buckets: Dict[datetime, Dict[str, FeatureAggregate]] = {}
+
+    @staticmethod
+    def _bucket_start(timestamp: str) -> Optional[datetime]:
+        try:
+            moment = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            return None
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    def _prune(self, now: datetime):
+        cutoff = now - RETENTION - BUCKET
+        for start in [s for s in self._buckets if s < cutoff]:
+            del self._buckets[start]
+
+    def record(self, entry: Dict):
+        feature = entry.get("feature", "unknown")
+        rating = entry.get("rating", 0)
+        timestamp = entry.get("timestamp")
+
+        with self._lock:
+            self._features.setdefault(feature, FeatureAggregate()).add(rating, timestamp)
+
+            start = self._bucket_start(timestamp)
+            if start is not None and start >= datetime.now() - RETENTION - BUCKET:
+                bucket = self._buckets.setdefault(start, {})
+                bucket.setdefault(feature, FeatureAggregate()).add(rating, timestamp)
+                self._prune(datetime.now())
+
+    def rebuild(self, entries: Iterable[Dict]):
+        """Replace the aggregates with ones computed from scratch (used once at startup)"""
+        with self._lock:
+            self._features = {}
+            self._buckets = {}
+        for entry in entries:
+            self.record(entry)
+
+    def snapshot(self, window: Optional[str] = None) -> Dict:
+        _check_window(window)
+
+        with self._lock:
+            if window is None:
+                aggregates = self._features
+            else:
+                since = datetime.now() - WINDOWS[window]
+                aggregates: Dict[str, FeatureAggregate] = {}
+                for start, bucket in self._buckets.items():
+                    # Buckets are hourly, so the oldest one may be partially outside the window
+                    if start + BUCKET <= since:
+                        continue
+                    for name, agg in bucket.items():
+                        aggregates.setdefault(name, FeatureAggregate()).merge(agg)
+
+            return _summary(aggregates, window)
+
+
+def _check_window(window: Optional[str]):
+    if window is not None and window not in WINDOWS:
+        raise ValueError(f"Unknown window '{window}', expected one of: {', '.join(WINDOWS)}")
+
+
+def _summary(aggregates: Dict[str, FeatureAggregate], window: Optional[str]) -> Dict:
+    total_feedback = sum(agg.count for agg in aggregates.values())
+    total_rating = sum(agg.total for agg in aggregates.values())
+    return {
+        "total_feedback": total_feedback,
+        "average_rating": round(total_rating / total_feedback, 2) if total_feedback else 0,
+        "features": {name: agg.to_dict() for name, agg in aggregates.items()},
+        "window": window,
+    }
+
+
+def store_snapshot(store, window: Optional[str] = None) -> Dict:
+    """The same summary as :meth:`FeedbackAggregates.snapshot`, computed by a shared store.
+
+    With several worker processes each one only sees the submissions it
+    handled itself, so stats come from the database every worker writes to.
+    Windows are exact here rather than rounded to hourly buckets.
+    """
+    _check_window(window)
+    since = (datetime.now() - WINDOWS[window]).isoformat() if window is not None else None
+    rows: List[Tuple[str, int, int, str]] = store.rating_counts(since)
+    aggregates: Dict[str, FeatureAggregate] = {}
+    for feature, rating, count, latest in rows:
+        aggregates.setdefault(feature, FeatureAggregate()).add(rating, latest, count)
+    return _summary(aggregates, window)
+
+
+# Global instance
+feedback_aggregates = FeedbackAggregates()
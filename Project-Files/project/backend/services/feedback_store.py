@@ -0,0 +1,333 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.file_lock import file_lock
+
+
+class FeedbackStore:
+    """Base class for feedback storage backends.
+
+    Writes use group commit: concurrent ``add`` calls queue their entries and
+    whichever caller holds the commit lock flushes everything pending in one
+    durable write, so throughput grows with concurrency instead of fsync count.
+    ``shared`` backends can be read and written by several worker processes.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._pending: List[Tuple[Dict, Future]] = []
+        self._pending_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self.batches = 0
+        self.entries_written = 0
+
+    def add(self, entry: Dict):
+        """Durably store one feedback entry; returns once it is committed"""
+        done = Future()
+        with self._pending_lock:
+            self._pending.append((entry, done))
+
+        with self._commit_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    self._write_batch([e for e, _ in batch])
+                    self.batches += 1
+                    self.entries_written += len(batch)
+                    for _, future in batch:
+                        future.set_result(True)
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+
+        # Either we flushed our own entry or an earlier committer did
+        done.result()
+
+    def add_many(self, entries: List[Dict]):
+        if entries:
+            with self._commit_lock:
+                self._write_batch(entries)
+                self.batches += 1
+                self.entries_written += len(entries)
+
+    def _write_batch(self, entries: List[Dict]):
+        raise NotImplementedError
+
+    def all(self) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def query(self, feature: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Entries filtered by feature and ISO timestamp range, newest first"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def rating_counts(self, since: Optional[str] = None) -> List[Tuple[str, int, int, str]]:
+        """``(feature, rating, count, latest timestamp)`` rows, for stats shared between workers"""
+        raise NotImplementedError
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """One-time import of the legacy ``feedback_data.json`` list; the file is renamed afterwards"""
+        def read(f):
+            return [e for e in json.load(f) if isinstance(e, dict)]
+        return self._migrate(json_path, read)
+
+    def migrate_from_jsonl(self, jsonl_path: str) -> int:
+        """One-time import of a JSON Lines store's file, when a deployment moves to a shared backend"""
+        def read(f):
+            return [json.loads(line) for line in f if line.endswith('\n') and line.strip()]
+        return self._migrate(jsonl_path, read)
+
+    def _migrate(self, path: str, read: Callable) -> int:
+        if not os.path.exists(path):
+            return 0
+        # Every worker runs the startup migration; the lock lets exactly one import the file
+        with file_lock(path + ".lock"):
+            if not os.path.exists(path):
+                return 0
+            try:
+                with open(path, 'r') as f:
+                    entries = read(f)
+            except (OSError, ValueError) as e:
+                print(f"Error migrating feedback from {path}: {str(e)}")
+                return 0
+
+            entries.sort(key=lambda e: e.get("timestamp") or "")
+            self.add_many(entries)
+            os.replace(path, path + ".migrated")
+        return len(entries)
+
+    def close(self):
+        pass
+
+
+class JsonlFeedbackStore(FeedbackStore):
+    """Append-only JSON Lines file with in-memory feature and timestamp indexes"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._by_feature: Dict[str, List[int]] = {}
+        self._by_time: List[Tuple[str, int]] = []
+        self._offsets: List[int] = []
+        self._file = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def file(self):
+        # Opened on first use so importing the service does not create the file
+        if self._file is None:
+            self._ensure_open()
+        return self._file
+
+    def _ensure_open(self):
+        """Load the index and open the file for appending, once"""
+        with self._open_lock:
+            if self._file is None:
+                self._load_index()
+                self._file = open(self.path, 'ab')
+
+    def _load_index(self):
+        if not os.path.exists(self.path):
+            return
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A torn final line from a crash mid-append
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    offset += len(line)
+                    valid_end = offset
+                    continue
+                self._index(entry, offset)
+                offset += len(line)
+                valid_end = offset
+        if valid_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+
+    def _index(self, entry: Dict, offset: int):
+        self._offsets.append(offset)
+        self._by_feature.setdefault(entry.get("feature", "unknown"), []).append(offset)
+        bisect.insort(self._by_time, (entry.get("timestamp") or "", offset))
+
+    def _write_batch(self, entries: List[Dict]):
+        offset = self.file.tell()
+        lines = [(json.dumps(entry) + '\n').encode('utf-8') for entry in entries]
+        self.file.write(b''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        for entry, line in zip(entries, lines):
+            self._index(entry, offset)
+            offset += len(line)
+
+    def _read_at(self, offsets: List[int]) -> List[Dict]:
+        entries = []
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def all(self) -> Iterator[Dict]:
+        with self._commit_lock:
+            end = self.file.tell()
+        with open(self.path, 'rb') as f:
+            while f.tell() < end:
+                yield json.loads(f.readline())
+
+    def query(self, feature: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        self._ensure_open()
+        with self._commit_lock:
+            lo = bisect.bisect_left(self._by_time, (since, -1)) if since else 0
+            hi = bisect.bisect_right(self._by_time, (until, float('inf'))) if until else len(self._by_time)
+            offsets = [offset for _, offset in reversed(self._by_time[lo:hi])]
+            if feature is not None:
+                wanted = set(self._by_feature.get(feature, []))
+                offsets = [offset for offset in offsets if offset in wanted]
+        return self._read_at(offsets[:limit] if limit else offsets)
+
+    def count(self) -> int:
+        self._ensure_open()
+        return len(self._offsets)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteFeedbackStore(FeedbackStore):
+    """SQLite database in WAL mode with indexes on feature and timestamp"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the service does not create the file
+        if self._conn is None:
+            with self._read_lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                feature TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                comment TEXT,
+                user_id TEXT,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_feedback_feature ON feedback (feature, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+        """)
+        conn.commit()
+        return conn
+
+    def _write_batch(self, entries: List[Dict]):
+        conn = self.conn
+        with self._read_lock, conn:
+            conn.executemany(
+                "INSERT INTO feedback (feature, rating, comment, user_id, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (e.get("feature", "unknown"), e.get("rating", 0), e.get("comment"),
+                     e.get("user_id"), e.get("timestamp") or "")
+                    for e in entries
+                ]
+            )
+
+    @staticmethod
+    def _row_to_entry(row) -> Dict:
+        return {"feature": row[0], "rating": row[1], "comment": row[2], "user_id": row[3], "timestamp": row[4]}
+
+    def all(self) -> Iterator[Dict]:
+        conn = self.conn
+        with self._read_lock:
+            rows = conn.execute(
+                "SELECT feature, rating, comment, user_id, timestamp FROM feedback ORDER BY id"
+            ).fetchall()
+        return (self._row_to_entry(row) for row in rows)
+
+    def query(self, feature: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        clauses, params = [], []
+        if feature is not None:
+            clauses.append("feature = ?")
+            params.append(feature)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        sql = "SELECT feature, rating, comment, user_id, timestamp FROM feedback"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        conn = self.conn
+        with self._read_lock:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def count(self) -> int:
+        conn = self.conn
+        with self._read_lock:
+            return conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def rating_counts(self, since: Optional[str] = None) -> List[Tuple[str, int, int, str]]:
+        sql = "SELECT feature, rating, COUNT(*), MAX(timestamp) FROM feedback"
+        params = []
+        if since:
+            sql += " WHERE timestamp >= ?"
+            params.append(since)
+        sql += " GROUP BY feature, rating"
+        conn = self.conn
+        with self._read_lock:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def create_feedback_store() -> FeedbackStore:
+    backend = os.getenv("FEEDBACK_BACKEND", "jsonl").lower()
+    if backend == "sqlite":
+        return SqliteFeedbackStore(os.getenv("FEEDBACK_STORE_PATH", "feedback.db"))
+    if backend == "jsonl":
+        return JsonlFeedbackStore(os.getenv("FEEDBACK_STORE_PATH", "feedback_data.jsonl"))
+    raise ValueError(f"Unknown FEEDBACK_BACKEND: {backend}")
+
+
+# Global instance
+feedback_store = create_feedback_store()
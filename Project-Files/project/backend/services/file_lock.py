@@ -0,0 +1,30 @@
+import os
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive lock on ``path`` across worker processes, blocking until it is free.
+
+    The lock file is created if needed and left in place; removing it while
+    another process waits on it would let a third one lock a fresh file.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
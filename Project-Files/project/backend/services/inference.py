@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from services.metrics import metrics, observe_stage
+from services.scheduler import InferenceScheduler
+
+
+class InferenceTimeoutError(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=504, detail=detail)
+
+
+class ClientDisconnectedError(HTTPException):
+    def __init__(self, detail: str):
+        # 499 is the de-facto "client closed request" status; nobody will read it
+        super().__init__(status_code=499, detail=detail)
+
+
+class AsyncInference:
+    """Runs blocking model calls on a bounded executor so the event loop stays free.
+
+    Admission goes through an :class:`InferenceScheduler`, which caps concurrent
+    calls globally and per route, queues waiters by priority and rate-limits
+    clients. A call is abandoned when it exceeds ``timeout`` seconds or when the
+    HTTP client goes away, and its slot is only released once the underlying
+    thread actually finishes.
+    """
+
+    def __init__(self, max_concurrency: int = None, timeout: float = None,
+                 disconnect_poll_interval: float = 0.5):
+        self.max_concurrency = max_concurrency or int(os.getenv("INFERENCE_MAX_CONCURRENCY", "8"))
+        self.timeout = timeout or float(os.getenv("INFERENCE_TIMEOUT", "120"))
+        self.disconnect_poll_interval = disconnect_poll_interval
+        self.scheduler = InferenceScheduler(self.max_concurrency)
+        # Peers (reverse proxies) whose X-Client-Id / X-Forwarded-For say who the client is
+        self.trusted_proxies = {host.strip() for host in os.getenv("TRUSTED_PROXIES", "").split(",") if host.strip()}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="inference"
+            )
+        return self._executor
+
+    def client_id(self, request: Optional[Request]) -> Optional[str]:
+        """Rate-limit key: the peer address, or what a trusted proxy in front says about the client.
+
+        Headers from anyone else are ignored; a client could send a new value
+        with every request and never run out of tokens.
+        """
+        if request is None:
+            return None
+        peer = request.client.host if request.client else None
+        if peer not in self.trusted_proxies:
+            return peer
+        # The proxy appends the address it saw, so the last hop is the one it vouches for
+        forwarded = request.headers.get("x-forwarded-for", "").split(",")[-1].strip()
+        return request.headers.get("x-client-id") or forwarded or peer
+
+    async def _acquire(self, request: Optional[Request], route: str) -> Callable[[], None]:
+        """Wait for a scheduler slot; returns an idempotent release function"""
+        queued = time.perf_counter()
+        await self.scheduler.acquire(route, self.client_id(request))
+        started = time.perf_counter()
+        observe_stage("inference_queue", started - queued)
+        self.in_flight += 1
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self.in_flight -= 1
+                self.scheduler.release(route, time.perf_counter() - started)
+
+        return release
+
+    async def _watch_disconnect(self, request: Request):
+        while not await request.is_disconnected():
+            await asyncio.sleep(self.disconnect_poll_interval)
+
+    async def run(self, request: Optional[Request], func: Callable, *args,
+                  route: str = "default", timeout: float = None, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` off the event loop with a timeout and disconnect cancellation"""
+        loop = asyncio.get_running_loop()
+        timeout = timeout or self.timeout
+        release = await self._acquire(request, route)
+
+        def release_threadsafe(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(release)
+
+        # Release from the worker thread's completion, not the awaiting
+        # coroutine, so abandoned calls keep holding their slot until they end.
+        # Copy the request context so spans recorded in the worker reach Server-Timing
+        context = contextvars.copy_context()
+        work = self._get_executor().submit(context.run, functools.partial(func, *args, **kwargs))
+        work.add_done_callback(release_threadsafe)
+        future = asyncio.wrap_future(work)
+
+        watcher = asyncio.ensure_future(self._watch_disconnect(request)) if request is not None else None
+        try:
+            waiters = {future} if watcher is None else {future, watcher}
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if future in done:
+                return future.result()
+            future.cancel()
+            if watcher is not None and watcher in done:
+                raise ClientDisconnectedError("Client disconnected before the model call finished")
+            raise InferenceTimeoutError(f"Model call exceeded {timeout:.0f}s timeout")
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    def _close_after(self, loop: asyncio.AbstractEventLoop, pending: Optional[Future],
+                     chunks: Optional[Iterator[str]], release: Callable[[], None]):
+        """Close the model's generator on the executor, then free the slot, once ``pending`` has finished.
+
+        After a timeout or disconnect a ``next()`` may still be running on a
+        worker thread; closing the generator under it would fail, and releasing
+        straight away would let another call start while this one still runs.
+        """
+        executor = self._get_executor()
+
+        def close():
+            iterator = chunks
+            if iterator is None and pending is not None and not pending.cancelled() and pending.exception() is None:
+                # Abandoned while the generator was being created
+                iterator = pending.result()
+            try:
+                if hasattr(iterator, "close"):
+                    iterator.close()
+            except Exception as e:
+                print(f"Error closing model stream: {str(e)}")
+            finally:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(release)
+
+        def schedule(_=None):
+            try:
+                executor.submit(close)
+            except RuntimeError:
+                # The executor is shutting down
+                close()
+
+        if pending is not None:
+            pending.add_done_callback(schedule)
+        else:
+            schedule()
+
+    async def _relay(self, request: Optional[Request], release: Callable[[], None], func: Callable,
+                     args: tuple, kwargs: dict, timeout: float = None) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        sentinel = object()
+        context = contextvars.copy_context()
+        chunks: Optional[Iterator[str]] = None
+        # The latest call submitted to the executor, which may outlive this coroutine
+        pending: Optional[Future] = None
+        try:
+            pending = executor.submit(context.run, functools.partial(func, *args, **kwargs))
+            chunks = await asyncio.wrap_future(pending)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise InferenceTimeoutError(f"Model stream exceeded {timeout or self.timeout:.0f}s timeout")
+                pending = executor.submit(context.run, next, chunks, sentinel)
+                chunk = await asyncio.wait_for(asyncio.wrap_future(pending), timeout=remaining)
+                if chunk is sentinel:
+                    break
+                yield chunk
+                if request is not None and await request.is_disconnected():
+                    break
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError(f"Model stream exceeded {timeout or self.timeout:.0f}s timeout")
+        finally:
+            self._close_after(loop, pending, chunks, release)
+
+    async def stream(self, request: Optional[Request], func: Callable, *args,
+                     route: str = "default", timeout: float = None, **kwargs) -> AsyncIterator[str]:
+        """Relay chunks from the blocking generator ``func(*args, **kwargs)`` as they arrive.
+
+        Each ``next()`` runs on the executor, so the loop is never blocked, and
+        the stream stops early once the client disconnects or the deadline passes.
+        """
+        release = await self._acquire(request, route)
+        async for chunk in self._relay(request, release, func, args, kwargs, timeout):
+            yield chunk
+
+    async def stream_response(self, request: Request, func: Callable, *args,
+                              route: str = "default", headers: dict = None, **kwargs) -> StreamingResponse:
+        """Admit the call, then wrap its chunks in a chunked plain-text response.
+
+        Admission and the first chunk happen before the response starts, so
+        rejections and upstream failures still reach the client as a proper
+        4xx/5xx status rather than an empty stream.
+        """
+        release = await self._acquire(request, route)
+        chunks = self._relay(request, release, func, args, kwargs)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = ""
+
+        async def body():
+            yield first
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except HTTPException as e:
+                # Headers are already sent, so report timeouts and upstream errors in-band
+                yield f"\n\n[{e.detail}]"
+
+        return StreamingResponse(
+            body(),
+            media_type="text/plain",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+            # Runs even if the client disconnects before the body is iterated; the
+            # relay then closes the model's generator and frees the slot
+            background=BackgroundTask(chunks.aclose)
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+inference = AsyncInference()
+metrics.register_collector(lambda: {
+    "smartsdlc_inference_in_flight": inference.in_flight,
+    "smartsdlc_scheduler_queued": inference.scheduler.stats()["queued"],
+    **{f"smartsdlc_scheduler_rejected_{reason}_total": count
+       for reason, count in inference.scheduler.rejected.items()},
+})
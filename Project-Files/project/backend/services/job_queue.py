@@ -0,0 +1,402 @@
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from services.scheduler import SchedulerRejected
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+_UNFINISHED = f"status NOT IN ({', '.join('?' * len(FINISHED))})"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """SQLite table of job state, so every server worker process can answer status polls.
+
+    Each job records the boot token of the process that accepted it, and each
+    process keeps a heartbeat row for its token. PIDs are no use for telling
+    whether the owner is still alive: a restarted container worker usually
+    gets the same one back.
+    """
+
+    def __init__(self, path: str, token: str):
+        self.path = path
+        self.token = token
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, owner_pid INTEGER NOT NULL, "
+            "label TEXT, progress TEXT NOT NULL, result TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires_at ON jobs(expires_at)")
+        if "owner" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            # Rows from before boot tokens have none and count as orphaned
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_owners ("
+            "token TEXT PRIMARY KEY, pid INTEGER NOT NULL, heartbeat_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def create(self, job_id: str, kind: str, label: Optional[str], progress: Dict):
+        self._execute(
+            "INSERT INTO jobs (id, kind, status, owner_pid, owner, label, progress, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, os.getpid(), self.token, label, json.dumps(progress), time.time())
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                self._conn.row_factory = None
+        if row is None or (row["expires_at"] is not None and row["expires_at"] < time.time()):
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def request_cancel(self, job_id: str) -> bool:
+        cursor = self._execute(
+            f"UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND {_UNFINISHED}", (job_id, *FINISHED)
+        )
+        return cursor.rowcount > 0
+
+    def start(self, job_id: str):
+        self._execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), job_id))
+
+    def set_progress(self, job_id: str, progress: Dict):
+        self._execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def finish(self, job_id: str, status: str, progress: Dict, ttl: float,
+               result: Any = None, error: Optional[str] = None):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+            "WHERE id = ?",
+            (status, json.dumps(progress), json.dumps(result) if result is not None else None,
+             error, now, now + ttl, job_id)
+        )
+
+    def purge_expired(self) -> int:
+        return self._execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def heartbeat(self):
+        self._execute(
+            "INSERT OR REPLACE INTO job_owners (token, pid, heartbeat_at) VALUES (?, ?, ?)",
+            (self.token, os.getpid(), time.time())
+        )
+
+    def retire(self):
+        """Drop this process's heartbeat on a clean shutdown"""
+        self._execute("DELETE FROM job_owners WHERE token = ?", (self.token,))
+
+    def fail_orphans(self, ttl: float, lease: float) -> int:
+        """Fail unfinished jobs whose owner has not sent a heartbeat for ``lease`` seconds.
+
+        That covers crashes and restarts; a job whose owner never sent one
+        counts from when it was created.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? "
+            f"WHERE {_UNFINISHED} AND (owner IS NULL OR (owner != ? AND COALESCE("
+            "(SELECT heartbeat_at FROM job_owners WHERE token = jobs.owner), created_at) < ?))",
+            (FAILED, "Interrupted by a server restart", now, now + ttl, *FINISHED, self.token, now - lease)
+        )
+        self._execute("DELETE FROM job_owners WHERE heartbeat_at < ?", (now - lease,))
+        return cursor.rowcount
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class JobContext:
+    """Handed to running work for progress reporting and cooperative cancellation.
+
+    Safe to call from worker threads. Progress is written through to the store
+    at most every ``flush_interval`` seconds; the cancel flag is re-read from
+    the store just as often, so a cancel sent to another worker process is seen.
+    Writes requested from the event loop are handed to ``writer`` instead.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, progress: Dict, flush_interval: float = 0.5,
+                 writer: ThreadPoolExecutor = None):
+        self.store = store
+        self.job_id = job_id
+        self.writer = writer
+        self.progress = progress
+        self.flush_interval = flush_interval
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._last_cancel_check = 0.0
+
+    def update(self, **fields):
+        with self._lock:
+            self.progress.update(fields)
+        self._maybe_flush()
+
+    def advance(self, field: str, amount: int = 1):
+        with self._lock:
+            self.progress[field] = self.progress.get(field, 0) + amount
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+            snapshot = dict(self.progress)
+        if self.writer is not None and _on_event_loop():
+            self.writer.submit(self.store.set_progress, self.job_id, snapshot)
+        else:
+            self.store.set_progress(self.job_id, snapshot)
+
+    def check_cancelled(self):
+        """Raise :class:`JobCancelled` if a cancel was requested"""
+        now = time.monotonic()
+        if not self.cancelled and now - self._last_cancel_check >= self.flush_interval:
+            self._last_cancel_check = now
+            self.cancelled = self.store.is_cancel_requested(self.job_id)
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Runs long requests in the background of the accepting worker process.
+
+    Jobs run as event-loop tasks, at most ``workers`` at a time, so their model
+    calls still go through the shared inference scheduler. State, progress and
+    results live in SQLite and expire ``result_ttl`` seconds after a job ends.
+    Store writes made from the event loop go through one writer thread, which
+    keeps them off the loop and in order.
+    """
+
+    def __init__(self, path: str = None, workers: int = None, result_ttl: float = None, max_pending: int = None):
+        self.path = path or os.getenv("JOB_STORE_DB", "jobs.db")
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.result_ttl = result_ttl or float(os.getenv("JOB_RESULT_TTL", "3600"))
+        self.max_pending = max_pending or int(os.getenv("JOB_MAX_PENDING", "32"))
+        # Per model call; jobs have no client waiting, so they may take longer than INFERENCE_TIMEOUT
+        self.timeout = float(os.getenv("JOB_TIMEOUT", "1800"))
+        # Jobs of a process that misses heartbeats for three intervals are failed by the others
+        self.heartbeat_interval = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+        self.lease = 3 * self.heartbeat_interval
+        self.token = uuid.uuid4().hex
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._store: Optional[JobStore] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, Optional[asyncio.Task]] = {}
+        self._contexts: Dict[str, JobContext] = {}
+
+    @property
+    def store(self) -> JobStore:
+        # Opened on first use so importing the service does not create the file
+        if self._store is None:
+            self._store = JobStore(self.path, self.token)
+        return self._store
+
+    def _get_writer(self) -> ThreadPoolExecutor:
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        return self._writer
+
+    async def _in_writer(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_writer(), functools.partial(func, *args, **kwargs))
+
+    def recover(self) -> int:
+        """Start this process's heartbeat and fail the jobs of processes that stopped sending theirs"""
+        self.store.heartbeat()
+        if self._heartbeat_thread is None:
+            self._heartbeat_stop.clear()
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat_thread.start()
+        return self.store.fail_orphans(self.result_ttl, self.lease)
+
+    def _heartbeat_loop(self):
+        # Owners that died just before this process started are only past their lease later
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            try:
+                self.store.heartbeat()
+                interrupted = self.store.fail_orphans(self.result_ttl, self.lease)
+                if interrupted:
+                    print(f"Marked {interrupted} interrupted background jobs as failed")
+            except Exception as e:
+                print(f"Error sending job heartbeat: {str(e)}")
+
+    async def submit(self, kind: str, work: Callable[[JobContext], Awaitable[Any]],
+                     label: str = None, progress: Dict = None, cleanup: Callable[[], None] = None) -> Dict:
+        """Queue ``work(context)`` and return the new job's status right away.
+
+        ``cleanup`` runs once the job has finished, failed or been cancelled,
+        including when it is cancelled before it starts.
+        """
+        if len(self._tasks) >= self.max_pending:
+            raise HTTPException(status_code=503, detail="Too many jobs in progress, try again later",
+                                headers={"Retry-After": "30"})
+        job_id = uuid.uuid4().hex
+        progress = {"stage": QUEUED, **(progress or {})}
+        # Reserve the slot before awaiting, so concurrent submits cannot overshoot max_pending
+        self._tasks[job_id] = None
+        try:
+            await self._in_writer(self.store.purge_expired)
+            await self._in_writer(self.store.create, job_id, kind, label, progress)
+        except BaseException:
+            self._tasks.pop(job_id, None)
+            raise
+        self._contexts[job_id] = JobContext(self.store, job_id, progress, writer=self._get_writer())
+        self._tasks[job_id] = asyncio.ensure_future(self._run(job_id, work, cleanup))
+        return await self._in_writer(self.status, job_id)
+
+    async def _run(self, job_id: str, work: Callable[[JobContext], Awaitable[Any]],
+                   cleanup: Callable[[], None] = None):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        context = self._contexts[job_id]
+        try:
+            async with self._slots:
+                await self._in_writer(context.check_cancelled)
+                await self._in_writer(self.store.start, job_id)
+                await self._in_writer(context.update, stage=RUNNING)
+                while True:
+                    try:
+                        result = await work(context)
+                        break
+                    except SchedulerRejected as e:
+                        # Background work waits its turn instead of failing
+                        await self._in_writer(context.check_cancelled)
+                        await asyncio.sleep(e.retry_after)
+            context.progress["stage"] = SUCCEEDED
+            await self._in_writer(self.store.finish, job_id, SUCCEEDED, context.progress, self.result_ttl,
+                                  result=result)
+        except JobCancelled:
+            context.progress["stage"] = CANCELLED
+            await self._in_writer(self.store.finish, job_id, CANCELLED, context.progress, self.result_ttl)
+        except HTTPException as e:
+            context.progress["stage"] = FAILED
+            await self._in_writer(self.store.finish, job_id, FAILED, context.progress, self.result_ttl,
+                                  error=str(e.detail))
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            context.progress["stage"] = FAILED
+            await self._in_writer(self.store.finish, job_id, FAILED, context.progress, self.result_ttl,
+                                  error=str(e))
+        finally:
+            self._tasks.pop(job_id, None)
+            self._contexts.pop(job_id, None)
+            if cleanup is not None:
+                cleanup()
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "label": job["label"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "error": job["error"],
+            "cancel_requested": bool(job["cancel_requested"]),
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "expires_at": job["expires_at"],
+        }
+
+    def result(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        return job and {"status": job["status"], "result": job["result"], "error": job["error"]}
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop; False if it already finished"""
+        if not self.store.request_cancel(job_id):
+            return False
+        context = self._contexts.get(job_id)
+        if context is not None:
+            context.cancelled = True
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "local_pending": len(self._tasks),
+            "max_pending": self.max_pending,
+            "result_ttl": self.result_ttl,
+            **{status: self.store.count(status) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)},
+        }
+
+    def shutdown(self):
+        if self._heartbeat_thread is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        if self._writer is not None:
+            # Let queued progress writes land before the final state is recorded
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        for job_id, task in list(self._tasks.items()):
+            context = self._contexts.get(job_id)
+            progress = context.progress if context is not None else {}
+            self.store.finish(job_id, FAILED, progress, self.result_ttl, error="Server shut down")
+            if task is not None:
+                task.cancel()
+        self._tasks.clear()
+        self._slots = None
+        if self._store is not None:
+            self._store.retire()
+            self._store.close()
+            self._store = None
+
+
+# Global instance
+job_queue = JobQueue()
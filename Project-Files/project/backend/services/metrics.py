@@ -0,0 +1,268 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Spans recorded while handling the current request, for the Server-Timing header
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_spans", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                cumulative += counts[-1]
+                le = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+        self.http_requests = self.register(Counter(
+            "smartsdlc_http_requests_total", "HTTP requests handled", ("route", "method", "status")))
+        self.http_duration = self.register(Histogram(
+            "smartsdlc_http_request_duration_seconds", "HTTP request latency", ("route", "method")))
+        self.http_in_flight = self.register(Gauge(
+            "smartsdlc_http_requests_in_flight", "HTTP requests currently being handled"))
+        self.stage_duration = self.register(Histogram(
+            "smartsdlc_stage_duration_seconds", "Latency of individual processing stages", ("stage",)))
+        self.stage_errors = self.register(Counter(
+            "smartsdlc_stage_errors_total", "Processing stages that raised, by exception type", ("stage", "error")))
+        self.upstream_in_flight = self.register(Gauge(
+            "smartsdlc_upstream_requests_in_flight", "Model calls currently waiting on the backend"))
+        self.upstream_tokens = self.register(Counter(
+            "smartsdlc_upstream_tokens_total", "Estimated tokens sent to and received from the model", ("direction",)))
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """Add a callback returning ``{metric_name: value}`` samples taken at scrape time.
+
+        Names ending in ``_total`` are exported as counters, so ``rate()`` can
+        be applied to them; every other value is a gauge.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for name, value in collector().items():
+                    type_name = "counter" if name.endswith("_total") else "gauge"
+                    lines.append(f"# TYPE {name} {type_name}")
+                    lines.append(f"{name} {value}")
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def start_request_spans() -> contextvars.Token:
+    return _request_spans.set([])
+
+
+def end_request_spans(token: contextvars.Token) -> List[Tuple[str, float]]:
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def observe_stage(stage: str, seconds: float):
+    metrics.stage_duration.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a processing stage into the stage histogram and the current request's spans"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        metrics.stage_errors.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def server_timing_header(spans: List[Tuple[str, float]]) -> str:
+    """Summarise spans as a ``Server-Timing`` value, summing repeated stages"""
+    totals: Dict[str, List[float]] = {}
+    for stage, seconds in spans:
+        entry = totals.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = []
+    for stage, (seconds, count) in totals.items():
+        part = f"{stage};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status counts and in-flight requests.
+
+    Adds a ``Server-Timing`` header built from the request's spans when
+    ``METRICS_SERVER_TIMING=true`` or the client sends ``X-Server-Timing``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.always_server_timing = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+        self._route_paths: Dict[Callable, str] = {}
+
+    def _route_label(self, scope) -> str:
+        # Label by route template, not raw path, to keep cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._route_paths:
+            app = scope.get("app")
+            for route in getattr(app, "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._route_paths[endpoint] = route.path
+                    break
+            else:
+                self._route_paths[endpoint] = getattr(endpoint, "__name__", "unknown")
+        return self._route_paths[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        wants_timing = self.always_server_timing or any(
+            name == b"x-server-timing" for name, _ in scope.get("headers", [])
+        )
+        status = {"code": 500}
+        token = start_request_spans()
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if wants_timing:
+                    spans = list(_request_spans.get() or [])
+                    spans.append(("total", time.perf_counter() - started))
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing_header(spans).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.http_in_flight.dec()
+            end_request_spans(token)
+            route = self._route_label(scope)
+            metrics.http_requests.inc(route=route, method=scope["method"], status=str(status["code"]))
+            metrics.http_duration.observe(time.perf_counter() - started, route=route, method=scope["method"])
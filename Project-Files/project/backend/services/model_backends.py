@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+from services.model_pool import ModelClientPool
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBackend:
+    """Interface every text-generation backend implements"""
+
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.output_chars = 0
+
+    def _record(self, output: str = None, error: bool = False):
+        with self._lock:
+            self.calls += 1
+            if error:
+                self.errors += 1
+            if output:
+                self.output_chars += len(output)
+
+    def _record_stream(self, produced_chars: int):
+        with self._lock:
+            self.calls += 1
+            self.output_chars += produced_chars
+
+    def generate(self, model_id: str, parameters: Dict, prompt: str) -> str:
+        raise NotImplementedError
+
+    def generate_stream(self, model_id: str, parameters: Dict, prompt: str) -> Iterator[str]:
+        yield self.generate(model_id, parameters, prompt)
+
+    def warm_up(self, model_id: str, parameters: Dict) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "calls": self.calls,
+                "errors": self.errors,
+                "output_chars": self.output_chars,
+            }
+
+
+class WatsonxBackend(ModelBackend):
+    """IBM watsonx.ai foundation models, reusing pooled clients"""
+
+    name = "watsonx"
+
+    def __init__(self, credentials: Dict, project_id: str):
+        super().__init__()
+        self.credentials = credentials
+        self.project_id = project_id
+        self.pool = ModelClientPool(self._create_model)
+
+    def _create_model(self, model_id: str, parameters: Dict):
+        # Imported here so the SDK is only loaded when this backend is used
+        from ibm_watsonx_ai.foundation_models import Model
+        return Model(
+            model_id=model_id,
+            params=parameters,
+            credentials=self.credentials,
+            project_id=self.project_id
+        )
+
+    @staticmethod
+    def _client_parameters(parameters: Dict) -> Dict:
+        # Output budgets vary per prompt template and are passed per call, so
+        # they must not split the pool into one client per budget
+        return {k: v for k, v in parameters.items() if k != "max_new_tokens"}
+
+    def _get_model(self, model_id: str, parameters: Dict):
+        try:
+            return self.pool.get(model_id, self._client_parameters(parameters))
+        except Exception:
+            # Re-raised as is, so the resilience layer can tell auth failures from transient ones
+            logger.exception("Could not initialize Watson model %s", model_id)
+            raise
+
+    def generate(self, model_id: str, parameters: Dict, prompt: str) -> str:
+        model = self._get_model(model_id, parameters)
+        try:
+            response = model.generate_text(prompt=prompt, params=parameters)
+        except Exception:
+            self.pool.report_failure(model_id, self._client_parameters(parameters))
+            self._record(error=True)
+            raise
+        self.pool.report_success(model_id, self._client_parameters(parameters))
+        self._record(response)
+        return response
+
+    def generate_stream(self, model_id: str, parameters: Dict, prompt: str) -> Iterator[str]:
+        model = self._get_model(model_id, parameters)
+        produced = 0
+        try:
+            for chunk in model.generate_text_stream(prompt=prompt, params=parameters):
+                produced += len(chunk)
+                yield chunk
+        except GeneratorExit:
+            # Closed early by the caller; still a successful call
+            self.pool.report_success(model_id, self._client_parameters(parameters))
+            self._record_stream(produced)
+            raise
+        except Exception:
+            self.pool.report_failure(model_id, self._client_parameters(parameters))
+            self._record(error=True)
+            raise
+        self.pool.report_success(model_id, self._client_parameters(parameters))
+        self._record_stream(produced)
+
+    def warm_up(self, model_id: str, parameters: Dict) -> bool:
+        try:
+            self._get_model(model_id, parameters)
+            return True
+        except Exception:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update(self.pool.stats())
+        return stats
+
+
+class SimulatedBackend(ModelBackend):
+    """Offline stand-in for load testing the API without watsonx credentials.
+
+    Output text is a deterministic function of the prompt (and recognises the
+    classification prompts, so downstream parsing still works). Latency, token
+    rate, output size and failures are drawn from a seeded RNG and configured
+    through ``SIM_*`` environment variables.
+    """
+
+    name = "simulated"
+
+    _WORDS = ("the system shall validate input data and return results for each request "
+              "while logging errors handling retries caching state and updating records").split()
+    _CODE_LINES = [
+        "def handle(request):",
+        "    # Validate the incoming payload",
+        "    if not request:",
+        "        raise ValueError(\"empty request\")",
+        "    result = process(request)",
+        "    return result",
+    ]
+
+    def __init__(self, latency_ms: float = None, latency_distribution: str = None,
+                 latency_sigma: float = None, tokens_per_second: float = None,
+                 error_rate: float = None, output_tokens: int = None, seed: int = None):
+        super().__init__()
+        # Time to first token
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv("SIM_LATENCY_MS", "200"))
+        self.latency_distribution = latency_distribution or os.getenv("SIM_LATENCY_DISTRIBUTION", "lognormal")
+        self.latency_sigma = latency_sigma if latency_sigma is not None else float(os.getenv("SIM_LATENCY_SIGMA", "0.5"))
+        self.tokens_per_second = tokens_per_second or float(os.getenv("SIM_TOKENS_PER_SECOND", "50"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("SIM_ERROR_RATE", "0"))
+        self.output_tokens = output_tokens or int(os.getenv("SIM_OUTPUT_TOKENS", "200"))
+        self._rng = random.Random(seed if seed is not None else int(os.getenv("SIM_SEED", "42")))
+
+    def _sample_latency(self) -> float:
+        median = self.latency_ms / 1000.0
+        with self._lock:
+            if self.latency_distribution == "constant":
+                return median
+            if self.latency_distribution == "uniform":
+                return self._rng.uniform(0, 2 * median)
+            if self.latency_distribution == "exponential":
+                return self._rng.expovariate(1 / median) if median > 0 else 0.0
+            return median * math.exp(self._rng.gauss(0, self.latency_sigma))
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def _render(self, prompt: str, max_new_tokens: int) -> str:
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        rng = random.Random(digest)
+
+        if "classify each sentence into SDLC phases" in prompt:
+            return self._render_classification(prompt, rng)
+        if "Classify each numbered item" in prompt:
+            count = len(re.findall(r"^\s*\d+\. ", prompt, re.MULTILINE))
+            phases = ["Requirements", "Design", "Development", "Testing", "Deployment", "Maintenance"]
+            return "\n".join(f"{i}: {rng.choice(phases)}" for i in range(1, count + 1))
+
+        tokens = min(max_new_tokens, max(1, int(rng.gauss(self.output_tokens, self.output_tokens / 4))))
+        if "code" in prompt.lower() or "test" in prompt.lower():
+            lines = []
+            while sum(len(line) for line in lines) // 4 < tokens:
+                lines.append(self._CODE_LINES[len(lines) % len(self._CODE_LINES)])
+            return "\n".join(lines)
+        return " ".join(rng.choice(self._WORDS) for _ in range(tokens))
+
+    @staticmethod
+    def _render_classification(prompt: str, rng: random.Random) -> str:
+        match = re.search(r"Text: (.*?)\n\s*Format the response", prompt, re.DOTALL)
+        text = match.group(1) if match else ""
+        listed = re.search(r"Phases: (.*)", prompt)
+        names = [p.strip() for p in listed.group(1).split(",")] if listed else [
+            "Requirements", "Design", "Development", "Testing", "Deployment", "Maintenance"
+        ]
+        phases: Dict[str, List[str]] = {name: [] for name in names}
+        for sentence in re.split(r"[.!?]+", text):
+            sentence = sentence.strip()
+            if len(sentence) > 10:
+                phases[rng.choice(names)].append(sentence)
+        # Real models tend to keep talking after the JSON
+        return json.dumps(phases) + "\n\nEach sentence was assigned to the phase it most closely describes."
+
+    def _chunks(self, text: str) -> List[str]:
+        # Roughly one token per four characters, emitted word by word
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def generate(self, model_id: str, parameters: Dict, prompt: str) -> str:
+        text = self._render(prompt, parameters.get("max_new_tokens", 1000))
+        time.sleep(self._sample_latency() + len(text) / 4 / self.tokens_per_second)
+        if self._should_fail():
+            self._record(error=True)
+            raise ConnectionError("Simulated upstream failure")
+        self._record(text)
+        return text
+
+    def generate_stream(self, model_id: str, parameters: Dict, prompt: str) -> Iterator[str]:
+        text = self._render(prompt, parameters.get("max_new_tokens", 1000))
+        time.sleep(self._sample_latency())
+        if self._should_fail():
+            self._record(error=True)
+            raise ConnectionError("Simulated upstream failure")
+        produced = 0
+        try:
+            for chunk in self._chunks(text):
+                time.sleep(len(chunk) / 4 / self.tokens_per_second)
+                produced += len(chunk)
+                yield chunk
+        except GeneratorExit:
+            self._record_stream(produced)
+            raise
+        self._record(text)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "latency_ms": self.latency_ms,
+            "latency_distribution": self.latency_distribution,
+            "tokens_per_second": self.tokens_per_second,
+            "error_rate": self.error_rate,
+        })
+        return stats
+
+
+def create_backend(credentials: Dict, project_id: str) -> ModelBackend:
+    backend = os.getenv("MODEL_BACKEND", "watsonx").lower()
+    if backend == "simulated":
+        return SimulatedBackend()
+    if backend == "watsonx":
+        return WatsonxBackend(credentials, project_id)
+    raise ValueError(f"Unknown MODEL_BACKEND: {backend}")
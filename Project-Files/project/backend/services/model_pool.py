@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class PooledClient:
+    """A model client plus the bookkeeping the pool needs to manage it"""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.failures = 0
+
+
+class ModelClientPool:
+    """Bounded LRU pool of long-lived model clients keyed by (model_id, parameters).
+
+    Building a client costs an IAM token exchange and a fresh HTTP session, so
+    clients are reused across requests and only rebuilt when they age past
+    ``max_age`` (before the token they hold expires) or after repeated failures.
+    """
+
+    def __init__(self, factory: Callable[[str, Dict], Any], max_size: int = None,
+                 max_age: float = None, max_failures: int = None):
+        self.factory = factory
+        self.max_size = max_size or int(os.getenv("WATSONX_POOL_SIZE", "4"))
+        # IAM access tokens live for 60 minutes; rebuild well before that
+        self.max_age = max_age or float(os.getenv("WATSONX_CLIENT_MAX_AGE", "3000"))
+        self.max_failures = max_failures or int(os.getenv("WATSONX_CLIENT_MAX_FAILURES", "3"))
+
+        self._clients: "OrderedDict[Hashable, PooledClient]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_id: str, parameters: Dict) -> Tuple[str, str]:
+        return model_id, json.dumps(parameters, sort_keys=True, default=str)
+
+    def _is_stale(self, entry: PooledClient) -> bool:
+        return time.monotonic() - entry.created_at >= self.max_age
+
+    def get(self, model_id: str, parameters: Dict) -> Any:
+        """Return a pooled client for the given model/parameters, building one if needed"""
+        key = self.make_key(model_id, parameters)
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and not self._is_stale(entry):
+                self._clients.move_to_end(key)
+                entry.last_used = time.monotonic()
+                self.hits += 1
+                return entry.client
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Build outside the pool lock so a slow token exchange for one key
+        # does not block lookups for the others
+        with key_lock:
+            with self._lock:
+                entry = self._clients.get(key)
+                if entry is not None and not self._is_stale(entry):
+                    self._clients.move_to_end(key)
+                    self.hits += 1
+                    return entry.client
+                refreshing = entry is not None
+
+            client = self.factory(model_id, parameters)
+
+            with self._lock:
+                if refreshing:
+                    self.refreshes += 1
+                else:
+                    self.misses += 1
+                self._clients[key] = PooledClient(client)
+                self._clients.move_to_end(key)
+                while len(self._clients) > self.max_size:
+                    evicted_key, _ = self._clients.popitem(last=False)
+                    self._key_locks.pop(evicted_key, None)
+                    self.evictions += 1
+            return client
+
+    def report_success(self, model_id: str, parameters: Dict):
+        key = self.make_key(model_id, parameters)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry.failures = 0
+
+    def report_failure(self, model_id: str, parameters: Dict):
+        """Record a failed call; evict the client once it looks broken"""
+        key = self.make_key(model_id, parameters)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                return
+            entry.failures += 1
+            if entry.failures >= self.max_failures:
+                del self._clients[key]
+                self.evictions += 1
+
+    def invalidate(self, model_id: str, parameters: Dict):
+        key = self.make_key(model_id, parameters)
+        with self._lock:
+            if self._clients.pop(key, None) is not None:
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+                "clients": [
+                    {
+                        "model_id": key[0],
+                        "age_seconds": round(now - entry.created_at, 1),
+                        "idle_seconds": round(now - entry.last_used, 1),
+                        "failures": entry.failures,
+                    }
+                    for key, entry in self._clients.items()
+                ],
+            }
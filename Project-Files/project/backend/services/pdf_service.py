@@ -1,36 +1,164 @@
-import fitz  # PyMuPDF
-import tempfile
+import hashlib
+import multiprocessing
 import os
-from typing import Dict, List
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# PDF content in memory, or the path of a file holding it
+PDFSource = Union[bytes, memoryview, str]
+
+# Shared by every PDFService instance in the worker process
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+class PDFParseError(Exception):
+    """The content could not be opened or read as a PDF (damaged, truncated or not a PDF)"""
+
+def _fitz():
+    # PyMuPDF is one of the slowest imports in the app, so it is loaded on first
+    # use (or by the background warm-up) rather than when the server starts
+    import fitz  # PyMuPDF
+    return fitz
+
+def _open(pdf_content: PDFSource):
+    if isinstance(pdf_content, str):
+        return _fitz().open(pdf_content, filetype="pdf")
+    return _fitz().open(stream=pdf_content, filetype="pdf")
+
+def _shareable(pdf_content: PDFSource) -> Union[bytes, str]:
+    # Pool tasks are pickled: paths travel as-is and each process opens the file itself
+    return bytes(pdf_content) if isinstance(pdf_content, memoryview) else pdf_content
+
+def _extract_page_range(pdf_content: Union[bytes, str], start: int, end: int, clean: bool) -> List[str]:
+    """Process-pool task: extract (and optionally clean) one contiguous range of pages"""
+    service = PDFService(workers=1)
+    pages = service.iter_pages(pdf_content, (start, end))
+    if clean:
+        return [service.clean_text(page) for page in pages]
+    return list(pages)
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn rather than fork: the server process is multi-threaded
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
 
 class PDFService:
-    def __init__(self):
-        pass
+    def __init__(self, workers: int = None, parallel_min_pages: int = None):
+        self.workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+        # Below this many pages the process hand-off costs more than it saves
+        self.parallel_min_pages = parallel_min_pages or int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
     
-    def extract_text_from_pdf(self, pdf_content: bytes) -> str:
-        """Extract text from PDF bytes"""
+    def page_count(self, pdf_content: PDFSource) -> int:
+        try:
+            with _open(pdf_content) as doc:
+                return len(doc)
+        except Exception as e:
+            raise PDFParseError(f"Error extracting text from PDF: {str(e)}")
+    
+    def iter_pages(self, pdf_content: PDFSource, page_range: Optional[Tuple[int, int]] = None) -> Iterator[str]:
+        """Yield the text of each page, opening the PDF straight from memory or its file.
+        
+        ``page_range`` is a half-open ``(start, end)`` range of zero-based page numbers.
+        """
+        try:
+            doc = _open(pdf_content)
+        except Exception as e:
+            raise PDFParseError(f"Error extracting text from PDF: {str(e)}")
+        
         try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(pdf_content)
-                temp_file_path = temp_file.name
-            
-            # Extract text using PyMuPDF
-            doc = fitz.open(temp_file_path)
-            text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            
+            start, end = page_range or (0, len(doc))
+            for page_num in range(max(0, start), min(end, len(doc))):
+                yield doc.load_page(page_num).get_text()
+        except Exception as e:
+            raise PDFParseError(f"Error extracting text from PDF: {str(e)}")
+        finally:
             doc.close()
-            
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
-            return text
+    
+    def extract_pages(self, pdf_content: PDFSource, page_range: Optional[Tuple[int, int]] = None,
+                      clean: bool = False) -> Iterator[str]:
+        """Yield page texts in order, fanning large documents out over a process pool"""
+        total = self.page_count(pdf_content)
+        start, end = page_range or (0, total)
+        start, end = max(0, start), min(end, total)
+        
+        if self.workers <= 1 or end - start < self.parallel_min_pages:
+            pages = self.iter_pages(pdf_content, (start, end))
+            return (self.clean_text(page) for page in pages) if clean else pages
+        
+        step = -(-(end - start) // self.workers)
+        pool = _get_process_pool(self.workers)
+        shared = _shareable(pdf_content)
+        futures = [
+            pool.submit(_extract_page_range, shared, s, min(s + step, end), clean)
+            for s in range(start, end, step)
+        ]
+        return (page for future in futures for page in future.result())
+    
+    def page_fingerprints(self, pdf_content: PDFSource) -> List[str]:
+        """Hash each page's content stream, geometry and fonts without extracting any text.
+        
+        Pages whose fingerprint is unchanged between two revisions of a file
+        extract to the same text, so their cached text can be reused.
+        """
+        try:
+            with _open(pdf_content) as doc:
+                fingerprints = []
+                for page in doc:
+                    digest = hashlib.sha256(page.read_contents())
+                    fonts = sorted(font[3] for font in page.get_fonts())
+                    digest.update(f"{page.rect}|{page.rotation}|{fonts}".encode("utf-8"))
+                    fingerprints.append(digest.hexdigest())
+                return fingerprints
         except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
+            raise PDFParseError(f"Error extracting text from PDF: {str(e)}")
+    
+    def extract_selected_pages(self, pdf_content: PDFSource, page_numbers: List[int],
+                               clean: bool = False) -> Dict[int, str]:
+        """Extract only the given zero-based pages, batching contiguous runs"""
+        runs: List[Tuple[int, int]] = []
+        for number in sorted(set(page_numbers)):
+            if runs and runs[-1][1] == number:
+                runs[-1] = (runs[-1][0], number + 1)
+            else:
+                runs.append((number, number + 1))
+        
+        if self.workers <= 1 or len(page_numbers) < self.parallel_min_pages:
+            texts: Dict[int, str] = {}
+            for start, end in runs:
+                for number, page in zip(range(start, end), self.iter_pages(pdf_content, (start, end))):
+                    texts[number] = self.clean_text(page) if clean else page
+            return texts
+        
+        # Split long runs so every worker gets a share
+        step = -(-len(page_numbers) // self.workers)
+        ranges = [(s, min(s + step, end)) for start, end in runs for s in range(start, end, step)]
+        pool = _get_process_pool(self.workers)
+        shared = _shareable(pdf_content)
+        futures = [(s, pool.submit(_extract_page_range, shared, s, e, clean)) for s, e in ranges]
+        return {s + i: page for s, future in futures for i, page in enumerate(future.result())}
+    
+    def extract_text_from_pdf(self, pdf_content: PDFSource, page_range: Optional[Tuple[int, int]] = None) -> str:
+        """Extract text from PDF bytes"""
+        return "".join(self.extract_pages(pdf_content, page_range))
+    
+    def extract_clean_text(self, pdf_content: PDFSource, page_range: Optional[Tuple[int, int]] = None) -> str:
+        """Extract and clean text page by page, so the raw text of the whole document is never held at once"""
+        cleaned_pages = self.extract_pages(pdf_content, page_range, clean=True)
+        return ' '.join(page for page in cleaned_pages if page)
     
     def clean_text(self, text: str) -> str:
         """Clean and preprocess extracted text"""
@@ -0,0 +1,300 @@
+import os
+import re
+import string
+import textwrap
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast token estimate without a tokenizer.
+
+    About four characters per token for prose; code and symbol-heavy text
+    splits into more tokens per character, which the word count catches.
+    """
+    return max(len(text) // 4, len(text.split()) * 4 // 3) + 1
+
+
+def _fit_words(line: str, budget: int, from_end: bool = False) -> str:
+    """Longest word-aligned prefix (or suffix) of one long line within ``budget`` tokens"""
+    words = line.split(" ")
+    if from_end:
+        words.reverse()
+    kept, used = [], 0
+    for word in words:
+        cost = estimate_tokens(word + " ") - 1
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    if from_end:
+        kept.reverse()
+    return " ".join(kept)
+
+
+def _take_lines(lines: List[str], budget: int, from_end: bool = False) -> List[str]:
+    """Whole lines from one end within ``budget`` tokens, finishing with part of the next line"""
+    ordered = reversed(lines) if from_end else lines
+    kept, used = [], 0
+    for line in ordered:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            partial = _fit_words(line, budget - used - 1, from_end)
+            if partial:
+                kept.append(partial)
+            break
+        kept.append(line)
+        used += cost
+    if from_end:
+        kept.reverse()
+    return kept
+
+
+def _truncate_head(text: str, budget: int) -> str:
+    """Keep the start of the input"""
+    return "\n".join(_take_lines(text.splitlines(), budget)) + "\n... [truncated]"
+
+
+def _truncate_tail(text: str, budget: int) -> str:
+    """Keep the end of the input, for messages where the latest part matters most"""
+    return "[truncated] ...\n" + "\n".join(_take_lines(text.splitlines(), budget, from_end=True))
+
+
+def _truncate_head_tail(text: str, budget: int) -> str:
+    """Window over the input: two thirds of the budget on the start, the rest on the end"""
+    lines = text.splitlines()
+    head = _take_lines(lines, budget * 2 // 3)
+    # Lines already in the head, including a partially kept one, are not repeated
+    tail = _take_lines(lines[len(head):], budget - sum(estimate_tokens(line) for line in head), from_end=True)
+    omitted = len(lines) - len(head) - len(tail)
+    return "\n".join(head) + f"\n... [{omitted} lines omitted] ...\n" + "\n".join(tail)
+
+
+TRUNCATION_STRATEGIES = {
+    "head": _truncate_head,
+    "tail": _truncate_tail,
+    "head_tail": _truncate_head_tail,
+}
+
+
+def truncate_text(text: str, budget: int, strategy: str = "head") -> str:
+    """``text`` cut down to about ``budget`` tokens, or unchanged if it already fits"""
+    if estimate_tokens(text) <= budget:
+        return text
+    return TRUNCATION_STRATEGIES[strategy](text, budget)
+
+
+class RenderedPrompt:
+    __slots__ = ("text", "max_new_tokens", "input_tokens", "truncated")
+
+    def __init__(self, text: str, max_new_tokens: int, input_tokens: int, truncated: bool):
+        self.text = text
+        self.max_new_tokens = max_new_tokens
+        self.input_tokens = input_tokens
+        self.truncated = truncated
+
+
+class PromptTemplate:
+    """A prompt with normalized whitespace, parsed once, and its token budgets.
+
+    ``max_input_tokens`` caps the whole rendered prompt; when it would be
+    exceeded, ``truncate_field`` is cut down with ``strategy`` to fit.
+    Budgets can be overridden with ``PROMPT_<NAME>_MAX_INPUT_TOKENS`` and
+    ``PROMPT_<NAME>_MAX_NEW_TOKENS``.
+    """
+
+    def __init__(self, name: str, template: str, max_input_tokens: int, max_new_tokens: int,
+                 truncate_field: str = None, strategy: str = "head"):
+        self.name = name
+        # Indentation in the source costs tokens on every call and means nothing to the model
+        self.text = _TRAILING_SPACE.sub("\n", textwrap.dedent(template).strip("\n")) + "\n"
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(self.text)
+        ]
+        self.fields = {field for _, field in self.parts if field}
+        self.fixed_tokens = estimate_tokens("".join(literal for literal, _ in self.parts))
+
+        env_name = name.upper()
+        self.max_input_tokens = int(os.getenv(f"PROMPT_{env_name}_MAX_INPUT_TOKENS", str(max_input_tokens)))
+        self.max_new_tokens = int(os.getenv(f"PROMPT_{env_name}_MAX_NEW_TOKENS", str(max_new_tokens)))
+        if truncate_field is not None and truncate_field not in self.fields:
+            raise ValueError(f"Template {name} has no field {truncate_field}")
+        self.truncate_field = truncate_field
+        self.truncate = TRUNCATION_STRATEGIES[strategy]
+
+    def _join(self, values: Dict[str, str]) -> str:
+        return "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+
+    def render(self, **values: Any) -> RenderedPrompt:
+        values = {field: str(values[field]) for field in self.fields}
+        costs = {field: estimate_tokens(value) for field, value in values.items()}
+        input_tokens = self.fixed_tokens + sum(costs.values())
+        truncated = False
+
+        if input_tokens > self.max_input_tokens and self.truncate_field is not None:
+            field = self.truncate_field
+            budget = max(0, self.max_input_tokens - (input_tokens - costs[field]))
+            values[field] = self.truncate(values[field], budget)
+            input_tokens = input_tokens - costs[field] + estimate_tokens(values[field])
+            truncated = True
+
+        return RenderedPrompt(self._join(values), self.max_new_tokens, input_tokens, truncated)
+
+
+class PromptRegistry:
+    """Named prompt templates plus per-template token usage"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        self._templates[template.name] = template
+        self._usage[template.name] = {"calls": 0, "input_tokens": 0, "truncated": 0, "output_tokens": 0}
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def render(self, name: str, **values: Any) -> RenderedPrompt:
+        prompt = self._templates[name].render(**values)
+        with self._lock:
+            usage = self._usage[name]
+            usage["calls"] += 1
+            usage["input_tokens"] += prompt.input_tokens
+            usage["truncated"] += int(prompt.truncated)
+        return prompt
+
+    def record_output(self, name: str, text: str):
+        with self._lock:
+            self._usage[name]["output_tokens"] += estimate_tokens(text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    **usage,
+                    "max_input_tokens": self._templates[name].max_input_tokens,
+                    "max_new_tokens": self._templates[name].max_new_tokens,
+                    "template_tokens": self._templates[name].fixed_tokens,
+                }
+                for name, usage in self._usage.items()
+            }
+
+
+# Global instance
+prompt_registry = PromptRegistry()
+
+prompt_registry.register(PromptTemplate("classify_sdlc_phases", """
+    Analyze the following text and classify each sentence into SDLC phases.
+    Phases: {phases}
+
+    Text: {text}
+
+    Format the response as JSON with the following structure:
+    {structure}
+
+    Response:
+    """, max_input_tokens=3000, max_new_tokens=1000, truncate_field="text"))
+
+prompt_registry.register(PromptTemplate("classify_numbered_items", """
+    Classify each numbered item below into exactly one SDLC phase.
+    Phases: Requirements, Design, Development, Testing, Deployment, Maintenance
+
+    Items:
+    {items}
+
+    Answer with one line per item in the form "<number>: <Phase>" and nothing else.
+
+    Response:
+    """, max_input_tokens=3000, max_new_tokens=400))
+
+prompt_registry.register(PromptTemplate("generate_code", """
+    Generate clean, production-ready {language} code for the following requirement:
+
+    Requirement: {prompt}
+
+    Please provide only the code with proper comments and best practices.
+
+    Code:
+    """, max_input_tokens=1500, max_new_tokens=1000, truncate_field="prompt"))
+
+prompt_registry.register(PromptTemplate("fix_bug", """
+    Analyze the following {language} code and fix any bugs or issues:
+
+    Code:
+    {code}
+
+    Please provide the corrected code with explanations of what was fixed:
+
+    Fixed Code:
+    """, max_input_tokens=3000, max_new_tokens=2000, truncate_field="code", strategy="head_tail"))
+
+prompt_registry.register(PromptTemplate("fix_bug_chunk", """
+    Below is one part of a larger {language} file. The context shows the rest of
+    the file that this part depends on; do not repeat it.
+
+    Context:
+    {context}
+
+    Code:
+    {code}
+
+    Fix any bugs or issues in the code above. Reply with the corrected code in a
+    single code block, followed by one short line per fix explaining what changed.
+
+    Fixed Code:
+    """, max_input_tokens=3000, max_new_tokens=1500, truncate_field="code", strategy="head_tail"))
+
+prompt_registry.register(PromptTemplate("generate_test_cases", """
+    Generate comprehensive test cases for the following {language} code:
+
+    Code:
+    {code}
+
+    Please provide unit tests using appropriate testing framework:
+
+    Test Cases:
+    """, max_input_tokens=3000, max_new_tokens=1500, truncate_field="code", strategy="head_tail"))
+
+prompt_registry.register(PromptTemplate("generate_test_cases_chunk", """
+    Below is one part of a larger {language} file. The context shows the rest of
+    the file that this part depends on.
+
+    Context:
+    {context}
+
+    Code:
+    {code}
+
+    Write unit tests for the functions and classes in the code above using an
+    appropriate testing framework. Reply with the test code only, in a single code block.
+
+    Test Cases:
+    """, max_input_tokens=3000, max_new_tokens=1500, truncate_field="code", strategy="head_tail"))
+
+prompt_registry.register(PromptTemplate("chat_response", """
+    You are an AI assistant specialized in Software Development Lifecycle (SDLC).
+    {history}Answer the following question with helpful, accurate information:
+
+    Question: {message}
+
+    Answer:
+    """, max_input_tokens=2500, max_new_tokens=1000, truncate_field="message", strategy="tail"))
+
+prompt_registry.register(PromptTemplate("chat_summary", """
+    Summarize the conversation below between a user and an SDLC assistant so it
+    can be continued later. Keep names, decisions, requirements, identifiers and
+    open questions; leave out greetings and repetition. Use at most {words} words.
+
+    Earlier summary:
+    {summary}
+
+    New turns:
+    {turns}
+
+    Updated summary:
+    """, max_input_tokens=3000, max_new_tokens=300, truncate_field="turns", strategy="head_tail"))
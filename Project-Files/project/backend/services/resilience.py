@@ -0,0 +1,323 @@
+import contextvars
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from fastapi import HTTPException
+
+_STATUS_IN_MESSAGE = re.compile(r"status(?:[ _]code)?\D{0,3}(\d{3})", re.IGNORECASE)
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ModelServiceError(HTTPException):
+    """The model backend failed to produce a response (502 Bad Gateway)"""
+
+    def __init__(self, detail: str, retryable: bool = False, status_code: int = 502, headers: Dict = None):
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.retryable = retryable
+
+
+class ModelUnavailableError(ModelServiceError):
+    """The call was not attempted: the breaker is open or no upstream slot freed up in time (503)"""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(
+            detail, status_code=503,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for candidate in (exc, getattr(exc, "response", None)):
+        code = getattr(candidate, "status_code", None)
+        if isinstance(code, int):
+            return code
+    match = _STATUS_IN_MESSAGE.search(str(exc))
+    return int(match.group(1)) if match else None
+
+
+def classify_error(exc: BaseException) -> ModelServiceError:
+    """Wrap a backend exception in a :class:`ModelServiceError`, deciding whether it is worth retrying"""
+    if isinstance(exc, ModelServiceError):
+        return exc
+    status = _status_code(exc)
+    if status is not None:
+        retryable = status in RETRYABLE_STATUS
+    else:
+        # Network-level failures are transient; anything else is most likely a bug or bad input
+        retryable = isinstance(exc, (ConnectionError, TimeoutError))
+    error = ModelServiceError(f"Model backend error: {str(exc) or type(exc).__name__}", retryable=retryable)
+    error.__cause__ = exc
+    return error
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = reset_timeout or float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def allow(self):
+        """Raise :class:`ModelUnavailableError` unless a call may go through now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.short_circuited += 1
+                    raise ModelUnavailableError("Model backend is unavailable, try again shortly", remaining)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.short_circuited += 1
+                    raise ModelUnavailableError("Model backend is recovering, try again shortly", 1)
+                self._probe_in_flight = True
+
+    def release_probe(self):
+        """Let another call probe: the half-open probe was never sent, so it says nothing about the backend"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class ResilientCaller:
+    """Retries, hedging and circuit breaking around blocking model calls.
+
+    Retryable failures are retried with full-jitter exponential backoff. When
+    hedging is enabled, a call still running after the observed latency
+    percentile gets a duplicate, and whichever answers first wins; a budget
+    caps the extra upstream load. All attempts pass through one breaker.
+
+    Every attempt, including retries, hedges and the parallel chunk calls one
+    request can fan out into, also holds one of ``max_concurrent`` upstream
+    slots while it runs. The scheduler counts admitted requests; this bounds
+    the calls the model provider actually sees from the process.
+    """
+
+    def __init__(self, breaker: CircuitBreaker = None, max_attempts: int = None,
+                 base_delay: float = None, max_delay: float = None, max_concurrent: int = None):
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts or int(os.getenv("MODEL_RETRY_ATTEMPTS", "3"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("MODEL_RETRY_MAX_DELAY", "8"))
+
+        self.hedge_enabled = os.getenv("MODEL_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+        self.hedge_budget = float(os.getenv("MODEL_HEDGE_BUDGET", "0.1"))
+        self.hedge_min_samples = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+        self._latencies = deque(maxlen=256)
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+
+        self.max_concurrent = max_concurrent or int(os.getenv(
+            "MODEL_MAX_CONCURRENT_CALLS", os.getenv("INFERENCE_MAX_CONCURRENCY", "8")))
+        # Seconds an attempt may wait for an upstream slot before failing with 503
+        self.slot_timeout = float(os.getenv("MODEL_SLOT_TIMEOUT", "60"))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.active_calls = 0
+        self.slot_timeouts = 0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            if (not self.hedge_enabled or len(self._latencies) < self.hedge_min_samples
+                    or self.hedges >= self.calls * self.hedge_budget):
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                # A primary and its hedge per upstream slot; more would only queue
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.max_concurrent,
+                                                          thread_name_prefix="hedge")
+            return self._hedge_executor
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.slot_timeout):
+            with self._lock:
+                self.slot_timeouts += 1
+            raise ModelUnavailableError("Too many model calls in progress, try again shortly", self.slot_timeout)
+        with self._lock:
+            self.active_calls += 1
+
+    def _release_slot(self):
+        with self._lock:
+            self.active_calls -= 1
+        self._slots.release()
+
+    def _limited(self, func: Callable[[], str], acquired: bool = False) -> str:
+        """Run ``func`` holding an upstream slot; ``acquired`` if the caller already took it"""
+        if not acquired:
+            self._acquire_slot()
+        try:
+            return func()
+        finally:
+            self._release_slot()
+
+    def _attempt(self, func: Callable[[], str]) -> str:
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._limited(func)
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(contextvars.copy_context().run, self._limited, func)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # A duplicate only goes out if a slot is free right now; it never queues behind real work
+        if not self._slots.acquire(blocking=False):
+            return primary.result()
+        with self._lock:
+            self.active_calls += 1
+            self.hedges += 1
+        hedge = executor.submit(contextvars.copy_context().run, self._limited, func, True)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    # The slower duplicate keeps running; its result is discarded
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, func: Callable[[], str]) -> str:
+        """Run ``func`` with retries; raises :class:`ModelServiceError` once they are exhausted"""
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.max_attempts):
+            self.breaker.allow()
+            started = time.perf_counter()
+            try:
+                result = self._attempt(func)
+            except Exception as e:
+                error = self._record_failure(e, attempt)
+                if error is not None:
+                    raise error
+                continue
+            self.breaker.record_success()
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+            return result
+
+    def stream(self, factory: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Yield from ``factory()``, retrying only while nothing has been yielded yet"""
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.max_attempts):
+            self.breaker.allow()
+            produced = False
+            try:
+                self._acquire_slot()
+                try:
+                    # The slot is held until the stream ends or the consumer closes it
+                    for chunk in factory():
+                        produced = True
+                        yield chunk
+                finally:
+                    self._release_slot()
+            except GeneratorExit:
+                # The consumer stopped early (e.g. it had what it needed); the backend was fine
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                error = self._record_failure(e, attempt, can_retry=not produced)
+                if error is not None:
+                    raise error
+                continue
+            self.breaker.record_success()
+            return
+
+    def _record_failure(self, exc: Exception, attempt: int, can_retry: bool = True) -> Optional[ModelServiceError]:
+        """Count a failed attempt; returns the error to raise, or None after sleeping before a retry"""
+        error = classify_error(exc)
+        if isinstance(error, ModelUnavailableError):
+            # No upstream slot; the attempt never reached the backend
+            self.breaker.release_probe()
+            return error
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            # The backend answered; the request itself was the problem
+            self.breaker.record_success()
+        if not (can_retry and error.retryable and attempt + 1 < self.max_attempts):
+            with self._lock:
+                self.failures += 1
+            return error
+        with self._lock:
+            self.retries += 1
+        time.sleep(self._backoff(attempt))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "hedge_enabled": self.hedge_enabled,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "max_concurrent_calls": self.max_concurrent,
+                "active_calls": self.active_calls,
+                "slot_timeouts": self.slot_timeouts,
+            }
+        stats["breaker"] = self.breaker.stats()
+        return stats
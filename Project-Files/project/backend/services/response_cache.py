@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class DiskCacheTier:
+    """SQLite-backed second tier so cached generations survive restarts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def put(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class ResponseCache:
+    """Content-addressed cache for deterministic (greedy) model generations.
+
+    Entries are keyed by a hash of the model id, generation parameters and the
+    fully rendered prompt. The memory tier is an LRU bounded by entry count and
+    total bytes, with a TTL; an optional SQLite tier sits behind it. Concurrent
+    misses for the same key are collapsed into a single upstream call.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, ttl: float = None,
+                 disk_path: str = None):
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+        self.max_bytes = max_bytes or int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        self.ttl = ttl or float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "false"
+
+        disk_path = disk_path or os.getenv("RESPONSE_CACHE_DB")
+        self.disk = DiskCacheTier(disk_path) if disk_path else None
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.bytes_served = 0
+
+    @staticmethod
+    def make_key(model_id: str, parameters: Dict, prompt: str) -> str:
+        payload = json.dumps(
+            {"model_id": model_id, "parameters": parameters, "prompt": prompt},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _store(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[0].encode("utf-8"))
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode("utf-8"))
+            self.evictions += 1
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Memory-tier lookup; caller holds the lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= len(value.encode("utf-8"))
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                self.bytes_served += len(value.encode("utf-8"))
+                return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self.bytes_served += len(value.encode("utf-8"))
+                    self._store(key, value)
+                return value
+        return None
+
+    def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value, self.ttl)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """Return the cached value, or run ``compute`` once even if many threads ask at the same time"""
+        if not self.enabled:
+            return compute()
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            # A leader may have finished between the lookup above and here
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                self.bytes_served += len(value.encode("utf-8"))
+                return value
+            waiter = self._in_flight.get(key)
+            if waiter is None:
+                leader = Future()
+                self._in_flight[key] = leader
+            else:
+                self.shared += 1
+
+        if waiter is not None:
+            # Exceptions propagate to every caller, and nothing is cached
+            return waiter.result()
+
+        try:
+            value = compute()
+            self.put(key, value)
+            leader.set_result(value)
+            return value
+        except BaseException as e:
+            leader.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self.misses += 1
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.shared
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+                "hit_rate": round((self.hits + self.disk_hits + self.shared) / lookups, 4) if lookups else 0.0,
+                "disk_path": self.disk.path if self.disk is not None else None,
+            }
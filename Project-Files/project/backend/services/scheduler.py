@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+# Lower runs first: interactive chat ahead of single generations ahead of bulk work
+ROUTE_PRIORITIES = {
+    "chat": 0,
+    "generate-code": 1,
+    "fix-bug": 1,
+    "generate-tests": 1,
+    "classify": 2,
+    "classify-batch": 2,
+    "chat-summary": 2,
+}
+DEFAULT_PRIORITY = 1
+
+
+class SchedulerRejected(HTTPException):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        self.retry_after = retry_after
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        route, _, value = part.partition("=")
+        limits[route.strip()] = int(value)
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "route", "future")
+
+    def __init__(self, priority: int, seq: int, route: str, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.future = future
+
+
+class InferenceScheduler:
+    """Admission control in front of the model backend.
+
+    Limits concurrent model calls globally and per route, queues a bounded
+    number of waiters in priority order, applies a per-client token bucket,
+    and rejects quickly with 429/503 and Retry-After instead of letting work
+    pile up. All state is touched from the event loop thread only.
+    """
+
+    def __init__(self, max_concurrency: int, route_limits: Dict[str, int] = None,
+                 max_queue: int = None, max_wait: float = None,
+                 rate_per_minute: float = None, burst: float = None, max_clients: int = 10000):
+        self.max_concurrency = max_concurrency
+        bulk_limit = max(1, max_concurrency // 2)
+        self.route_limits = {"classify": bulk_limit, "classify-batch": bulk_limit}
+        self.route_limits.update(route_limits if route_limits is not None
+                                 else _parse_limits(os.getenv("SCHEDULER_ROUTE_LIMITS", "")))
+        self.max_queue = max_queue or int(os.getenv("SCHEDULER_MAX_QUEUE", "64"))
+        self.max_wait = max_wait or float(os.getenv("SCHEDULER_MAX_WAIT", "30"))
+        self.rate = (rate_per_minute or float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))) / 60.0
+        self.burst = burst or float(os.getenv("RATE_LIMIT_BURST", "20"))
+        self.max_clients = max_clients
+
+        self.active = 0
+        self.active_by_route: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Smoothed model-call duration, used to estimate Retry-After
+        self._service_time = 5.0
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _route_has_capacity(self, route: str) -> bool:
+        limit = self.route_limits.get(route, self.max_concurrency)
+        return self.active_by_route.get(route, 0) < limit
+
+    def _start(self, route: str):
+        self.active += 1
+        self.active_by_route[route] = self.active_by_route.get(route, 0) + 1
+        self.admitted += 1
+
+    def _estimated_wait(self) -> float:
+        return self._service_time * (len(self._waiters) + 1) / self.max_concurrency
+
+    def _check_rate(self, client: Optional[str]):
+        if not client or self.rate <= 0:
+            return
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client)
+        wait = bucket.take()
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise SchedulerRejected(429, "Rate limit exceeded, slow down", wait)
+
+    async def acquire(self, route: str, client: Optional[str] = None):
+        self._check_rate(client)
+
+        if self.active < self.max_concurrency and self._route_has_capacity(route) and not self._waiters:
+            self._start(route)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise SchedulerRejected(503, "Server is at capacity, try again shortly", self._estimated_wait())
+
+        waiter = _Waiter(ROUTE_PRIORITIES.get(route, DEFAULT_PRIORITY), next(self._seq), route,
+                         asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._waiters.sort(key=lambda w: (w.priority, w.seq))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                return
+            self.rejected["queue_timeout"] += 1
+            raise SchedulerRejected(503, "Timed out waiting for model capacity", self._estimated_wait())
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                # Already granted a slot; hand it back
+                self.release(route)
+            raise
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it was granted a slot in the meantime"""
+        if waiter.future.done():
+            return False
+        self._waiters.remove(waiter)
+        waiter.future.cancel()
+        return True
+
+    def _dispatch(self):
+        """Start queued waiters in priority order while capacity allows"""
+        index = 0
+        while index < len(self._waiters) and self.active < self.max_concurrency:
+            waiter = self._waiters[index]
+            if self._route_has_capacity(waiter.route):
+                self._waiters.pop(index)
+                self._start(waiter.route)
+                waiter.future.set_result(None)
+            else:
+                # Its route is saturated; let lower-priority work on other routes through
+                index += 1
+
+    def release(self, route: str, duration: float = None):
+        self.active -= 1
+        self.active_by_route[route] = self.active_by_route.get(route, 1) - 1
+        if duration is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * duration
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "active_by_route": dict(self.active_by_route),
+            "route_limits": dict(self.route_limits),
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "estimated_service_seconds": round(self._service_time, 3),
+        }
@@ -0,0 +1,335 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from services.file_lock import file_lock
+from services.metrics import observe_stage
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_WORD = re.compile(r"[a-z0-9+#]+")
+_NUMBER = re.compile(r"\d+")
+# Words that change how a question is phrased but not what it asks
+_STOP_WORDS = frozenset(
+    "a an and are about can could define describe do does during explain for give has have how i in is it "
+    "list me mean my of on or please should show tell the to use what whats which why with would you".split()
+)
+# Spelled-out and abbreviated forms of the same term
+_SYNONYMS = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r"\bsoftware development life ?cycle\b", "sdlc"),
+    (r"\blife cycle\b", "lifecycle"),
+    (r"\bci\b", "continuous integration"),
+    (r"\b(?:benefits|pros)\b", "advantages"),
+    (r"\b(?:drawbacks|cons)\b", "disadvantages"),
+)]
+_SUFFIXES = ("ations", "ation", "ments", "ment", "ings", "ing", "ed", "es", "s", "e")
+# The term after these must agree, so "TDD better than BDD" never answers "BDD better than TDD"
+_DIRECTIONAL = frozenset("than over instead before after".split())
+# Bumped when the features change, so vectors saved by an older version are not reused
+FEATURE_VERSION = 2
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping; it only has to agree with itself"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+# Words every question in this app is about; they count for little in the similarity
+_GENERIC_WORDS = frozenset(_stem(word) for word in "approach lifecycle methodology phase process sdlc stage step".split())
+_GENERIC_WEIGHT = 0.3
+
+
+class HashedTextVectorizer:
+    """Bag of hashed features, so questions can be compared without a model or a vocabulary.
+
+    Each text becomes stemmed word unigrams, word bigrams and character
+    trigrams hashed into ``dim`` signed buckets with sublinear term frequency.
+    The trigrams let near-identical words match and survive typos; features
+    of words generic to the SDLC domain are down-weighted.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        """Lowercased words with synonyms canonicalized, stop words included"""
+        text = text.lower().replace("'", "")
+        for pattern, replacement in _SYNONYMS:
+            text = pattern.sub(replacement, text)
+        return _WORD.findall(text)
+
+    @classmethod
+    def words(cls, text: str) -> List[str]:
+        return [_stem(word) for word in cls.tokens(text) if word not in _STOP_WORDS]
+
+    def features(self, text: str) -> List[Tuple[str, float]]:
+        words = self.words(text)
+        weights = [_GENERIC_WEIGHT if word in _GENERIC_WORDS else 1.0 for word in words]
+        features = [(f"w:{word}", weight) for word, weight in zip(words, weights)]
+        features.extend((f"b:{a}_{b}", min(wa, wb))
+                        for (a, wa), (b, wb) in zip(zip(words, weights), zip(words[1:], weights[1:])))
+        for word, weight in zip(words, weights):
+            padded = f"<{word}>"
+            features.extend((f"c:{padded[i:i + 3]}", weight) for i in range(len(padded) - 2))
+        return features
+
+    def signature(self, text: str) -> Tuple[frozenset, Tuple[str, ...]]:
+        """What two questions must share to be paraphrases: their specific words, and what each
+        comparison points at. Similar wording alone lets "find a memory leak" match "fix" one."""
+        specific = frozenset(word for word in self.words(text) if word not in _GENERIC_WORDS)
+        tokens = [token for token in self.tokens(text) if token not in _STOP_WORDS]
+        directions = tuple(f"{token}:{_stem(following)}" for token, following in zip(tokens, tokens[1:])
+                           if token in _DIRECTIONAL)
+        return specific, directions
+
+    def vector(self, text: str) -> "np.ndarray":
+        import numpy as np
+
+        counts: Dict[int, float] = {}
+        for feature, weight in self.features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            bucket = digest % self.dim
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign * weight
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for bucket, count in counts.items():
+            # Sublinear above one occurrence; down-weighted features stay linear
+            vector[bucket] = math.copysign(1.0 + math.log(abs(count)), count) if abs(count) > 1 else count
+        return vector
+
+
+class SemanticCache:
+    """Answers for questions that are close paraphrases of ones already answered.
+
+    Questions are stored as hashed term vectors in a fixed-size matrix.
+    Lookups weight the matrix by inverse document frequency, take the cosine
+    top-k and accept the best match above ``threshold``. Numbers in the two
+    questions must agree, so "HTTP 404" never answers "HTTP 500", and so must
+    their :meth:`~HashedTextVectorizer.signature`. The threshold and features
+    were chosen on one set of labelled question pairs and are checked against
+    a separate held-out set they were not fitted to. When full,
+    the least recently used entry is replaced; entries also expire after
+    ``ttl`` seconds. The index is saved to ``path`` on shutdown and every
+    ``save_every`` inserts, and each worker process loads it on first use.
+    Saving merges in what other workers have saved meanwhile.
+    """
+
+    def __init__(self, namespace: str = "", path: str = None, max_entries: int = None,
+                 threshold: float = None, top_k: int = None, dim: int = None, ttl: float = None):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() != "false"
+        self.namespace = namespace
+        self.path = path or os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.npz")
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7"))
+        self.top_k = top_k or int(os.getenv("SEMANTIC_CACHE_TOP_K", "3"))
+        self.ttl = ttl or float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+        self.save_every = int(os.getenv("SEMANTIC_CACHE_SAVE_EVERY", "50"))
+        self.vectorizer = HashedTextVectorizer(dim or int(os.getenv("SEMANTIC_CACHE_DIM", "1024")))
+        self._lock = threading.Lock()
+        # numpy is imported and the arrays allocated on first use, keeping it off the startup path
+        self._loaded = False
+        self._vectors: Optional["np.ndarray"] = None
+        self._entries: List[Dict[str, Any]] = []
+        self._document_frequency: Optional["np.ndarray"] = None
+        self._weighted: Optional["np.ndarray"] = None  # idf-weighted, row-normalized; rebuilt after changes
+        self._idf: Optional["np.ndarray"] = None
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        import numpy as np
+
+        self._loaded = True
+        self._vectors = np.zeros((0, self.vectorizer.dim), dtype=np.float32)
+        self._document_frequency = np.zeros(self.vectorizer.dim, dtype=np.float32)
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                vectors = data["vectors"]
+            if (meta.get("namespace") != self.namespace or meta.get("version") != FEATURE_VERSION
+                    or vectors.shape[1] != self.vectorizer.dim):
+                # Answers from another model or a different vector layout are not reused
+                return
+            now = time.time()
+            keep = [i for i, entry in enumerate(meta["entries"]) if entry["created_at"] > now - self.ttl]
+            keep = keep[-self.max_entries:]
+            self._vectors = vectors[keep].astype(np.float32)
+            self._entries = [meta["entries"][i] for i in keep]
+            self._document_frequency = (self._vectors != 0).sum(axis=0).astype(np.float32)
+        except Exception as e:
+            print(f"Error loading semantic cache from {self.path}: {str(e)}")
+
+    def _index(self):
+        import numpy as np
+
+        if self._weighted is None:
+            count = len(self._entries)
+            self._idf = np.log((count + 1) / (self._document_frequency + 1)).astype(np.float32) + 1.0
+            weighted = self._vectors * self._idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            self._weighted = weighted / np.maximum(norms, 1e-9)
+        return self._weighted, self._idf
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """The cached answer for the closest earlier question, or None below the threshold"""
+        if not self.enabled:
+            return None
+        import numpy as np
+
+        started = time.perf_counter()
+        query = self.vectorizer.vector(question)
+        match = None
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self._entries and query.any():
+                weighted, idf = self._index()
+                query = query * idf
+                scores = weighted @ (query / np.linalg.norm(query))
+                k = min(self.top_k, len(scores))
+                candidates = np.argpartition(-scores, k - 1)[:k]
+                numbers = set(_NUMBER.findall(question))
+                signature = self.vectorizer.signature(question)
+                now = time.time()
+                for i in sorted(candidates, key=lambda i: -scores[i]):
+                    entry = self._entries[i]
+                    if scores[i] < self.threshold:
+                        break
+                    if entry["created_at"] < now - self.ttl or set(entry["numbers"]) != numbers:
+                        continue
+                    if self.vectorizer.signature(entry["question"]) != signature:
+                        continue
+                    entry["used_at"] = now
+                    entry["hits"] += 1
+                    match = {"question": entry["question"], "answer": entry["answer"],
+                             "score": round(float(scores[i]), 4)}
+                    break
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            elapsed = time.perf_counter() - started
+            self.lookup_seconds += elapsed
+        observe_stage("semantic_cache_lookup", elapsed)
+        return match
+
+    def add(self, question: str, answer: str):
+        import numpy as np
+
+        if not self.enabled or not answer.strip():
+            return
+        vector = self.vectorizer.vector(question)
+        if not vector.any():
+            return
+        now = time.time()
+        entry = {"question": question, "answer": answer, "numbers": sorted(set(_NUMBER.findall(question))),
+                 "created_at": now, "used_at": now, "hits": 0}
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if len(self._entries) < self.max_entries:
+                self._vectors = np.vstack([self._vectors, vector])
+                self._entries.append(entry)
+            else:
+                # Expired entries go first, then the least recently used
+                row = min(range(len(self._entries)), key=lambda i: (
+                    self._entries[i]["created_at"] >= now - self.ttl, self._entries[i]["used_at"]))
+                self._document_frequency -= self._vectors[row] != 0
+                self._vectors[row] = vector
+                self._entries[row] = entry
+                self.evictions += 1
+            self._document_frequency += vector != 0
+            self._weighted = None
+            self._unsaved += 1
+            save = self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def _merge_saved(self, vectors: "np.ndarray",
+                     entries: List[Dict[str, Any]]) -> Tuple["np.ndarray", List[Dict[str, Any]]]:
+        """Add the unexpired entries in the saved file that this process does not have"""
+        import numpy as np
+
+        if not os.path.exists(self.path):
+            return vectors, entries
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                saved = data["vectors"]
+        except Exception as e:
+            print(f"Error reading semantic cache {self.path} to merge: {str(e)}")
+            return vectors, entries
+        if (meta.get("namespace") != self.namespace or meta.get("version") != FEATURE_VERSION
+                or saved.shape[1] != self.vectorizer.dim):
+            return vectors, entries
+
+        known = {entry["question"] for entry in entries}
+        now = time.time()
+        extra = [i for i, entry in enumerate(meta["entries"])
+                 if entry["question"] not in known and entry["created_at"] > now - self.ttl]
+        if not extra:
+            return vectors, entries
+        vectors = np.vstack([vectors, saved[extra].astype(np.float32)])
+        entries = entries + [meta["entries"][i] for i in extra]
+        if len(entries) > self.max_entries:
+            # Keep the most recently used, in their original order
+            keep = sorted(sorted(range(len(entries)), key=lambda i: entries[i]["used_at"])[-self.max_entries:])
+            vectors = vectors[keep]
+            entries = [entries[i] for i in keep]
+        return vectors, entries
+
+    def save(self):
+        """Write the index atomically; a no-op when nothing changed since the last save"""
+        import numpy as np
+
+        with self._lock:
+            if not self.enabled or not self._unsaved:
+                return
+            vectors = self._vectors.copy()
+            entries = [dict(entry) for entry in self._entries]
+            self._unsaved = 0
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            # Workers share the file; without the lock the last one to save would drop the others' entries
+            with file_lock(f"{self.path}.lock"):
+                vectors, entries = self._merge_saved(vectors, entries)
+                meta = json.dumps({"namespace": self.namespace, "version": FEATURE_VERSION, "entries": entries})
+                with open(temporary, "wb") as f:
+                    np.savez(f, vectors=vectors, meta=np.array(meta))
+                os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"Error saving semantic cache to {self.path}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "dim": self.vectorizer.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,110 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.metrics import metrics
+
+# Slow third-party imports that requests only need on some routes. Workers load
+# them on first use, or in the background once startup has finished.
+HEAVY_MODULES = ("fitz", "numpy")
+
+
+def import_module(name: str) -> Callable[[], None]:
+    return lambda: importlib.import_module(name)
+
+
+class StartupReport:
+    """How long this worker process took to become ready, phase by phase.
+
+    ``main`` imports this module before anything else, so the report starts
+    at the beginning of the app import. When launched by ``run_backend.py``
+    the time since launch (process start, interpreter and imports included)
+    is reported too. Background warm-ups are recorded as they finish.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.enabled_warm_up = os.getenv("STARTUP_WARM_UP", "true").lower() != "false"
+        launched_at = os.getenv("SMARTSDLC_LAUNCHED_AT")
+        self.launched_at = float(launched_at) if launched_at else None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+        self.warm_ups: Dict[str, Dict[str, Any]] = {}
+        self.ready_seconds: Optional[float] = None
+        self.since_launch_seconds: Optional[float] = None
+
+    def mark(self, name: str):
+        """Record the time since the report was created as phase ``name``"""
+        self.phases[name] = round(time.perf_counter() - self._started, 3)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 3)
+
+    def ready(self):
+        self.ready_seconds = round(time.perf_counter() - self._started, 3)
+        if self.launched_at is not None:
+            self.since_launch_seconds = round(time.time() - self.launched_at, 3)
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        launch = f", {self.since_launch_seconds:.2f}s since launch" if self.since_launch_seconds else ""
+        print(f"Worker {self.pid} ready in {self.ready_seconds:.2f}s{launch} ({phases})")
+
+    def warm_up(self, tasks: List[Tuple[str, Callable]]) -> Optional[threading.Thread]:
+        """Run ``tasks`` in order on a daemon thread, so the worker serves requests meanwhile.
+
+        A task that raises or returns False is reported as failed; whatever it
+        was loading is then loaded by the first request that needs it.
+        """
+        if not self.enabled_warm_up:
+            return None
+
+        def run():
+            for name, task in tasks:
+                started = time.perf_counter()
+                error = None
+                try:
+                    ok = task() is not False
+                except Exception as e:
+                    ok, error = False, str(e)
+                with self._lock:
+                    self.warm_ups[name] = {
+                        "ok": ok,
+                        "seconds": round(time.perf_counter() - started, 3),
+                        "error": error,
+                    }
+                if not ok:
+                    print(f"Warning: background warm-up of {name} failed" + (f": {error}" if error else ""))
+
+        thread = threading.Thread(target=run, name="startup-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            warm_ups = {name: dict(result) for name, result in self.warm_ups.items()}
+        return {
+            "pid": self.pid,
+            "ready": self.ready_seconds is not None,
+            "ready_seconds": self.ready_seconds,
+            "since_launch_seconds": self.since_launch_seconds,
+            "phases": dict(self.phases),
+            "warm_up_enabled": self.enabled_warm_up,
+            "warm_ups": warm_ups,
+            "loaded_modules": {name: name in sys.modules for name in HEAVY_MODULES},
+        }
+
+
+# Global instance
+startup_report = StartupReport()
+metrics.register_collector(lambda: {
+    "smartsdlc_startup_ready_seconds": startup_report.ready_seconds or 0.0,
+})
@@ -0,0 +1,156 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Per-container parser states
+_KEY, _COLON, _VALUE, _COMMA = "key", "colon", "value", "comma"
+
+
+class JSONObjectScanner:
+    """Single-pass scanner over streamed model output for the first JSON object.
+
+    ``feed`` consumes chunks as they arrive and reports when the top-level
+    object has closed, so generation can stop right there instead of running
+    on to the token limit. While scanning it remembers the last position at
+    which the text could be cut and closed into valid JSON, which lets
+    ``repaired`` turn a truncated object into the longest parseable prefix.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self.start = -1
+        self.end = -1
+        self._stack: List[List[str]] = []  # [opener, state] per open container
+        self._in_string = False
+        self._escape = False
+        self._in_scalar = False
+        self._safe_cut = -1
+        self._safe_closers = ""
+
+    @property
+    def complete(self) -> bool:
+        return self.end != -1
+
+    def _mark_safe(self, position: int):
+        self._safe_cut = position
+        self._safe_closers = "".join(_CLOSERS[opener] for opener, _ in reversed(self._stack))
+
+    def _value_done(self, position: int):
+        if self._stack:
+            self._stack[-1][1] = _COMMA
+            self._mark_safe(position)
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next chunk; returns True once the top-level object has closed"""
+        if self.complete:
+            return True
+        offset = self._length
+        self._parts.append(chunk)
+        self._length += len(chunk)
+
+        for i, ch in enumerate(chunk):
+            position = offset + i
+            if self.start == -1:
+                if ch == "{":
+                    self.start = position
+                    self._stack.append(["{", _KEY])
+                    self._mark_safe(position + 1)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    state = self._stack[-1][1]
+                    if state == _KEY:
+                        self._stack[-1][1] = _COLON
+                    else:
+                        self._value_done(position + 1)
+                continue
+
+            if self._in_scalar:
+                if ch in ",}] \t\r\n":
+                    self._in_scalar = False
+                    self._value_done(position)
+                else:
+                    continue
+
+            if ch in " \t\r\n":
+                continue
+            opener, state = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                if state == _COMMA:
+                    # Missing comma; treat it as if it were there
+                    self._stack[-1][1] = _KEY if opener == "{" else _VALUE
+            elif ch == ":" and state == _COLON:
+                self._stack[-1][1] = _VALUE
+            elif ch == ",":
+                self._stack[-1][1] = _KEY if opener == "{" else _VALUE
+            elif ch in "{[":
+                self._stack.append([ch, _KEY if ch == "{" else _VALUE])
+                self._mark_safe(position + 1)
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.end = position
+                    return True
+                self._value_done(position + 1)
+            elif state == _VALUE:
+                self._in_scalar = True
+        return False
+
+    @property
+    def text(self) -> str:
+        """Everything received so far, up to and including the closing brace once complete"""
+        text = "".join(self._parts)
+        if len(self._parts) > 1:
+            self._parts = [text]
+        return text[:self.end + 1] if self.complete else text
+
+    def object_text(self) -> Optional[str]:
+        if self.start == -1:
+            return None
+        return self.text[self.start:]
+
+    def repaired(self) -> Optional[str]:
+        """Longest prefix of a truncated object that closes into valid JSON"""
+        if self.start == -1:
+            return None
+        text = self.text
+        if self.complete:
+            return text[self.start:]
+        return text[self.start:self._safe_cut] + self._safe_closers
+
+
+def _loads(candidate: str) -> Optional[Any]:
+    for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_json_object(raw: str) -> Tuple[Optional[Dict], bool]:
+    """Parse the first JSON object in ``raw``, repairing truncation if needed.
+
+    Returns ``(data, repaired)``; ``data`` is None when no object can be recovered.
+    """
+    scanner = JSONObjectScanner()
+    scanner.feed(raw)
+    text = scanner.object_text()
+    if text is None:
+        return None, False
+    data = _loads(text)
+    if isinstance(data, dict):
+        return data, False
+    data = _loads(scanner.repaired())
+    return (data, True) if isinstance(data, dict) else (None, False)
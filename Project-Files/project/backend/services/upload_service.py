@@ -0,0 +1,296 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import weakref
+from typing import Any, Dict, Optional, Union
+
+import multipart
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import parse_options_header
+
+from services.metrics import metrics
+
+PDF_MAGIC = b"%PDF-"
+# PDF readers accept the header anywhere in the first 1024 bytes
+MAGIC_WINDOW = 1024
+# Room for the multipart boundaries and part headers around the file itself
+FORM_OVERHEAD = 64 * 1024
+
+
+def _megabytes(name: str, default: str) -> int:
+    return int(float(os.getenv(name, default)) * 1024 * 1024)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413,
+                         detail=f"File is larger than the {max_bytes / 1024 / 1024:.3g} MB upload limit")
+
+
+class MemoryBudget:
+    """Bytes of upload data a worker process may hold in memory at once, across all uploads"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, size: int) -> bool:
+        with self._lock:
+            if self.in_use + size > self.limit:
+                return False
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self.in_use -= size
+
+
+class _Holdings:
+    """What an upload has to give back when it is closed, or garbage-collected unclosed"""
+
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.reserved = 0
+        self.path: Optional[str] = None
+
+    def release(self):
+        if self.reserved:
+            self.budget.release(self.reserved)
+            self.reserved = 0
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"Error removing upload spool file {self.path}: {str(e)}")
+            self.path = None
+
+
+class SpooledUpload:
+    """One uploaded file, written chunk by chunk and hashed as it arrives.
+
+    The content stays in memory while it is under ``spool_bytes`` and the
+    worker's :class:`MemoryBudget` has room, and moves to a temporary file
+    otherwise. ``source`` hands it to PyMuPDF: the content as ``bytes``, copied
+    out of the buffer once when the upload finishes, or the temporary file's
+    path. PyMuPDF 1.23 refuses a ``memoryview`` stream, so a view of the
+    buffer cannot be passed on.
+    """
+
+    def __init__(self, filename: str, budget: MemoryBudget, max_bytes: int, spool_bytes: int,
+                 tmp_dir: str = None):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.tmp_dir = tmp_dir
+        self.size = 0
+        self.budget_spill = False
+        self._digest = hashlib.sha256()
+        self._head = b""
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._content: Optional[bytes] = None
+        self._file = None
+        self._holdings = _Holdings(budget)
+        self._finalizer = weakref.finalize(self, self._holdings.release)
+
+    @property
+    def in_memory(self) -> bool:
+        return self._holdings.path is None
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        if not self.in_memory:
+            return self._holdings.path
+        return self._content
+
+    def _check_magic(self):
+        if PDF_MAGIC not in self._head:
+            raise HTTPException(status_code=415, detail="File content is not a PDF")
+
+    def _spill(self):
+        fd, path = tempfile.mkstemp(prefix="upload-", suffix=".pdf", dir=self.tmp_dir)
+        self._holdings.path = path
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+        self._holdings.budget.release(self._holdings.reserved)
+        self._holdings.reserved = 0
+
+    def write(self, data: Union[bytes, memoryview]):
+        if self.size + len(data) > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        # Checked as soon as enough bytes are in, so a non-PDF is refused before the rest is read
+        if len(self._head) < MAGIC_WINDOW:
+            self._head += bytes(data[:MAGIC_WINDOW - len(self._head)])
+            if len(self._head) >= MAGIC_WINDOW:
+                self._check_magic()
+        self._digest.update(data)
+        self.size += len(data)
+        if self.in_memory:
+            if self.size <= self.spool_bytes:
+                if self._holdings.budget.try_reserve(len(data)):
+                    self._holdings.reserved += len(data)
+                    self._buffer.write(data)
+                    return
+                self.budget_spill = True
+            self._spill()
+        self._file.write(data)
+
+    def finish(self):
+        """Validate the complete upload and flush it; ``source`` is usable afterwards"""
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="The uploaded file is empty")
+        if len(self._head) < MAGIC_WINDOW:
+            self._check_magic()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.in_memory:
+            self._content = self._buffer.getvalue()
+            self._buffer = None
+
+    def close(self):
+        """Free the buffer or remove the temporary file and return the memory budget"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = None
+        self._content = None
+        self._finalizer()
+
+
+class UploadService:
+    """Reads PDF uploads straight from the request body into :class:`SpooledUpload` objects.
+
+    FastAPI's ``UploadFile`` reaches the handler only after the whole body has
+    been parsed and spooled, so an oversized or non-PDF file would be read in
+    full before it could be refused. Parsing the multipart stream here rejects
+    those as soon as the headers or the first kilobyte show the problem.
+    """
+
+    def __init__(self, max_bytes: int = None, spool_bytes: int = None, memory_budget: int = None,
+                 tmp_dir: str = None):
+        self.max_bytes = max_bytes or _megabytes("UPLOAD_MAX_MB", "50")
+        self.spool_bytes = spool_bytes or _megabytes("UPLOAD_SPOOL_MB", "4")
+        self.budget = MemoryBudget(memory_budget or _megabytes("UPLOAD_MEMORY_BUDGET_MB", "64"))
+        self.tmp_dir = tmp_dir or os.getenv("UPLOAD_TMP_DIR") or None
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.spilled = 0
+        self.budget_spills = 0
+        self.bytes_received = 0
+
+    def _record(self, upload: Optional[SpooledUpload], error: bool = False):
+        with self._lock:
+            if error:
+                self.rejected += 1
+                return
+            self.accepted += 1
+            self.bytes_received += upload.size
+            if not upload.in_memory:
+                self.spilled += 1
+            if upload.budget_spill:
+                self.budget_spills += 1
+
+    async def receive_pdf(self, request: Request, field: str = "file") -> SpooledUpload:
+        """Read the ``field`` part of a multipart/form-data body; other parts are skipped.
+
+        The caller owns the returned upload and must ``close()`` it.
+        """
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        boundary = options.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            self._record(None, error=True)
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes + FORM_OVERHEAD:
+            self._record(None, error=True)
+            raise _too_large(self.max_bytes)
+
+        events = []
+        header_field, header_value, headers = bytearray(), bytearray(), {}
+
+        def on_header_end():
+            headers[bytes(header_field).lower()] = bytes(header_value)
+            header_field.clear()
+            header_value.clear()
+
+        def on_headers_finished():
+            events.append(("part", dict(headers)))
+            headers.clear()
+
+        # Data arrives as views into the current chunk and is consumed before the next one is read
+        parser = multipart.MultipartParser(boundary, {
+            "on_header_field": lambda data, start, end: header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": lambda data, start, end: events.append(("data", memoryview(data)[start:end])),
+        })
+
+        upload: Optional[SpooledUpload] = None
+        current: Optional[SpooledUpload] = None
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for kind, value in events:
+                    if kind == "part":
+                        _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                        current = None
+                        if upload is None and disposition.get(b"name", b"").decode("latin-1") == field:
+                            filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+                            if not filename.endswith(".pdf"):
+                                raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+                            upload = current = SpooledUpload(filename, self.budget, self.max_bytes,
+                                                             self.spool_bytes, self.tmp_dir)
+                    elif current is not None:
+                        if current.in_memory:
+                            current.write(value)
+                        else:
+                            await run_in_threadpool(current.write, value)
+                events.clear()
+            parser.finalize()
+            if upload is None:
+                raise HTTPException(status_code=400, detail=f"No '{field}' file in the upload")
+            await run_in_threadpool(upload.finish)
+        except BaseException:
+            if upload is not None:
+                upload.close()
+            self._record(None, error=True)
+            raise
+        self._record(upload)
+        return upload
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "spilled_to_disk": self.spilled,
+                "budget_spills": self.budget_spills,
+                "bytes_received": self.bytes_received,
+                "max_bytes": self.max_bytes,
+                "spool_bytes": self.spool_bytes,
+                "memory_budget": self.budget.limit,
+                "memory_in_use": self.budget.in_use,
+                "memory_peak": self.budget.peak,
+            }
+
+
+# Global instance
+upload_service = UploadService()
+metrics.register_collector(lambda: {
+    f"smartsdlc_upload_{name}"
+    + ("_total" if name in ("accepted", "rejected", "spilled_to_disk", "budget_spills", "bytes_received") else ""): value
+    for name, value in upload_service.stats().items()
+})
@@ -1,8 +1,11 @@
 import os
 from dotenv import load_dotenv
-from ibm_watsonx_ai.foundation_models import Model
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
-import json
+from services.model_backends import create_backend
+from services.response_cache import ResponseCache
+from services.metrics import metrics, span
+from services.resilience import ResilientCaller
+from services.structured_output import JSONObjectScanner
+from services.prompt_templates import estimate_tokens, prompt_registry
 
 load_dotenv()
 
@@ -18,107 +21,206 @@ class WatsonxService:
             "apikey": self.api_key
         }
         
+        # Keys are the ibm_watsonx_ai GenTextParamsMetaNames values, spelled out
+        # so the SDK is not imported unless the watsonx backend is in use
         self.parameters = {
-            GenParams.DECODING_METHOD: "greedy",
-            GenParams.MAX_NEW_TOKENS: 1000,
-            GenParams.TEMPERATURE: 0.1,
-            GenParams.TOP_P: 1.0,
-            GenParams.TOP_K: 50
+            "decoding_method": "greedy",
+            "max_new_tokens": 1000,
+            "temperature": 0.1,
+            "top_p": 1.0,
+            "top_k": 50
         }
+        
+        # MODEL_BACKEND=simulated swaps in an offline stand-in for load testing
+        self.backend = create_backend(self.credentials, self.project_id)
+        self.cache = ResponseCache()
+        self.resilience = ResilientCaller()
+        self.json_calls = 0
+        self.json_early_stops = 0
+    
+    def warm_up(self):
+        """Build the default client ahead of the first request"""
+        return self.backend.warm_up(self.model_id, self.parameters)
+    
+    def backend_stats(self):
+        stats = self.backend.stats()
+        stats.update({"json_calls": self.json_calls, "json_early_stops": self.json_early_stops})
+        return stats
+    
+    def cache_stats(self):
+        return self.cache.stats()
+    
+    def resilience_stats(self):
+        return self.resilience.stats()
     
-    def get_model(self):
+    def cache_namespace(self):
+        """Identifies the model and settings, so cached outputs from another model are never reused"""
+        return f"{self.backend.name}:{self.model_id}"
+    
+    def _parameters(self, max_new_tokens: int = None):
+        if max_new_tokens is None:
+            return self.parameters
+        return {**self.parameters, "max_new_tokens": max_new_tokens}
+    
+    def _cache_key(self, prompt: str, parameters: dict):
+        return self.cache.make_key(self.cache_namespace(), parameters, prompt)
+    
+    def _generate(self, prompt: str, parameters: dict):
+        metrics.upstream_in_flight.inc()
         try:
-            model = Model(
-                model_id=self.model_id,
-                params=self.parameters,
-                credentials=self.credentials,
-                project_id=self.project_id
-            )
-            return model
-        except Exception as e:
-            print(f"Error creating model: {str(e)}")
-            return None
-    
-    def generate_response(self, prompt: str):
+            with span("model_generate"):
+                response = self.backend.generate(self.model_id, parameters, prompt)
+        finally:
+            metrics.upstream_in_flight.dec()
+        # Same estimate as the prompt budgets; exact counts are not returned by generate_text
+        metrics.upstream_tokens.inc(estimate_tokens(prompt), direction="prompt")
+        metrics.upstream_tokens.inc(estimate_tokens(response), direction="output")
+        return response
+    
+    def generate_response(self, prompt: str, max_new_tokens: int = None):
+        """Generate text for ``prompt``; raises ModelServiceError if the backend fails"""
+        parameters = self._parameters(max_new_tokens)
+        # Greedy decoding is deterministic, so identical prompts can share one result.
+        # Failures raise instead of returning text, so they are never cached.
+        return self.cache.get_or_compute(
+            self._cache_key(prompt, parameters),
+            lambda: self.resilience.call(lambda: self._generate(prompt, parameters))
+        )
+    
+    def _generate_json(self, prompt: str, parameters: dict):
+        scanner = JSONObjectScanner()
+        metrics.upstream_in_flight.inc()
         try:
-            model = self.get_model()
-            if model is None:
-                return "Error: Could not initialize Watson model"
-            
-            response = model.generate_text(prompt=prompt)
-            return response
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
-    
-    def classify_sdlc_phases(self, text: str):
-        prompt = f"""
-        Analyze the following text and classify each sentence into SDLC phases.
-        Phases: Requirements, Design, Development, Testing, Deployment, Maintenance
-        
-        Text: {text}
-        
-        Format the response as JSON with the following structure:
-        {{
-            "Requirements": ["sentence1", "sentence2"],
-            "Design": ["sentence3"],
-            "Development": ["sentence4"],
-            "Testing": ["sentence5"],
-            "Deployment": ["sentence6"],
-            "Maintenance": ["sentence7"]
-        }}
-        
-        Response:
-        """
-        return self.generate_response(prompt)
+            with span("model_generate"):
+                chunks = self.backend.generate_stream(self.model_id, parameters, prompt)
+                try:
+                    for chunk in chunks:
+                        if scanner.feed(chunk):
+                            break
+                finally:
+                    # Closing the stream stops generation once the object is complete
+                    chunks.close()
+        finally:
+            metrics.upstream_in_flight.dec()
+        output = scanner.text
+        self.json_calls += 1
+        if scanner.complete:
+            self.json_early_stops += 1
+        metrics.upstream_tokens.inc(estimate_tokens(prompt), direction="prompt")
+        metrics.upstream_tokens.inc(estimate_tokens(output), direction="output")
+        return output
     
-    def generate_code(self, prompt: str, language: str = "python"):
-        code_prompt = f"""
-        Generate clean, production-ready {language} code for the following requirement:
-        
-        Requirement: {prompt}
-        
-        Please provide only the code with proper comments and best practices.
-        
-        Code:
-        """
-        return self.generate_response(code_prompt)
+    def generate_json(self, prompt: str, max_new_tokens: int = None):
+        """Generate text that should contain a JSON object, ending generation as soon as it closes"""
+        parameters = self._parameters(max_new_tokens)
+        return self.cache.get_or_compute(
+            self._cache_key(prompt, parameters),
+            lambda: self.resilience.call(lambda: self._generate_json(prompt, parameters))
+        )
     
-    def fix_bug(self, code: str, language: str = "python"):
-        bug_prompt = f"""
-        Analyze the following {language} code and fix any bugs or issues:
-        
-        Code:
-        {code}
-        
-        Please provide the corrected code with explanations of what was fixed:
-        
-        Fixed Code:
-        """
-        return self.generate_response(bug_prompt)
+    def generate_response_stream(self, prompt: str, max_new_tokens: int = None):
+        """Yield generated text chunks as the model produces them"""
+        parameters = self._parameters(max_new_tokens)
+        key = self._cache_key(prompt, parameters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        metrics.upstream_in_flight.inc()
+        try:
+            chunks = []
+            for chunk in self.resilience.stream(
+                lambda: self.backend.generate_stream(self.model_id, parameters, prompt)
+            ):
+                chunks.append(chunk)
+                yield chunk
+            output = "".join(chunks)
+            metrics.upstream_tokens.inc(estimate_tokens(prompt), direction="prompt")
+            metrics.upstream_tokens.inc(estimate_tokens(output), direction="output")
+            self.cache.put(key, output)
+        finally:
+            metrics.upstream_in_flight.dec()
     
-    def generate_test_cases(self, code: str, language: str = "python"):
-        test_prompt = f"""
-        Generate comprehensive test cases for the following {language} code:
-        
-        Code:
-        {code}
-        
-        Please provide unit tests using appropriate testing framework:
-        
-        Test Cases:
-        """
-        return self.generate_response(test_prompt)
-    
-    def chat_response(self, message: str):
-        chat_prompt = f"""
-        You are an AI assistant specialized in Software Development Lifecycle (SDLC).
-        Answer the following question with helpful, accurate information:
-        
-        Question: {message}
-        
-        Answer:
-        """
-        return self.generate_response(chat_prompt)
+    def _complete(self, template: str, stream: bool = False, structured: bool = False, **values):
+        """Render a registered prompt template and generate within its token budgets"""
+        prompt = prompt_registry.render(template, **values)
+        if stream:
+            return self._stream_and_record(template, self.generate_response_stream(prompt.text, prompt.max_new_tokens))
+        generate = self.generate_json if structured else self.generate_response
+        output = generate(prompt.text, prompt.max_new_tokens)
+        prompt_registry.record_output(template, output)
+        return output
+    
+    def _stream_and_record(self, template: str, chunks):
+        produced = []
+        for chunk in chunks:
+            produced.append(chunk)
+            yield chunk
+        prompt_registry.record_output(template, "".join(produced))
+    
+    def classify_sdlc_phases(self, text: str, phases: list = None):
+        # A re-ask lists only the phases missing from an earlier answer
+        phases = phases or ["Requirements", "Design", "Development", "Testing", "Deployment", "Maintenance"]
+        structure = "{\n" + ",\n".join(
+            f'    "{phase}": ["sentence{i}"]' for i, phase in enumerate(phases, start=1)
+        ) + "\n}"
+        return self._complete("classify_sdlc_phases", structured=True,
+                              phases=", ".join(phases), text=text, structure=structure)
+    
+    def classify_numbered_items(self, items: list):
+        # Collapse whitespace so every item stays on its own numbered line
+        numbered = "\n".join(f"{i}. {' '.join(item.split())}" for i, item in enumerate(items, start=1))
+        return self._complete("classify_numbered_items", items=numbered)
+    
+    def generate_code(self, prompt: str, language: str = "python", stream: bool = False):
+        return self._complete("generate_code", stream=stream, prompt=prompt, language=language)
+    
+    def fix_bug(self, code: str, language: str = "python", stream: bool = False):
+        return self._complete("fix_bug", stream=stream, code=code, language=language)
+    
+    def generate_test_cases(self, code: str, language: str = "python", stream: bool = False):
+        return self._complete("generate_test_cases", stream=stream, code=code, language=language)
+    
+    def fix_bug_chunk(self, code: str, context: str, language: str = "python"):
+        return self._complete("fix_bug_chunk", code=code, context=context or "(none)", language=language)
+    
+    def generate_test_cases_chunk(self, code: str, context: str, language: str = "python"):
+        return self._complete("generate_test_cases_chunk", code=code, context=context or "(none)", language=language)
+    
+    def chat_response(self, message: str, stream: bool = False, history: str = ""):
+        return self._complete("chat_response", stream=stream, message=message, history=history)
+    
+    def summarize_conversation(self, summary: str, turns: str, words: int = 150):
+        return self._complete("chat_summary", summary=summary or "(none)", turns=turns, words=words)
 
 # Global instance
-watsonx_service = WatsonxService()
\ No newline at end of file
+watsonx_service = WatsonxService()
+metrics.register_collector(lambda: {
+    f"smartsdlc_response_cache_{name}" + ("" if name in ("entries", "bytes") else "_total"): value
+    for name, value in watsonx_service.cache_stats().items()
+    if name in ("entries", "bytes", "hits", "disk_hits", "misses", "shared", "evictions")
+})
+metrics.register_collector(lambda: {
+    f"smartsdlc_model_backend_{name}_total": value
+    for name, value in watsonx_service.backend_stats().items()
+    if name in ("calls", "errors", "output_chars", "hits", "misses", "refreshes", "evictions")
+})
+metrics.register_collector(lambda: {
+    "smartsdlc_model_calls_total": watsonx_service.resilience.calls,
+    "smartsdlc_model_retries_total": watsonx_service.resilience.retries,
+    "smartsdlc_model_failures_total": watsonx_service.resilience.failures,
+    "smartsdlc_model_hedges_total": watsonx_service.resilience.hedges,
+    "smartsdlc_model_hedge_wins_total": watsonx_service.resilience.hedge_wins,
+    "smartsdlc_model_active_calls": watsonx_service.resilience.active_calls,
+    "smartsdlc_model_slot_timeouts_total": watsonx_service.resilience.slot_timeouts,
+    # 0 closed, 1 half-open, 2 open
+    "smartsdlc_model_breaker_state": ("closed", "half_open", "open").index(watsonx_service.resilience.breaker.state),
+    "smartsdlc_model_breaker_short_circuited_total": watsonx_service.resilience.breaker.short_circuited,
+})
+metrics.register_collector(lambda: {
+    f"smartsdlc_prompt_{name}_{field}_total": value
+    for name, usage in prompt_registry.stats().items()
+    for field, value in usage.items()
+    if field in ("calls", "input_tokens", "output_tokens", "truncated")
+})
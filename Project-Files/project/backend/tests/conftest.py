@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Services read their settings at import; keep the tests offline and out of the working tree
+_workdir = tempfile.mkdtemp(prefix="smartsdlc-tests-")
+os.environ.setdefault("MODEL_BACKEND", "simulated")
+os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(_workdir, "semantic_cache.npz"))
+os.environ.setdefault("DOCUMENT_CACHE_DB", os.path.join(_workdir, "document_cache.db"))
+os.environ.setdefault("JOB_STORE_DB", os.path.join(_workdir, "jobs.db"))
+os.environ.setdefault("CHAT_SESSION_DB", os.path.join(_workdir, "chat_sessions.db"))
+os.environ.setdefault("FEEDBACK_STORE_PATH", os.path.join(_workdir, "feedback_data.jsonl"))
+os.environ.setdefault("UPLOAD_TMP_DIR", _workdir)
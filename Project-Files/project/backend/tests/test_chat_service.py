@@ -0,0 +1,30 @@
+import threading
+import time
+
+import services.chat_service as chat_module
+from services.chat_service import ChatService
+
+
+class FakeModel:
+    def cache_namespace(self):
+        return "fake-model"
+
+
+def test_concurrent_first_requests_share_one_store(tmp_path, monkeypatch):
+    created = []
+
+    class SlowStore:
+        def __init__(self, path):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(chat_module, "ChatSessionStore", SlowStore)
+    service = ChatService(model_service=FakeModel(), path=str(tmp_path / "chat.db"))
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(service.store)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(store is created[0] for store in stores)
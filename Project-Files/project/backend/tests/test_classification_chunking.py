@@ -0,0 +1,128 @@
+import json
+import threading
+
+import pytest
+
+from services.classification_service import ClassificationService, SDLC_PHASES
+from services.document_cache import DocumentCache
+from services.prompt_templates import estimate_tokens
+from services.resilience import ModelServiceError
+
+
+class FakeModel:
+    """Puts every sentence of a chunk under Requirements and records the calls"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def cache_namespace(self):
+        return "fake-model"
+
+    def classify_sdlc_phases(self, text, phases=None):
+        with self._lock:
+            self.calls.append((text, phases))
+        if self.fail:
+            raise ModelServiceError("model down", status_code=503)
+        sentences = [s.strip() for s in text.split(".") if s.strip()]
+        return json.dumps({"Requirements": sentences, "Design": [], "Development": [], "Testing": [],
+                           "Deployment": [], "Maintenance": []})
+
+
+def sentences(count, start=0):
+    return [f"The system shall support requirement number {n}" for n in range(start, start + count)]
+
+
+@pytest.fixture
+def service(tmp_path):
+    def build(model=None, **settings):
+        settings.setdefault("chunk_tokens", 40)
+        return ClassificationService(model_service=model or FakeModel(), max_parallel=2,
+                                     document_cache=DocumentCache(path=str(tmp_path / "cache.db")), **settings)
+    return build
+
+
+def test_empty_text_has_no_chunks(service):
+    assert service().chunk_text("") == []
+    assert service().chunk_text("Too short. Also short.") == []
+
+
+def test_chunks_respect_the_token_budget_and_keep_every_sentence(service):
+    classifier = service()
+    text = ". ".join(sentences(30)) + "."
+    chunks = classifier.chunk_text(text)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= classifier.chunk_tokens + 2 for chunk in chunks)
+    packed = [s.strip() for chunk in chunks for s in chunk.split(".") if s.strip()]
+    assert packed == sentences(30)
+
+
+def test_oversized_sentence_is_split_on_words(service):
+    classifier = service()
+    long_sentence = " ".join(f"word{n}" for n in range(200))
+    chunks = classifier.chunk_text(long_sentence + ".")
+    assert len(chunks) > 1
+    assert " ".join(chunk.rstrip(".").replace(". ", " ") for chunk in chunks).split() == long_sentence.split()
+
+
+def test_edit_only_moves_boundaries_up_to_the_next_anchor(service):
+    classifier = service()
+    classifier.anchor_period = 3
+    original = sentences(60)
+    revised = original[:5] + ["An entirely new sentence about requirements"] + original[5:]
+    before = classifier.chunk_text(". ".join(original) + ".")
+    after = classifier.chunk_text(". ".join(revised) + ".")
+    # The tail of the document chunks identically, so its cached results are reused
+    assert before[-3:] == after[-3:]
+
+
+def test_merge_keeps_chunk_order_and_drops_repeats():
+    results = [
+        {"index": 1, "result": {"Testing": ["b", "a"], "Design": ["x"]}},
+        {"index": 0, "result": {"Testing": ["a"], "Requirements": ["r"]}},
+        {"index": 2, "result": {}},
+    ]
+    merged = ClassificationService.merge(results)
+    assert list(merged) == SDLC_PHASES
+    assert merged["Testing"] == ["a", "b"]
+    assert merged["Design"] == ["x"]
+    assert merged["Requirements"] == ["r"]
+    assert merged["Maintenance"] == []
+
+
+def test_merge_of_nothing_is_empty():
+    assert ClassificationService.merge([]) == {phase: [] for phase in SDLC_PHASES}
+
+
+def test_classify_document_merges_chunks_and_reuses_them(service):
+    model = FakeModel()
+    classifier = service(model)
+    text = ". ".join(sentences(12)) + "."
+    first = classifier.classify_document(text)
+    assert first["classification"]["Requirements"] == sentences(12)
+    assert first["chunks_reused"] == 0
+    calls = len(model.calls)
+
+    second = classifier.classify_document(text)
+    assert second["classification"] == first["classification"]
+    assert second["chunks_reused"] == len(second["chunks"])
+    assert len(model.calls) == calls
+
+
+def test_classify_document_raises_when_every_chunk_fails(service):
+    classifier = service(FakeModel(fail=True))
+    with pytest.raises(ModelServiceError):
+        classifier.classify_document(". ".join(sentences(12)) + ".")
+
+
+def test_pack_batches_caps_items_and_tokens(service):
+    classifier = service()
+    classifier.batch_max_items = 3
+    assert classifier.pack_batches([]) == []
+    assert classifier.pack_batches(["short item"] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
+    classifier.batch_max_items = 50
+    classifier.batch_tokens = 20
+    batches = classifier.pack_batches(["x " * 30, "y", "z"])
+    # An item over the budget still gets a batch of its own
+    assert batches == [[0], [1, 2]]
@@ -0,0 +1,144 @@
+import textwrap
+
+import pytest
+
+from services.code_splitter import pack_chunks, split_code
+
+PYTHON = textwrap.dedent('''\
+    import os
+    from typing import List
+
+
+    # Reads the settings file
+    def load(path):
+        return open(path).read()
+
+
+    @decorator
+    class Store:
+        """Keeps things"""
+
+        def get(self, key):
+            return self.items[key]
+
+        def put(self, key, value):
+            self.items[key] = value
+
+
+    VALUE = load("x")
+''')
+
+JAVASCRIPT = textwrap.dedent('''\
+    const fs = require("fs");
+    import { join } from "path";
+
+    // Parses "{" tokens
+    function parse(text) {
+      const open = "{";
+      return text.split(open);
+    }
+
+    /* a comment with { an unbalanced brace
+       spanning lines */
+    class Parser {
+      constructor() {
+        this.close = '}';
+      }
+
+      run(input) {
+        return parse(input);
+      }
+    }
+
+    const answer = 42;
+''')
+
+
+def kinds(segments):
+    return [(segment.kind, segment.name) for segment in segments]
+
+
+@pytest.mark.parametrize("language", ["python", "javascript"])
+def test_empty_input(language):
+    assert split_code("", language, 100) == []
+    assert pack_chunks([], 100) == []
+
+
+@pytest.mark.parametrize("code, language", [(PYTHON, "python"), (JAVASCRIPT, "javascript")])
+@pytest.mark.parametrize("budget", [5, 10000])
+def test_segments_partition_the_source(code, language, budget):
+    assert "".join(segment.text for segment in split_code(code, language, budget)) == code
+
+
+def test_python_splits_on_top_level_definitions():
+    segments = split_code(PYTHON, "python", 10000)
+    assert kinds(segments) == [("import", ""), ("import", ""), ("function", "load"),
+                               ("class", "Store"), ("statement", "")]
+    # Comments above a definition travel with it, and so do its decorators
+    assert segments[2].text.lstrip().startswith("# Reads the settings file")
+    assert segments[3].text.lstrip().startswith("@decorator")
+
+
+def test_python_imports_become_context():
+    segments = split_code(PYTHON, "python", 10000)
+    assert segments[2].context == "import os\nfrom typing import List"
+    assert segments[0].context == ""
+
+
+def test_python_large_class_is_split_into_methods():
+    segments = split_code(PYTHON, "python", 5)
+    assert kinds(segments)[3:] == [("scaffold", "Store"), ("statement", ""), ("function", "get"),
+                                   ("function", "put"), ("statement", "")]
+    assert segments[5].context.endswith("@decorator\nclass Store:")
+
+
+def test_python_syntax_error_falls_back_to_indentation():
+    code = "import os\n\ndef ok():\n    return 1\n\ndef broken(:\n    pass\n"
+    segments = split_code(code, "python", 100)
+    assert "".join(segment.text for segment in segments) == code
+    assert [segment.name for segment in segments] == ["", "ok", "broken"]
+
+
+def test_python_without_statements():
+    segments = split_code("# just a comment\n\n", "python", 100)
+    assert kinds(segments) == [("statement", "")]
+
+
+def test_braces_in_strings_and_comments_are_ignored():
+    segments = split_code(JAVASCRIPT, "javascript", 10000)
+    names = [(segment.kind, segment.name) for segment in segments]
+    assert names == [("import", "fs"), ("import", ""), ("definition", "parse"),
+                     ("definition", "Parser"), ("statement", "answer")]
+    assert segments[-1].text.strip() == "const answer = 42;"
+
+
+def test_brace_language_large_class_is_split_into_members():
+    segments = split_code(JAVASCRIPT, "javascript", 5)
+    parser = [segment for segment in segments if segment.context.endswith("class Parser {")]
+    assert [segment.name for segment in parser] == ["constructor", "run"]
+    assert segments[-2].kind == "scaffold" and segments[-2].text.strip() == "}"
+
+
+def test_unterminated_brace_keeps_the_rest_in_one_segment():
+    code = "int main() {\n  if (x) {\n    return 1;\n}\nint other() { return 2; }\n"
+    segments = split_code(code, "cpp", 10000)
+    assert "".join(segment.text for segment in segments) == code
+    assert len(segments) == 1
+    assert segments[0].name == "main"
+
+
+def test_pack_chunks_skips_verbatim_segments_and_respects_budget():
+    segments = split_code(PYTHON, "python", 5)
+    chunks = pack_chunks(segments, 30)
+    packed = [segment for chunk in chunks for segment in chunk.segments]
+    assert all(segment.kind not in ("import", "scaffold") for segment in packed)
+    # Chunks never mix contexts
+    assert all(len({segment.context for segment in chunk.segments}) == 1 for chunk in chunks)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_pack_chunks_keeps_one_oversized_segment_per_chunk():
+    segments = split_code(PYTHON, "python", 10000)
+    chunks = pack_chunks(segments, 1)
+    assert [chunk.names for chunk in chunks] == [["load"], ["Store"], []]
+    assert chunks[0].start_line == 3 and chunks[0].end_line == 7
@@ -0,0 +1,23 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.feedback_routes import router
+
+app = FastAPI()
+app.include_router(router, prefix="/api/feedback")
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("rating", [0, 6, -1])
+def test_out_of_range_rating_is_rejected(rating):
+    response = client.post("/api/feedback/submit", json={"feature": "Chat", "rating": rating})
+    assert response.status_code == 422
+
+
+def test_valid_rating_is_stored_and_counted():
+    before = client.get("/api/feedback/stats").json()
+    response = client.post("/api/feedback/submit", json={"feature": "Route test", "rating": 5})
+    assert response.status_code == 200
+    stats = client.get("/api/feedback/stats").json()
+    assert stats["total_feedback"] == before["total_feedback"] + 1
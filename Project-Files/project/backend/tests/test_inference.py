@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+from starlette.requests import Request
+
+from services.inference import AsyncInference, InferenceTimeoutError
+
+
+def make_request(peer, **headers):
+    return Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "client": (peer, 50000) if peer else None,
+    })
+
+
+@pytest.fixture
+def inference(monkeypatch):
+    monkeypatch.setenv("TRUSTED_PROXIES", "10.0.0.5, 10.0.0.6")
+    return AsyncInference(max_concurrency=2)
+
+
+def test_client_id_is_the_peer_address(inference):
+    assert inference.client_id(None) is None
+    assert inference.client_id(make_request("203.0.113.7")) == "203.0.113.7"
+    assert inference.client_id(make_request(None)) is None
+
+
+def test_headers_from_untrusted_peers_are_ignored(inference):
+    # Otherwise a client could pick a fresh id per request and never be rate limited
+    request = make_request("203.0.113.7", x_client_id="anything", x_forwarded_for="198.51.100.1")
+    assert inference.client_id(request) == "203.0.113.7"
+
+
+def test_trusted_proxy_names_the_client(inference):
+    assert inference.client_id(make_request("10.0.0.5", x_client_id="user-1")) == "user-1"
+    request = make_request("10.0.0.6", x_forwarded_for="1.1.1.1, 198.51.100.1")
+    assert inference.client_id(request) == "198.51.100.1"
+    assert inference.client_id(make_request("10.0.0.5")) == "10.0.0.5"
+
+
+class SlowStream:
+    """A model stream whose second chunk blocks until ``gate`` is set"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.closed_while_running = False
+        self.closed = threading.Event()
+        self._running = False
+        self._sent = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._running = True
+        try:
+            self._sent += 1
+            if self._sent == 2:
+                self.gate.wait(5)
+            if self._sent > 2:
+                raise StopIteration
+            return f"chunk {self._sent}"
+        finally:
+            self._running = False
+
+    def close(self):
+        self.closed_while_running = self._running
+        self.closed.set()
+
+
+def test_stream_timeout_keeps_the_slot_until_the_running_next_finishes():
+    async def scenario():
+        inference = AsyncInference(max_concurrency=2)
+        stream = SlowStream()
+        received = []
+        with pytest.raises(InferenceTimeoutError):
+            async for chunk in inference.stream(None, lambda: stream, route="chat", timeout=0.1):
+                received.append(chunk)
+        # The second next() is still blocked on a worker thread
+        assert received == ["chunk 1"]
+        assert inference.in_flight == 1 and not stream.closed.is_set()
+
+        stream.gate.set()
+        await asyncio.get_running_loop().run_in_executor(None, stream.closed.wait, 5)
+        await asyncio.sleep(0.05)
+        assert inference.in_flight == 0
+        assert not stream.closed_while_running
+        inference.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_stream_that_finishes_closes_and_releases():
+    async def scenario():
+        inference = AsyncInference(max_concurrency=2)
+        stream = SlowStream()
+        stream.gate.set()
+        chunks = [chunk async for chunk in inference.stream(None, lambda: stream, route="chat")]
+        assert chunks == ["chunk 1", "chunk 2"]
+        await asyncio.get_running_loop().run_in_executor(None, stream.closed.wait, 5)
+        await asyncio.sleep(0.05)
+        assert inference.in_flight == 0
+        inference.shutdown()
+
+    asyncio.run(scenario())
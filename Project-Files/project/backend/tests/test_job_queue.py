@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+
+from services.job_queue import FAILED, QUEUED, JobStore
+
+LEASE = 30
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    # Two boot tokens in one process: the same PID, as when a container restarts a worker
+    old, new = JobStore(path, "old-boot"), JobStore(path, "new-boot")
+    yield old, new
+    old.close()
+    new.close()
+
+
+def age_heartbeat(store, seconds):
+    store._execute("UPDATE job_owners SET heartbeat_at = heartbeat_at - ? WHERE token = ?", (seconds, store.token))
+
+
+def test_jobs_of_a_live_owner_are_kept(stores):
+    old, new = stores
+    old.heartbeat()
+    old.create("job-1", "classify-pdf", None, {})
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 0
+    assert new.get("job-1")["status"] == QUEUED
+
+
+def test_jobs_of_an_owner_past_its_lease_are_failed_despite_a_reused_pid(stores):
+    old, new = stores
+    old.heartbeat()
+    old.create("job-1", "classify-pdf", None, {})
+    age_heartbeat(old, LEASE + 1)
+    assert new.get("job-1")["owner_pid"] == os.getpid()
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 1
+    job = new.get("job-1")
+    assert job["status"] == FAILED and job["error"] == "Interrupted by a server restart"
+    # The stale heartbeat row is dropped too
+    assert old._execute("SELECT COUNT(*) FROM job_owners WHERE token = 'old-boot'").fetchone()[0] == 0
+
+
+def test_own_jobs_are_never_failed(stores):
+    _, new = stores
+    new.create("job-1", "classify-pdf", None, {})
+    new._execute("UPDATE jobs SET created_at = created_at - 3600")
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 0
+
+
+def test_owner_without_a_heartbeat_gets_a_lease_from_creation(stores):
+    old, new = stores
+    old.create("job-1", "classify-pdf", None, {})
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 0
+    old._execute("UPDATE jobs SET created_at = ?", (time.time() - LEASE - 1,))
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 1
+
+
+def test_rows_without_an_owner_are_failed(stores):
+    old, new = stores
+    old.create("job-1", "classify-pdf", None, {})
+    old._execute("UPDATE jobs SET owner = NULL")
+    assert new.fail_orphans(ttl=60, lease=LEASE) == 1
+
+
+def test_retire_removes_the_heartbeat(stores):
+    old, _ = stores
+    old.heartbeat()
+    old.retire()
+    assert old._execute("SELECT COUNT(*) FROM job_owners").fetchone()[0] == 0
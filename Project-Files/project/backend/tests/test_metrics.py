@@ -0,0 +1,29 @@
+from services.metrics import MetricsRegistry
+
+
+def type_lines(text):
+    return {line.split()[2]: line.split()[3] for line in text.splitlines() if line.startswith("# TYPE")}
+
+
+def test_collector_totals_are_counters_and_the_rest_gauges():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: {"smartsdlc_model_calls_total": 3, "smartsdlc_model_active_calls": 1})
+    types = type_lines(registry.render())
+    assert types["smartsdlc_model_calls_total"] == "counter"
+    assert types["smartsdlc_model_active_calls"] == "gauge"
+
+
+def test_service_collectors_export_monotonic_values_as_counters():
+    from services.chat_service import chat_service  # noqa: F401  registers the service collectors
+    from services.inference import inference  # noqa: F401
+    from services.metrics import metrics
+    from services.upload_service import upload_service  # noqa: F401
+
+    types = type_lines(metrics.render())
+    for name in ("smartsdlc_model_calls_total", "smartsdlc_model_retries_total",
+                 "smartsdlc_response_cache_hits_total", "smartsdlc_upload_accepted_total",
+                 "smartsdlc_chat_semantic_cache_hits_total"):
+        assert types[name] == "counter"
+    for name in ("smartsdlc_model_active_calls", "smartsdlc_model_breaker_state",
+                 "smartsdlc_inference_in_flight", "smartsdlc_upload_memory_in_use"):
+        assert types[name] == "gauge"
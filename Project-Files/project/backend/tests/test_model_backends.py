@@ -0,0 +1,30 @@
+import pytest
+
+from services.model_backends import WatsonxBackend
+from services.resilience import ModelServiceError, classify_error
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"request failed with status {status_code}")
+        self.status_code = status_code
+
+
+def failing_backend(status_code):
+    backend = WatsonxBackend(credentials={}, project_id="project")
+
+    def create_model(model_id, parameters):
+        raise ApiError(status_code)
+
+    backend.pool.factory = create_model
+    return backend
+
+
+@pytest.mark.parametrize("status_code, retryable", [(401, False), (403, False), (503, True), (429, True)])
+def test_client_creation_errors_keep_their_status(status_code, retryable):
+    backend = failing_backend(status_code)
+    with pytest.raises(ApiError) as error:
+        backend.generate("model", {"max_new_tokens": 10}, "prompt")
+    classified = classify_error(error.value)
+    assert isinstance(classified, ModelServiceError)
+    assert classified.retryable is retryable
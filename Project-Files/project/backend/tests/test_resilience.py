@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from services.resilience import CircuitBreaker, ModelServiceError, ModelUnavailableError, ResilientCaller
+
+
+def make_caller(**overrides):
+    settings = dict(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01), max_attempts=1,
+                    base_delay=0, max_concurrent=1)
+    settings.update(overrides)
+    caller = ResilientCaller(**settings)
+    caller.slot_timeout = 0.01
+    return caller
+
+
+def fail():
+    raise ModelServiceError("upstream 503", retryable=True)
+
+
+def open_breaker(caller):
+    with pytest.raises(ModelServiceError):
+        caller.call(fail)
+    assert caller.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+
+
+def test_breaker_opens_and_recovers_through_a_probe():
+    caller = make_caller()
+    open_breaker(caller)
+    assert caller.call(lambda: "ok") == "ok"
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_the_breaker():
+    caller = make_caller()
+    open_breaker(caller)
+    with pytest.raises(ModelServiceError):
+        caller.call(fail)
+    assert caller.breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_half_open_probe_that_times_out_on_a_slot_frees_the_probe(streaming):
+    caller = make_caller()
+    open_breaker(caller)
+    caller._acquire_slot()
+    try:
+        with pytest.raises(ModelUnavailableError) as error:
+            if streaming:
+                list(caller.stream(lambda: iter(["never"])))
+            else:
+                caller.call(lambda: "never")
+        assert "Too many model calls" in error.value.detail
+    finally:
+        caller._release_slot()
+    assert caller.slot_timeouts == 1
+    # The probe never reached the backend, so the next call may probe instead of being refused
+    assert caller.breaker.state == CircuitBreaker.HALF_OPEN
+    assert caller.call(lambda: "ok") == "ok"
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_second_caller_is_refused_while_a_probe_is_in_flight():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    breaker.allow()
+    with pytest.raises(ModelUnavailableError):
+        breaker.allow()
+    breaker.release_probe()
+    breaker.allow()
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from services.scheduler import InferenceScheduler, SchedulerRejected, TokenBucket
+
+
+def make_scheduler(**overrides):
+    settings = dict(max_concurrency=1, route_limits={}, max_queue=4, max_wait=1.0, rate_per_minute=6000, burst=100)
+    settings.update(overrides)
+    return InferenceScheduler(**settings)
+
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.scheduler.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.take() == 0.0
+    # Refills never exceed the burst size
+    now[0] += 60
+    assert [bucket.take() for _ in range(4)][-1] == pytest.approx(0.5)
+
+
+def test_rate_limit_is_per_client():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=10, rate_per_minute=1, burst=1)
+        await scheduler.acquire("chat", client="a")
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire("chat", client="a")
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) >= 1
+        await scheduler.acquire("chat", client="b")
+        # Requests without a client id are not rate limited
+        await scheduler.acquire("chat")
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.rejected["rate_limited"] == 1
+    assert scheduler.admitted == 3
+
+
+def test_client_buckets_are_bounded():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=100, max_clients=2)
+        for client in ("a", "b", "c"):
+            await scheduler.acquire("chat", client=client)
+        return scheduler
+
+    assert list(asyncio.run(scenario())._buckets) == ["b", "c"]
+
+
+def test_queue_overflow_is_rejected_with_503():
+    async def scenario():
+        scheduler = make_scheduler(max_queue=2)
+        await scheduler.acquire("chat")
+        waiters = [asyncio.create_task(scheduler.acquire("chat")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire("chat")
+        assert rejected.value.status_code == 503
+        assert "Retry-After" in rejected.value.headers
+        for _ in waiters:
+            scheduler.release("chat")
+        await asyncio.gather(*waiters)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.rejected["queue_full"] == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_queue_timeout_is_rejected_and_the_waiter_removed():
+    async def scenario():
+        scheduler = make_scheduler(max_wait=0.05)
+        await scheduler.acquire("chat")
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire("chat")
+        assert rejected.value.status_code == 503
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.rejected["queue_timeout"] == 1
+    assert scheduler.stats()["queued"] == 0
+    assert scheduler.active == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.acquire("chat")
+        waiter = asyncio.create_task(scheduler.acquire("chat"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release("chat")
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.active == 0
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_waiters_run_in_priority_order():
+    async def scenario():
+        scheduler = make_scheduler()
+        order = []
+
+        async def request(route):
+            await scheduler.acquire(route)
+            order.append(route)
+            scheduler.release(route)
+
+        await scheduler.acquire("generate-code")
+        tasks = [asyncio.create_task(request(route)) for route in ("classify", "generate-code", "chat")]
+        await asyncio.sleep(0)
+        scheduler.release("generate-code")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["chat", "generate-code", "classify"]
+
+
+def test_saturated_route_lets_other_routes_through():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=3, route_limits={"classify": 1})
+        await scheduler.acquire("classify")
+        await scheduler.acquire("chat")
+        await scheduler.acquire("chat")
+        blocked = asyncio.create_task(scheduler.acquire("classify"))
+        other = asyncio.create_task(scheduler.acquire("generate-code"))
+        await asyncio.sleep(0)
+        scheduler.release("chat")
+        await other
+        assert not blocked.done()
+        scheduler.release("classify")
+        await blocked
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.active_by_route == {"classify": 1, "chat": 1, "generate-code": 1}
+
+
+def test_service_time_estimate_follows_releases():
+    scheduler = make_scheduler(max_concurrency=2)
+    asyncio.run(scheduler.acquire("chat"))
+    scheduler.release("chat", duration=10.0)
+    assert scheduler.stats()["estimated_service_seconds"] == pytest.approx(6.0)
@@ -0,0 +1,214 @@
+import time
+
+import pytest
+
+from services.semantic_cache import FEATURE_VERSION, SemanticCache
+
+# (stored question, incoming question, same question?) The threshold and the
+# vectorizer features are tuned so that every pair below is decided correctly;
+# add a pair here before changing either.
+TUNING_PAIRS = [
+    ("What is the testing phase?", "Explain SDLC testing", True),
+    ("What is the testing phase?", "explain the SDLC testing phase", True),
+    ("What is the waterfall model?", "Explain the waterfall model", True),
+    ("What is the waterfall model?", "Can you describe the waterfall model?", True),
+    ("What are the phases of the SDLC?", "List the SDLC phases", True),
+    ("What are the phases of the SDLC?", "What phases does the software development lifecycle have?", True),
+    ("How do I write unit tests in Python?", "How to write Python unit tests?", True),
+    ("How do I write unit tests in Python?", "writing unit tests with python", True),
+    ("What is continuous integration?", "Explain continuous integration", True),
+    ("What is continuous integration?", "what's CI / continuous integration", True),
+    ("What are the advantages of agile?", "What are the benefits of agile?", True),
+    ("What are the advantages of agile?", "advantages of the agile methodology", True),
+    ("How do I fix a memory leak?", "How can I fix memory leaks?", True),
+    ("What is a code review?", "Explain code reviews", True),
+    ("What happens in the deployment phase?", "what happens during deployment", True),
+    ("What is regression testing?", "Explain regression tests", True),
+    ("How do I handle HTTP 404 errors?", "How should I handle an HTTP 404 error?", True),
+    ("What is technical debt?", "explain technical debt please", True),
+    ("Is TDD better than BDD?", "Is BDD better than TDD?", False),
+    ("Should I use TDD over BDD?", "Should I use BDD over TDD?", False),
+    ("How do I handle HTTP 404 errors?", "How do I handle HTTP 500 errors?", False),
+    ("What is the testing phase?", "What is the deployment phase?", False),
+    ("What is the testing phase?", "What is the design phase?", False),
+    ("What is unit testing?", "What is integration testing?", False),
+    ("What is unit testing?", "What is regression testing?", False),
+    ("What is the waterfall model?", "What is the spiral model?", False),
+    ("What is the waterfall model?", "What is the V model?", False),
+    ("What are the advantages of agile?", "What are the disadvantages of agile?", False),
+    ("How do I write unit tests in Python?", "How do I write unit tests in Java?", False),
+    ("How do I write unit tests in Python?", "How do I mock a database in Python unit tests?", False),
+    ("What is continuous integration?", "What is continuous deployment?", False),
+    ("What is continuous integration?", "What is continuous delivery?", False),
+    ("How do I fix a memory leak?", "How do I find a memory leak?", False),
+    ("What is a code review?", "What is a code smell?", False),
+    ("What happens in the deployment phase?", "What happens in the maintenance phase?", False),
+    ("Explain Python decorators", "Explain Python generators", False),
+    ("What is the difference between git merge and rebase?", "What is git rebase?", False),
+    ("How do I sort a list in Python?", "How do I sort a list in JavaScript?", False),
+    ("How do I sort a list in Python?", "How do I reverse a list in Python?", False),
+    ("What is technical debt?", "How do I reduce technical debt?", False),
+]
+
+# Written after the tuning and never used to adjust it, so they show how well
+# matching generalises. Not every pair is decided correctly: at the time of
+# writing 11 of 13 paraphrases were served and 1 of 17 different questions
+# ("Python 2 to 3" against "3 to 2") was wrongly served. Keep this set out of
+# tuning; add cases that need fixing to TUNING_PAIRS instead.
+HELD_OUT_PAIRS = [
+    ("What is a sprint retrospective?", "Explain sprint retrospectives", True),
+    ("What is a sprint retrospective?", "what's a sprint retrospective", True),
+    ("How do I write a good user story?", "How to write good user stories?", True),
+    ("What is the purpose of a requirements document?", "Explain the purpose of a requirements document", True),
+    ("What are microservices?", "Explain microservices", True),
+    ("What are microservices?", "Can you describe microservices?", True),
+    ("How do I resolve a git merge conflict?", "How can I resolve git merge conflicts?", True),
+    ("What is load testing?", "Explain load tests", True),
+    ("What are the benefits of code reviews?", "What are the advantages of code reviews?", True),
+    ("What is a design pattern?", "Explain design patterns", True),
+    ("How do I deploy a Flask app?", "How can I deploy a Flask application?", True),
+    ("What is acceptance testing?", "explain acceptance testing please", True),
+    ("How do I improve test coverage?", "How can I improve my test coverage?", True),
+    ("What is a sprint retrospective?", "What is a sprint review?", False),
+    ("What is a sprint retrospective?", "What is sprint planning?", False),
+    ("How do I write a good user story?", "How do I write a good bug report?", False),
+    ("What are microservices?", "What are monoliths?", False),
+    ("How do I resolve a git merge conflict?", "How do I undo a git merge?", False),
+    ("What is load testing?", "What is stress testing?", False),
+    ("What is load testing?", "What is smoke testing?", False),
+    ("What are the benefits of code reviews?", "What are the drawbacks of code reviews?", False),
+    ("What is a design pattern?", "What is an anti-pattern?", False),
+    ("How do I deploy a Flask app?", "How do I deploy a Django app?", False),
+    ("How do I deploy a Flask app?", "How do I test a Flask app?", False),
+    ("What is acceptance testing?", "What is performance testing?", False),
+    ("How do I improve test coverage?", "How do I measure test coverage?", False),
+    ("Is Kanban better than Scrum?", "Is Scrum better than Kanban?", False),
+    ("How do I migrate from Python 2 to Python 3?", "How do I migrate from Python 3 to Python 2?", False),
+    ("What is the requirements phase?", "What is the maintenance phase?", False),
+    ("How many story points is a day?", "How many story points is a week?", False),
+]
+
+# Unrelated questions, so inverse document frequencies look like a populated cache
+BACKGROUND = [
+    "How do I configure a Docker container?",
+    "What does a product owner do?",
+    "How do I estimate user stories?",
+    "What is a REST API?",
+    "How do I profile slow SQL queries?",
+]
+
+
+def make_cache(tmp_path, **kwargs) -> SemanticCache:
+    return SemanticCache(namespace="test", path=str(tmp_path / "cache.npz"), **kwargs)
+
+
+def served(tmp_path, stored, incoming) -> bool:
+    """Whether ``incoming`` gets the cached answer to ``stored``"""
+    cache = make_cache(tmp_path)
+    for question in BACKGROUND + [stored]:
+        cache.add(question, f"answer to {question}")
+    match = cache.lookup(incoming)
+    return match is not None and match["question"] == stored
+
+
+@pytest.mark.parametrize("stored, incoming, same", TUNING_PAIRS)
+def test_tuning_pairs(tmp_path, stored, incoming, same):
+    assert served(tmp_path, stored, incoming) == same
+
+
+def test_held_out_pairs(tmp_path):
+    results = [(served(tmp_path, stored, incoming), same) for stored, incoming, same in HELD_OUT_PAIRS]
+    paraphrases = [hit for hit, same in results if same]
+    different = [hit for hit, same in results if not same]
+    # Serving the answer to a different question is the costly mistake; a miss only costs a model call
+    assert sum(different) / len(different) <= 0.1
+    assert sum(paraphrases) / len(paraphrases) >= 0.8
+
+
+def test_hit_and_miss_are_counted(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("What is the waterfall model?", "Sequential phases.")
+
+    assert cache.lookup("Explain the waterfall model")["answer"] == "Sequential phases."
+    assert cache.lookup("What is a REST API?") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_numbers_must_match(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("How do I handle HTTP 404 errors?", "Return a not-found page.")
+
+    assert cache.lookup("How do I handle HTTP 404 errors?") is not None
+    assert cache.lookup("How do I handle HTTP 500 errors?") is None
+    assert cache.lookup("How do I handle HTTP errors?") is None
+
+
+def test_empty_and_stop_word_questions_are_ignored(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("", "nothing")
+    cache.add("what is it?", "nothing")
+
+    assert len(cache) == 0
+    assert cache.lookup("what is it?") is None
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = make_cache(tmp_path, ttl=0.05)
+    cache.add("What is technical debt?", "Shortcuts to repay later.")
+    assert cache.lookup("What is technical debt?") is not None
+
+    time.sleep(0.1)
+    assert cache.lookup("What is technical debt?") is None
+
+
+def test_least_recently_used_entry_is_replaced(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.add("What is the waterfall model?", "waterfall")
+    cache.add("What is continuous integration?", "ci")
+    # Using the first entry makes the second the least recently used
+    assert cache.lookup("What is the waterfall model?") is not None
+
+    cache.add("What is technical debt?", "debt")
+
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup("What is the waterfall model?") is not None
+    assert cache.lookup("What is continuous integration?") is None
+    assert cache.lookup("What is technical debt?") is not None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("What is the waterfall model?", "waterfall")
+    cache.save()
+
+    reloaded = make_cache(tmp_path)
+    assert reloaded.lookup("Explain the waterfall model")["answer"] == "waterfall"
+    # Another model's answers are not reused
+    other = SemanticCache(namespace="other", path=str(tmp_path / "cache.npz"))
+    assert other.lookup("Explain the waterfall model") is None
+
+
+def test_saves_from_several_workers_are_merged(tmp_path):
+    first, second = make_cache(tmp_path), make_cache(tmp_path)
+    first.add("What is the waterfall model?", "waterfall")
+    second.add("What is continuous integration?", "ci")
+    first.save()
+    second.save()
+
+    merged = make_cache(tmp_path)
+    assert merged.lookup("What is the waterfall model?") is not None
+    assert merged.lookup("What is continuous integration?") is not None
+
+
+def test_vectors_from_an_older_feature_version_are_dropped(tmp_path, monkeypatch):
+    import services.semantic_cache as semantic_cache
+
+    monkeypatch.setattr(semantic_cache, "FEATURE_VERSION", FEATURE_VERSION - 1)
+    old = make_cache(tmp_path)
+    old.add("What is the waterfall model?", "waterfall")
+    old.save()
+    monkeypatch.undo()
+
+    assert make_cache(tmp_path).lookup("What is the waterfall model?") is None
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from services.structured_output import JSONObjectScanner, parse_json_object
+
+OBJECT = '{"Requirements": ["Users sign in {with SSO}"], "Design": ["Use \\"REST\\" APIs"], "Testing": []}'
+
+
+def feed_in_chunks(text, size):
+    scanner = JSONObjectScanner()
+    done = False
+    for start in range(0, len(text), size):
+        done = scanner.feed(text[start:start + size])
+    return scanner, done
+
+
+def test_empty_input():
+    scanner = JSONObjectScanner()
+    assert scanner.feed("") is False
+    assert scanner.object_text() is None
+    assert scanner.repaired() is None
+    assert parse_json_object("") == (None, False)
+
+
+def test_no_object_in_prose():
+    assert parse_json_object("I could not classify this text.") == (None, False)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, len(OBJECT)])
+def test_object_split_across_chunks(size):
+    scanner, done = feed_in_chunks("Here you go: " + OBJECT + "\nHope that helps {", size)
+    assert done and scanner.complete
+    assert json.loads(scanner.object_text()) == json.loads(OBJECT)
+
+
+def test_stops_at_first_closing_brace():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{"a": 1}') is True
+    # Anything after the object is ignored
+    assert scanner.feed(' {"b": 2}') is True
+    assert scanner.text == '{"a": 1}'
+
+
+def test_braces_inside_strings_do_not_close_the_object():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{"a": "}}]] {"') is False
+    assert scanner.feed(', "b": "\\"}"}') is True
+    assert json.loads(scanner.object_text()) == {"a": "}}]] {", "b": '"}'}
+
+
+def test_well_formed_object_is_not_repaired():
+    assert parse_json_object("```json\n" + OBJECT + "\n```") == (json.loads(OBJECT), False)
+
+
+def test_trailing_comma_is_tolerated():
+    assert parse_json_object('{"Testing": ["a", "b",],}') == ({"Testing": ["a", "b"]}, False)
+
+
+def test_truncated_inside_list_keeps_finished_items():
+    data, repaired = parse_json_object('{"Requirements": ["one", "two"], "Design": ["three", "fo')
+    assert repaired
+    assert data == {"Requirements": ["one", "two"], "Design": ["three"]}
+
+
+def test_unterminated_string_is_dropped():
+    data, repaired = parse_json_object('{"Requirements": ["Users sign in {with SS')
+    assert repaired
+    assert data == {"Requirements": []}
+
+
+def test_truncated_after_key_drops_the_key():
+    data, repaired = parse_json_object('{"Requirements": ["one"], "Design"')
+    assert repaired
+    assert data == {"Requirements": ["one"]}
+
+
+def test_truncated_nested_object():
+    data, repaired = parse_json_object('{"a": {"b": [1, 2, {"c": tr')
+    assert repaired
+    assert data == {"a": {"b": [1, 2, {}]}}
+
+
+def test_truncated_scalar_is_dropped():
+    data, repaired = parse_json_object('{"a": 1, "b": 12')
+    assert repaired
+    assert data == {"a": 1}
+
+
+@pytest.mark.parametrize("cut", range(1, len(OBJECT)))
+def test_every_truncation_point_recovers_an_object(cut):
+    data, _ = parse_json_object(OBJECT[:cut])
+    assert isinstance(data, dict)
+    assert set(data) <= {"Requirements", "Design", "Testing"}
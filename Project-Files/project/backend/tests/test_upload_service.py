@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from services.upload_service import UploadService
+
+BOUNDARY = "----smartsdlc-test-boundary"
+PDF = b"%PDF-1.4\n" + b"".join(b"line %d of the document\r\n--%s\r\n" % (n, BOUNDARY[:10].encode())
+                              for n in range(400)) + b"%%EOF\n"
+
+
+class FakeRequest:
+    """Just enough of a Starlette request: headers and a body streamed in fixed-size chunks"""
+
+    def __init__(self, body: bytes, chunk_size: int, content_type: str = None):
+        self.headers = {
+            "content-type": content_type or f"multipart/form-data; boundary={BOUNDARY}",
+            "content-length": str(len(body)),
+        }
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def form(*parts):
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def service(tmp_path):
+    return UploadService(max_bytes=64 * 1024, spool_bytes=4 * 1024, memory_budget=1024 * 1024,
+                         tmp_dir=str(tmp_path))
+
+
+def receive(service, body, chunk_size=1024, **kwargs):
+    return asyncio.run(service.receive_pdf(FakeRequest(body, chunk_size, **kwargs)))
+
+
+def rejected(service, body, chunk_size=1024, **kwargs) -> HTTPException:
+    with pytest.raises(HTTPException) as error:
+        receive(service, body, chunk_size, **kwargs)
+    return error.value
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, len(BOUNDARY) - 1, len(BOUNDARY) + 5, 1 << 20])
+def test_boundaries_split_across_chunks(service, chunk_size):
+    body = form(("note", None, b"not the file"), ("file", "spec.pdf", PDF))
+    upload = receive(service, body, chunk_size)
+    try:
+        assert upload.filename == "spec.pdf"
+        assert upload.size == len(PDF)
+        assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+        if upload.in_memory:
+            assert bytes(upload.source) == PDF
+        else:
+            with open(upload.source, "rb") as f:
+                assert f.read() == PDF
+    finally:
+        upload.close()
+    assert service.budget.in_use == 0
+
+
+def test_large_upload_spills_to_disk_and_is_removed_on_close(service):
+    upload = receive(service, form(("file", "spec.pdf", PDF)))
+    assert not upload.in_memory
+    path = upload.source
+    assert os.path.exists(path)
+    upload.close()
+    assert not os.path.exists(path)
+    assert service.stats()["spilled_to_disk"] == 1
+
+
+def test_small_upload_stays_in_memory(service):
+    content = b"%PDF-1.4\nsmall\n%%EOF\n"
+    upload = receive(service, form(("file", "small.pdf", content)), chunk_size=5)
+    assert upload.in_memory
+    # PyMuPDF 1.23 only opens bytes streams, not views of the buffer
+    assert type(upload.source) is bytes and upload.source == content
+    assert service.budget.in_use == len(content)
+    upload.close()
+    assert service.budget.in_use == 0
+
+
+def test_only_the_first_file_part_is_kept(service):
+    other = b"%PDF-1.4\nsecond\n"
+    upload = receive(service, form(("file", "first.pdf", PDF[:100]), ("file", "second.pdf", other)))
+    assert upload.filename == "first.pdf" and upload.size == 100
+    upload.close()
+
+
+def test_non_multipart_body_is_rejected(service):
+    assert rejected(service, PDF, content_type="application/pdf").status_code == 400
+
+
+def test_missing_file_field_is_rejected(service):
+    error = rejected(service, form(("document", "spec.pdf", PDF)))
+    assert error.status_code == 400 and "'file'" in error.detail
+
+
+def test_wrong_extension_is_rejected(service):
+    assert rejected(service, form(("file", "spec.txt", PDF))).status_code == 400
+
+
+def test_empty_file_is_rejected(service):
+    assert rejected(service, form(("file", "spec.pdf", b""))).status_code == 400
+
+
+def test_non_pdf_content_is_rejected_with_415(service, tmp_path):
+    error = rejected(service, form(("file", "spec.pdf", b"GIF89a" + b"\0" * 8000)), chunk_size=7)
+    assert error.status_code == 415
+    assert os.listdir(tmp_path) == []
+
+
+def test_short_non_pdf_content_is_rejected_with_415(service):
+    assert rejected(service, form(("file", "spec.pdf", b"hello"))).status_code == 415
+
+
+def test_oversized_file_is_rejected_with_413_while_streaming(service, tmp_path):
+    body = form(("file", "spec.pdf", PDF * 5))
+    request = FakeRequest(body, 1024)
+    # Without a usable Content-Length the limit is enforced on the bytes actually read
+    request.headers["content-length"] = ""
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.receive_pdf(request))
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+    assert service.budget.in_use == 0
+
+
+def test_oversized_content_length_is_rejected_before_reading(service):
+    request = FakeRequest(b"", 1024)
+    request.headers["content-length"] = str(10 * 1024 * 1024)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.receive_pdf(request))
+    assert error.value.status_code == 413
+
+
+def test_rejections_are_counted(service):
+    rejected(service, form(("file", "spec.pdf", b"hello")))
+    receive(service, form(("file", "spec.pdf", PDF[:100]))).close()
+    stats = service.stats()
+    assert stats["rejected"] == 1 and stats["accepted"] == 1
@@ -0,0 +1,72 @@
+"""Benchmark PDF text extraction throughput as the process pool grows.
+
+Usage:
+    python benchmarks/bench_pdf_extraction.py --pages 500 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import fitz  # PyMuPDF
+from services.pdf_service import PDFService, shutdown_process_pool
+
+
+def make_synthetic_pdf(pages: int, lines_per_page: int = 60) -> bytes:
+    """Build a text-heavy PDF resembling a requirements specification"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "\n".join(
+            f"REQ-{page_num}-{line}: The system shall validate user input and log the outcome."
+            for line in range(lines_per_page)
+        )
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def run(pdf_content: bytes, pages: int, workers: int, repeat: int) -> dict:
+    service = PDFService(workers=workers, parallel_min_pages=1)
+    # Warm the process pool so spawn cost is not counted
+    service.extract_text_from_pdf(pdf_content)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        service.extract_text_from_pdf(pdf_content)
+        timings.append(time.perf_counter() - started)
+    shutdown_process_pool()
+
+    best = min(timings)
+    return {"workers": workers, "seconds": round(best, 4), "pages_per_second": round(pages / best, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    pdf_content = make_synthetic_pdf(args.pages)
+    results = [run(pdf_content, args.pages, w, args.repeat) for w in sorted(set(args.workers))]
+
+    baseline = results[0]["pages_per_second"]
+    for result in results:
+        result["speedup"] = round(result["pages_per_second"] / baseline, 2)
+        print(f"workers={result['workers']:>3}  {result['pages_per_second']:>8} pages/s  x{result['speedup']}")
+
+    report = {"pages": args.pages, "cpu_count": os.cpu_count(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Load-test the SmartSDLC API and report throughput and latency percentiles.
+
+Runs in-process against the FastAPI app (default, using the simulated model
+backend so no credentials are needed) or against a running server via --url.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 16 --requests 500
+    python benchmarks/load_test.py --mix chat=5,generate-code=2,feedback-stats=3 --output run.json
+    python benchmarks/load_test.py --url http://localhost:8000 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from bench_pdf_extraction import make_synthetic_pdf
+
+DEFAULT_MIX = "chat=4,generate-code=2,fix-bug=2,generate-tests=2,upload-pdf=1,feedback-submit=1,feedback-stats=3"
+
+SNIPPET = '''def average(values):
+    total = 0
+    for v in values:
+        total += v
+    return total / len(values)
+'''
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Workload:
+    """Builds request payloads; a fraction of them repeat so caches see realistic reuse"""
+
+    def __init__(self, pdf_pages: List[int], unique_ratio: float, seed: int):
+        self.rng = random.Random(seed)
+        self.unique_ratio = unique_ratio
+        self.pdfs = {pages: make_synthetic_pdf(pages) for pages in pdf_pages}
+        self.counter = 0
+
+    def tag(self) -> str:
+        if self.rng.random() < self.unique_ratio:
+            self.counter += 1
+            return f" #{self.counter}"
+        return ""
+
+    def pdf(self):
+        pages = self.rng.choice(list(self.pdfs))
+        return {"file": (f"spec_{pages}p.pdf", self.pdfs[pages], "application/pdf")}
+
+
+ENDPOINTS = {
+    "generate-code": lambda w: ("POST", "/api/ai/generate-code",
+                                {"json": {"prompt": "Write a function that parses CSV rows" + w.tag(), "language": "python"}}),
+    "fix-bug": lambda w: ("POST", "/api/ai/fix-bug", {"json": {"code": SNIPPET + "#" + w.tag(), "language": "python"}}),
+    "generate-tests": lambda w: ("POST", "/api/ai/generate-tests", {"json": {"code": SNIPPET + "#" + w.tag(), "language": "python"}}),
+    "chat": lambda w: ("POST", "/api/chat/chat", {"json": {"message": "What happens in the testing phase?" + w.tag()}}),
+    "upload-pdf": lambda w: ("POST", "/api/ai/upload-pdf", {"files": w.pdf()}),
+    "feedback-submit": lambda w: ("POST", "/api/feedback/submit",
+                                  {"json": {"feature": "Load Test", "rating": w.rng.randint(1, 5), "user_id": "bench"}}),
+    "feedback-stats": lambda w: ("GET", "/api/feedback/stats", {}),
+}
+
+
+async def upstream_calls(client: httpx.AsyncClient) -> Optional[int]:
+    try:
+        response = await client.get("/health/model-backend")
+        return response.json().get("calls")
+    except Exception:
+        return None
+
+
+async def run_load(client: httpx.AsyncClient, args, mix: Dict[str, int]) -> Dict:
+    workload = Workload(args.pdf_pages, args.unique_ratio, args.seed)
+    names = [name for name, weight in mix.items() for _ in range(weight)]
+    latencies: Dict[str, List[float]] = {name: [] for name in mix}
+    errors: Dict[str, int] = {name: 0 for name in mix}
+    # Status codes, or the exception name when no response arrived
+    statuses: Dict[str, Dict[str, int]] = {name: {} for name in mix}
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(workload.rng.choice(names))
+
+    async def worker(user: int):
+        # Each virtual user is its own rate-limited client when the server trusts this host (TRUSTED_PROXIES)
+        headers = {"X-Client-Id": f"load-test-{user}"}
+        while True:
+            try:
+                name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method, path, kwargs = ENDPOINTS[name](workload)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, timeout=args.timeout, headers=headers, **kwargs)
+                ok, status = response.status_code < 400, str(response.status_code)
+            except httpx.HTTPError as e:
+                ok, status = False, type(e).__name__
+            elapsed = time.perf_counter() - started
+            statuses[name][status] = statuses[name].get(status, 0) + 1
+            # Latency percentiles describe successful requests; failures are counted by status instead
+            if ok:
+                latencies[name].append(elapsed)
+            else:
+                errors[name] += 1
+
+    calls_before = await upstream_calls(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user) for user in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    calls_after = await upstream_calls(client)
+
+    def summarize(samples: List[float], failed: int, codes: Dict[str, int]) -> Dict:
+        requests = len(samples) + failed
+        return {
+            "requests": requests,
+            "errors": failed,
+            "error_rate": round(failed / requests, 4) if requests else 0.0,
+            "status_codes": dict(sorted(codes.items())),
+            "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    total_errors = sum(errors.values())
+    all_statuses: Dict[str, int] = {}
+    for codes in statuses.values():
+        for status, count in codes.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    overall = summarize(all_samples, total_errors, all_statuses)
+    overall["throughput_rps"] = round(len(all_samples) / wall, 2) if wall else 0.0
+    overall["wall_seconds"] = round(wall, 3)
+    overall["upstream_calls"] = (calls_after - calls_before
+                                 if calls_before is not None and calls_after is not None else None)
+    # ru_maxrss is KiB on Linux. Only in-process runs measure the server; with
+    # --url it would be this load generator's own memory, so it is left out.
+    overall["max_rss_mb"] = (None if args.url
+                             else round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1))
+
+    return {
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mix": mix,
+            "pdf_pages": args.pdf_pages,
+            "unique_ratio": args.unique_ratio,
+            "seed": args.seed,
+        },
+        "overall": overall,
+        "endpoints": {name: summarize(latencies[name], errors[name], statuses[name]) for name in mix},
+    }
+
+
+async def run_in_process(args, mix: Dict[str, int]) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="smartsdlc-bench-")
+    os.environ.setdefault("MODEL_BACKEND", "simulated")
+    # Measure capacity, not the per-client limit; set RATE_LIMIT_PER_MINUTE to include it
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    # The in-process transport connects from 127.0.0.1; trust it to pass on each user's X-Client-Id
+    os.environ.setdefault("TRUSTED_PROXIES", "127.0.0.1")
+    os.environ.setdefault("FEEDBACK_STORE_PATH", os.path.join(workdir, "feedback.jsonl"))
+    os.chdir(workdir)
+
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_load(client, args, mix)
+
+
+async def run_remote(args, mix: Dict[str, int]) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits) as client:
+        return await run_load(client, args, mix)
+
+
+def error_rate(summary: Dict) -> float:
+    # Reports written before error_rate was recorded still have the counts
+    if "error_rate" in summary:
+        return summary["error_rate"]
+    return summary["errors"] / summary["requests"] if summary.get("requests") else 0.0
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, error_tolerance: float = 0.01) -> List[str]:
+    """Return human-readable regressions of ``report`` against ``baseline``.
+
+    Latency and throughput may worsen by ``tolerance`` (relative); the error
+    rate may rise by ``error_tolerance`` (absolute, as a fraction of requests).
+    """
+    regressions = []
+    for name, current in [("overall", report["overall"])] + list(report["endpoints"].items()):
+        previous = baseline["overall"] if name == "overall" else baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]}")
+        before, after = error_rate(previous), error_rate(current)
+        if after > before + error_tolerance:
+            regressions.append(f"{name} error_rate: {before:.4f} -> {after:.4f} {current.get('status_codes', {})}")
+    before, after = baseline["overall"]["throughput_rps"], report["overall"]["throughput_rps"]
+    if before and after < before * (1 - tolerance):
+        regressions.append(f"overall throughput_rps: {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server; omit to test in-process")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated endpoint=weight pairs")
+    parser.add_argument("--pdf-pages", type=lambda s: [int(p) for p in s.split(",")], default=[5, 50],
+                        help="comma-separated page counts for the synthetic PDF corpus")
+    parser.add_argument("--unique-ratio", type=float, default=1.0,
+                        help="fraction of payloads that are unique (lower values exercise caches)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this path")
+    parser.add_argument("--compare", help="baseline JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--error-tolerance", type=float, default=0.01,
+                        help="allowed rise in the error rate, as a fraction of requests")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.compare:
+        args.compare = os.path.abspath(args.compare)
+
+    runner = run_remote if args.url else run_in_process
+    report = asyncio.run(runner(args, mix))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.error_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
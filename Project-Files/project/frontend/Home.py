@@ -1,9 +1,16 @@
 import streamlit as st
 import requests
-import json
+import time
+from concurrent.futures import wait
 from datetime import datetime
 import plotly.express as px
 import pandas as pd
+import api_client
+from api_client import error_detail, stream_text
+
+# Seconds between job status checks, and how long to keep checking (the backend's default JOB_TIMEOUT)
+JOB_POLL_INTERVAL = 1
+JOB_WAIT_SECONDS = 1800
 
 # Configure page
 st.set_page_config(
@@ -60,9 +67,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# API Base URL
-API_BASE_URL = "http://localhost:8000/api"
-
 def main():
     # Header
     st.markdown("""
@@ -118,43 +122,101 @@ def show_home():
         </div>
         """, unsafe_allow_html=True)
     
-    # Feedback stats
-    try:
-        response = requests.get(f"{API_BASE_URL}/feedback/stats")
-        if response.status_code == 200:
-            stats = response.json()
-            
-            st.markdown("### 📊 Platform Statistics")
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h2>{stats['total_feedback']}</h2>
-                    <p>Total Feedback</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h2>{stats['average_rating']}/5</h2>
-                    <p>Average Rating</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h2>{len(stats['features'])}</h2>
-                    <p>Features Used</p>
-                </div>
-                """, unsafe_allow_html=True)
-    except:
-        pass
+    # Feedback stats are fetched in the background; the page reruns to fill them in once they arrive
+    stats_future = st.session_state.get('stats_future')
+    if stats_future is None:
+        stats_future = api_client.fetch_in_background(api_client.feedback_stats)
+        st.session_state.stats_future = stats_future
+        st.session_state.stats_deadline = time.time() + api_client.DEFAULT_TIMEOUT[1]
+    stats_slot = st.empty()
+    if stats_future.done():
+        # The next visit starts a fresh fetch, which feedback_stats' cache keeps cheap
+        st.session_state.stats_future = None
+        try:
+            show_platform_stats(stats_slot, stats_future.result())
+        except Exception:
+            stats_slot.empty()
+    else:
+        stats_slot.caption("Loading platform statistics...")
     
     # Floating AI Chatbot
     show_chatbot()
+    
+    if st.session_state.stats_future is not None:
+        poll_stats(stats_slot, stats_future)
+
+def poll_stats(slot, future):
+    """Rerun the page shortly so it can render the stats, giving up after the API timeout"""
+    if time.time() > st.session_state.stats_deadline:
+        st.session_state.stats_future = None
+        slot.empty()
+        return
+    wait([future], timeout=0.25)
+    st.rerun()
+
+def show_platform_stats(slot, stats):
+    with slot.container():
+        st.markdown("### 📊 Platform Statistics")
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.markdown(f"""
+            <div class="metric-card">
+                <h2>{stats['total_feedback']}</h2>
+                <p>Total Feedback</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+            <div class="metric-card">
+                <h2>{stats['average_rating']}/5</h2>
+                <p>Average Rating</p>
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+            <div class="metric-card">
+                <h2>{len(stats['features'])}</h2>
+                <p>Features Used</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+def show_pdf_result(result):
+    st.success(f"Successfully processed: {result['filename']}")
+    if result.get('chunks'):
+        st.caption(f"Classified in {len(result['chunks'])} chunks "
+                   f"({result['classification_seconds']}s)")
+    reuse = result.get('reuse')
+    if reuse and reuse['document']:
+        st.caption("Unchanged since the last upload; reused the previous result")
+    elif reuse and (reuse['pages_reused'] or reuse['chunks_reused']):
+        st.caption(f"Reused {reuse['pages_reused']}/{reuse['pages']} pages and "
+                   f"{reuse['chunks_reused']}/{reuse['chunks']} chunks from earlier uploads")
+    
+    # Show extracted text preview
+    st.subheader("📝 Extracted Text Preview")
+    st.text_area("Text", result['extracted_text'], height=200)
+    
+    # Show classification (already parsed and validated by the backend)
+    st.subheader("🔍 SDLC Classification")
+    for phase, sentences in result['classification'].items():
+        if sentences:
+            st.write(f"**{phase}:**")
+            for sentence in sentences:
+                st.write(f"- {sentence}")
+
+def job_progress(status):
+    """Fraction done and a one-line description of a classification job"""
+    progress = status.get('progress', {})
+    if progress.get('chunks_total'):
+        done = progress['chunks_classified'] / progress['chunks_total']
+        return 0.3 + 0.7 * done, f"Classifying: {progress['chunks_classified']}/{progress['chunks_total']} chunks"
+    if progress.get('pages_total'):
+        done = progress['pages_extracted'] / progress['pages_total']
+        return 0.3 * done, f"Extracting text: {progress['pages_extracted']}/{progress['pages_total']} pages"
+    return 0.0, "Waiting for a worker..." if status['status'] == "queued" else "Starting..."
 
 def show_pdf_classifier():
     st.title("📄 PDF Classifier")
@@ -164,38 +226,61 @@ def show_pdf_classifier():
     
     if uploaded_file is not None:
         if st.button("Classify PDF"):
-            with st.spinner("Processing PDF..."):
-                try:
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
-                    response = requests.post(f"{API_BASE_URL}/ai/upload-pdf", files=files)
+            try:
+                # Submit as a background job so large documents don't hit request timeouts
+                files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
+                response = api_client.post("/jobs/classify-pdf", files=files, timeout=(3.05, 60))
+                
+                if response.status_code == 202:
+                    st.session_state.pdf_job = response.json()['job_id']
+                    st.session_state.pdf_job_deadline = time.time() + JOB_WAIT_SECONDS
+                else:
+                    st.error(f"Failed to process PDF: {error_detail(response)}")
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        st.success(f"Successfully processed: {result['filename']}")
-                        
-                        # Show extracted text preview
-                        st.subheader("📝 Extracted Text Preview")
-                        st.text_area("Text", result['extracted_text'], height=200)
-                        
-                        # Show classification
-                        st.subheader("🔍 SDLC Classification")
-                        try:
-                            classification = json.loads(result['classification'])
-                            for phase, sentences in classification.items():
-                                if sentences:
-                                    st.write(f"**{phase}:**")
-                                    for sentence in sentences:
-                                        st.write(f"- {sentence}")
-                        except:
-                            st.code(result['classification'])
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
+    
+    job_id = st.session_state.get('pdf_job')
+    polling = False
+    if job_id:
+        # Each run checks the job once; Cancel and the rest of the page stay live in between
+        if st.button("Cancel"):
+            api_client.delete(f"/jobs/{job_id}", timeout=(3.05, 10))
+            st.session_state.pdf_job = None
+            st.warning("Classification cancelled")
+        else:
+            try:
+                response = api_client.get(f"/jobs/{job_id}", timeout=(3.05, 10))
+                if response.status_code != 200:
+                    raise Exception(error_detail(response))
+                status = response.json()
+                
+                if status['status'] in ("succeeded", "failed", "cancelled"):
+                    st.session_state.pdf_job = None
+                    if status['status'] == "succeeded":
+                        response = api_client.get(f"/jobs/{job_id}/result")
+                        show_pdf_result(response.json())
+                    elif status['status'] == "failed":
+                        st.error(f"Failed to process PDF: {status['error']}")
                     else:
-                        st.error("Failed to process PDF")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+                        st.warning("Classification cancelled")
+                elif time.time() > st.session_state.pdf_job_deadline:
+                    st.session_state.pdf_job = None
+                    st.warning("Stopped waiting for the classification; it is taking longer than expected")
+                else:
+                    fraction, text = job_progress(status)
+                    st.progress(min(fraction, 1.0), text=text)
+                    polling = True
+                    
+            except Exception as e:
+                st.session_state.pdf_job = None
+                st.error(f"Error: {str(e)}")
     
     show_feedback_section("PDF Classifier")
+    
+    if polling:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 def show_code_generator():
     st.title("💻 Code Generator")
@@ -212,30 +297,27 @@ def show_code_generator():
     
     if st.button("Generate Code"):
         if prompt:
-            with st.spinner("Generating code..."):
-                try:
-                    data = {"prompt": prompt, "language": language}
-                    response = requests.post(f"{API_BASE_URL}/ai/generate-code", json=data)
+            try:
+                data = {"prompt": prompt, "language": language}
+                st.subheader("📋 Generated Code")
+                output = st.empty()
+                generated_code = stream_text(
+                    "/ai/generate-code/stream", data,
+                    lambda text: output.code(text, language=language)
+                )
+                
+                st.success("Code generated successfully!")
+                
+                # Download button
+                st.download_button(
+                    label="📥 Download Code",
+                    data=generated_code,
+                    file_name=f"generated_code.{language}",
+                    mime="text/plain"
+                )
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        st.success("Code generated successfully!")
-                        st.subheader("📋 Generated Code")
-                        st.code(result['generated_code'], language=language)
-                        
-                        # Download button
-                        st.download_button(
-                            label="📥 Download Code",
-                            data=result['generated_code'],
-                            file_name=f"generated_code.{language}",
-                            mime="text/plain"
-                        )
-                    else:
-                        st.error("Failed to generate code")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            except Exception as e:
+                st.error(f"Failed to generate code: {str(e)}")
         else:
             st.warning("Please enter a requirement")
     
@@ -256,38 +338,36 @@ def show_bug_fixer():
     
     if st.button("Fix Bugs"):
         if code:
-            with st.spinner("Analyzing and fixing code..."):
-                try:
-                    data = {"code": code, "language": language}
-                    response = requests.post(f"{API_BASE_URL}/ai/fix-bug", json=data)
+            try:
+                data = {"code": code, "language": language}
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.subheader("🔴 Original Code")
+                    st.code(code, language=language)
+                
+                with col2:
+                    st.subheader("✅ Fixed Code")
+                    output = st.empty()
+                
+                fixed_code = stream_text(
+                    "/ai/fix-bug/stream", data,
+                    lambda text: output.code(text, language=language)
+                )
+                
+                st.success("Code analyzed and fixed!")
+                
+                # Download button
+                st.download_button(
+                    label="📥 Download Fixed Code",
+                    data=fixed_code,
+                    file_name=f"fixed_code.{language}",
+                    mime="text/plain"
+                )
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        st.success("Code analyzed and fixed!")
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.subheader("🔴 Original Code")
-                            st.code(result['original_code'], language=language)
-                        
-                        with col2:
-                            st.subheader("✅ Fixed Code")
-                            st.code(result['fixed_code'], language=language)
-                        
-                        # Download button
-                        st.download_button(
-                            label="📥 Download Fixed Code",
-                            data=result['fixed_code'],
-                            file_name=f"fixed_code.{language}",
-                            mime="text/plain"
-                        )
-                    else:
-                        st.error("Failed to fix bugs")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            except Exception as e:
+                st.error(f"Failed to fix bugs: {str(e)}")
         else:
             st.warning("Please paste your code")
     
@@ -308,38 +388,36 @@ def show_test_generator():
     
     if st.button("Generate Tests"):
         if code:
-            with st.spinner("Generating test cases..."):
-                try:
-                    data = {"code": code, "language": language}
-                    response = requests.post(f"{API_BASE_URL}/ai/generate-tests", json=data)
+            try:
+                data = {"code": code, "language": language}
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.subheader("📋 Original Code")
+                    st.code(code, language=language)
+                
+                with col2:
+                    st.subheader("🧪 Generated Tests")
+                    output = st.empty()
+                
+                test_cases = stream_text(
+                    "/ai/generate-tests/stream", data,
+                    lambda text: output.code(text, language=language)
+                )
+                
+                st.success("Test cases generated successfully!")
+                
+                # Download button
+                st.download_button(
+                    label="📥 Download Test Cases",
+                    data=test_cases,
+                    file_name=f"test_cases.{language}",
+                    mime="text/plain"
+                )
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        st.success("Test cases generated successfully!")
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.subheader("📋 Original Code")
-                            st.code(result['original_code'], language=language)
-                        
-                        with col2:
-                            st.subheader("🧪 Generated Tests")
-                            st.code(result['test_cases'], language=language)
-                        
-                        # Download button
-                        st.download_button(
-                            label="📥 Download Test Cases",
-                            data=result['test_cases'],
-                            file_name=f"test_cases.{language}",
-                            mime="text/plain"
-                        )
-                    else:
-                        st.error("Failed to generate tests")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            except Exception as e:
+                st.error(f"Failed to generate tests: {str(e)}")
         else:
             st.warning("Please paste your code")
     
@@ -351,9 +429,21 @@ def show_chatbot():
     with st.container():
         st.markdown('<div class="chat-container">', unsafe_allow_html=True)
         
-        # Initialize chat history
+        # Initialize chat history; the server keeps the model's view of it per session
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        if "chat_session_id" not in st.session_state:
+            st.session_state.chat_session_id = None
+        
+        if st.session_state.messages and st.button("New conversation"):
+            if st.session_state.chat_session_id:
+                try:
+                    api_client.delete(f"/chat/sessions/{st.session_state.chat_session_id}")
+                except requests.RequestException:
+                    pass
+            st.session_state.messages = []
+            st.session_state.chat_session_id = None
+            st.rerun()
         
         # Display chat messages
         for message in st.session_state.messages:
@@ -369,24 +459,23 @@ def show_chatbot():
             
             # Get AI response
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    try:
-                        data = {"message": prompt}
-                        response = requests.post(f"{API_BASE_URL}/chat/chat", json=data)
-                        
-                        if response.status_code == 200:
-                            result = response.json()
-                            ai_response = result['response']
-                        else:
-                            ai_response = "Sorry, I'm having trouble responding right now."
-                        
-                        st.markdown(ai_response)
-                        st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                        
-                    except Exception as e:
-                        error_msg = f"Error: {str(e)}"
-                        st.markdown(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                output = st.empty()
+                try:
+                    data = {"message": prompt, "session_id": st.session_state.chat_session_id}
+                    headers = requests.structures.CaseInsensitiveDict()
+                    ai_response = stream_text("/chat/chat/stream", data, output.markdown, headers)
+                    st.session_state.chat_session_id = headers.get("X-Session-Id", st.session_state.chat_session_id)
+                    if headers.get("X-Cache") == "semantic":
+                        st.caption("⚡ Answered from earlier responses to a similar question")
+                    if not ai_response:
+                        ai_response = "Sorry, I'm having trouble responding right now."
+                        output.markdown(ai_response)
+                    st.session_state.messages.append({"role": "assistant", "content": ai_response})
+                    
+                except Exception as e:
+                    error_msg = f"Error: {str(e)}"
+                    output.markdown(error_msg)
+                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -410,9 +499,11 @@ def show_feedback_section(feature_name):
                 "comment": comment,
                 "user_id": f"user_{datetime.now().strftime('%Y%m%d')}"
             }
-            response = requests.post(f"{API_BASE_URL}/feedback/submit", json=data)
+            response = api_client.post("/feedback/submit", json=data)
             
             if response.status_code == 200:
+                # Show the new totals on the home page instead of the cached ones
+                api_client.feedback_stats.clear()
                 st.success("Thank you for your feedback!")
             else:
                 st.error("Failed to submit feedback")
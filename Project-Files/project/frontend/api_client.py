@@ -0,0 +1,118 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+# API Base URL
+API_BASE_URL = os.getenv("SMARTSDLC_API_URL", "http://localhost:8000/api")
+
+# (connect, read) seconds; streamed model output may pause between chunks for a while
+DEFAULT_TIMEOUT = (3.05, float(os.getenv("SMARTSDLC_API_TIMEOUT", "30")))
+STREAM_TIMEOUT = (3.05, float(os.getenv("SMARTSDLC_STREAM_TIMEOUT", "300")))
+STATS_TTL = int(os.getenv("SMARTSDLC_STATS_TTL", "30"))
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled HTTP session shared by every browser session of this Streamlit server.
+
+    Connection failures are retried for all methods, since the request never
+    reached the backend. 502/503/504 answers (honouring ``Retry-After``) are
+    retried only for GET and DELETE, which are safe to repeat; a retried POST
+    could start a second model call.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "DELETE"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("SMARTSDLC_API_POOL_SIZE", "16")),
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def _background_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-prefetch")
+
+
+def request(method, endpoint, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_session().request(method, f"{API_BASE_URL}{endpoint}", timeout=timeout, **kwargs)
+
+
+def get(endpoint, **kwargs):
+    return request("GET", endpoint, **kwargs)
+
+
+def post(endpoint, **kwargs):
+    return request("POST", endpoint, **kwargs)
+
+
+def delete(endpoint, **kwargs):
+    return request("DELETE", endpoint, **kwargs)
+
+
+def error_detail(response):
+    """Best-effort human-readable reason for a failed API response"""
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = None
+    detail = detail or response.reason
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        detail += f" (retry in {retry_after}s)"
+    return detail
+
+
+def stream_text(endpoint, data, render, response_headers=None):
+    """POST to a streaming endpoint and call ``render`` with the text received so far"""
+    text = ""
+    with post(endpoint, json=data, stream=True, timeout=STREAM_TIMEOUT) as response:
+        if response.status_code != 200:
+            raise Exception(error_detail(response))
+        if response_headers is not None:
+            response_headers.update(response.headers)
+        response.encoding = response.encoding or "utf-8"
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                text += chunk
+                render(text)
+    return text
+
+
+@st.cache_data(ttl=STATS_TTL, show_spinner=False)
+def feedback_stats():
+    """Platform feedback statistics, refreshed at most every ``STATS_TTL`` seconds.
+
+    Failures raise, so they are not cached and the next rerun tries again.
+    """
+    response = get("/feedback/stats")
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_in_background(func, *args, **kwargs) -> Future:
+    """Start ``func`` on a worker thread so the page can keep rendering while it runs"""
+    ctx = get_script_run_ctx()
+
+    def run():
+        # Lets st.cache_data functions run without "missing ScriptRunContext" warnings
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+
+    return _background_executor().submit(run)
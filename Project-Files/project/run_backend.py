@@ -1,24 +1,83 @@
+import argparse
+import importlib.util
 import subprocess
 import sys
 import os
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the SmartSDLC backend")
+    parser.add_argument("--prod", action="store_true",
+                        help="run several worker processes without auto-reload")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BACKEND_WORKERS", str(os.cpu_count() or 1))),
+                        help="worker processes in --prod mode (default: BACKEND_WORKERS or the CPU count)")
+    parser.add_argument("--host", default=os.getenv("BACKEND_HOST", "0.0.0.0"))
+    parser.add_argument("--port", default=os.getenv("BACKEND_PORT", "8000"))
+    return parser.parse_args()
+
+def backend_command(args):
+    if not args.prod:
+        # Development: one process that restarts on code changes
+        return [
+            sys.executable, '-m', 'uvicorn',
+            'main:app',
+            '--host', args.host,
+            '--port', str(args.port),
+            '--reload'
+        ]
+
+    graceful_timeout = os.getenv("BACKEND_GRACEFUL_TIMEOUT", "30")
+    if os.name != "nt" and importlib.util.find_spec("gunicorn") is not None:
+        # Pre-forking master: shared modules are imported once, then forked
+        return [
+            sys.executable, '-m', 'gunicorn',
+            'main:app',
+            '--config', 'gunicorn_conf.py',
+            '--bind', f"{args.host}:{args.port}",
+            '--workers', str(args.workers),
+            '--graceful-timeout', graceful_timeout
+        ]
+
+    # gunicorn is unavailable on Windows; uvicorn's spawned workers each import the app
+    print("gunicorn not available, using uvicorn workers")
+    return [
+        sys.executable, '-m', 'uvicorn',
+        'main:app',
+        '--host', args.host,
+        '--port', str(args.port),
+        '--workers', str(args.workers),
+        '--timeout-graceful-shutdown', graceful_timeout,
+        '--no-access-log'
+    ]
+
+def shared_feedback_env(env, workers):
+    """Point several workers at the SQLite feedback store; False if jsonl was asked for explicitly"""
+    if workers <= 1:
+        return True
+    backend = env.get("FEEDBACK_BACKEND", "").lower()
+    if backend == "jsonl":
+        print("FEEDBACK_BACKEND=jsonl keeps its index inside each worker process and cannot be shared; "
+              "use FEEDBACK_BACKEND=sqlite or --workers 1")
+        return False
+    if not backend:
+        env["FEEDBACK_BACKEND"] = "sqlite"
+    return True
 
 def run_backend():
+    args = parse_args()
     try:
         # Change to backend directory
         os.chdir('backend')
-        
-        # Run FastAPI with uvicorn
-        subprocess.run([
-            sys.executable, '-m', 'uvicorn', 
-            'main:app', 
-            '--host', '0.0.0.0', 
-            '--port', '8000', 
-            '--reload'
-        ])
+
+        # Workers report their startup time relative to this
+        env = dict(os.environ, SMARTSDLC_LAUNCHED_AT=str(time.time()))
+        if args.prod and not shared_feedback_env(env, args.workers):
+            sys.exit(1)
+        subprocess.run(backend_command(args), env=env)
     except KeyboardInterrupt:
         print("\nBackend server stopped.")
     except Exception as e:
         print(f"Error running backend: {e}")
 
 if __name__ == "__main__":
-    run_backend()
\ No newline at end of file
+    run_backend()